@@ -0,0 +1,544 @@
+"""Serve the REST APIs on asyncio instead of the Flask worker threads
+
+The routes of the clusters and their znodes, ``acls``, ``data`` and
+``children``, and ``/metrics`` answer as in :mod:`wildlife.rest`, but a
+request waiting for ZooKeeper does not hold a thread: the ``IAsyncResult``
+of the KazooClient is bridged into an awaitable.
+
+This module requires Python 3.5+ and aiohttp, and is only imported when
+``server`` is set to ``aio``.
+"""
+
+import ast
+import asyncio
+import concurrent.futures
+import functools
+import json
+import math
+import posixpath
+import time
+from aiohttp import web
+from wildlife import compress
+from wildlife import kz_exceptions
+from wildlife import limits
+from wildlife import metrics
+from wildlife import wildutils
+from wildlife.manager import ClusterNotReadyError
+
+
+# Default and maximum seconds to wait for each cluster of a fan-out read,
+# as for wildlife.rest
+FANOUT_TIMEOUT = 5
+FANOUT_MAX_TIMEOUT = 60
+
+# KazooClient methods whose identical calls in flight are shared
+SHARED_METHODS = ("get_async", "get_children_async", "exists_async",
+                  "get_acls_async")
+
+
+def wait_result(async_result):
+    """return an asyncio future resolved by a kazoo IAsyncResult
+    """
+
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def transfer(result):
+        if future.cancelled():
+            return
+        if result.successful():
+            future.set_result(result.value)
+        else:
+            future.set_exception(result.exception)
+
+    # the callbacks run in the kazoo threads
+    async_result.rawlink(
+        lambda result: loop.call_soon_threadsafe(transfer, result))
+    return future
+
+
+def _text(data):
+    # Flask answers text/html for the plain make_response of the handlers
+    return web.Response(text=data, content_type="text/html")
+
+
+def _json(data, status=200):
+    return web.Response(text=json.dumps(data),
+                        status=status,
+                        content_type="application/json")
+
+
+def _etag(etag):
+    return {"ETag": '"%s"' % etag}
+
+
+def _expected_version(request):
+    return wildutils.expected_version(request.query.get("version"),
+                                      request.headers.get("If-Match"))
+
+
+def _precondition_failed(request, cluster_name, znode):
+    message = wildutils.znode_error(kz_exceptions.BadVersionError(),
+                                    cluster_name, znode)[0]
+    return web.Response(text=message,
+                        status=(412 if request.query.get("version") is None
+                                else 409),
+                        content_type="text/html")
+
+
+def _znode(request):
+    return request.match_info.get("znode")
+
+
+def _record_error(request, cluster_name, excp):
+    """remember an exception handled on serving the request of a
+    configured cluster, counted by record_request with the request
+    """
+
+    request.setdefault("wildlife_errors", []).append(
+        (cluster_name, excp.__class__.__name__))
+
+
+def cluster_znode_exception(handler):
+    @functools.wraps(handler)
+    async def wrapper(self, request):
+        cluster_name = request.match_info["cluster_name"]
+        znode = _znode(request)
+        try:
+            if cluster_name not in self.app.clusters:
+                return web.Response(text="You Haven't Configured Cluster "
+                                         "[%s]." % cluster_name,
+                                    status=404,
+                                    content_type="text/html")
+            limiter = await self._admit(request, cluster_name)
+            try:
+                return await handler(self, request, cluster_name, znode)
+            except Exception as excp:
+                _record_error(request, cluster_name, excp)
+                raise
+            finally:
+                if limiter is not None:
+                    limiter.release()
+        except limits.RateLimitedError as excp:
+            return web.Response(text="Too Many Requests to Cluster [%s]. "
+                                     "Please Retry Later.\n" % cluster_name,
+                                status=429,
+                                headers={"Retry-After": str(int(math.ceil(
+                                    max(excp.retry_after, 1))))},
+                                content_type="text/html")
+        except ClusterNotReadyError:
+            return web.Response(text="Cluster [%s] is Still Connecting. "
+                                     "Please Retry Later.\n" % cluster_name,
+                                status=503,
+                                headers={"Retry-After": "1"},
+                                content_type="text/html")
+        except Exception as excp:
+            (message, status) = wildutils.znode_error(excp,
+                                                      cluster_name,
+                                                      znode)
+            return web.Response(text=message,
+                                status=status,
+                                content_type="text/html")
+    return wrapper
+
+
+class AsyncWild(object):
+    """The asyncio routes of the REST APIs over the managers of a
+    :class:`wildlife.app.WildApp`
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # the tasks of the shared calls in flight
+        self._flights = dict()
+
+    def make_app(self):
+        aio_app = web.Application(middlewares=[self.record_request])
+        znode = "/wildlife/{cluster_name}/{znode:.+}"
+        aio_app.router.add_get("/wildlife", self.clusters)
+        aio_app.router.add_get("/wildlife/_all/{znode:.+}",
+                               self.all_clusters_znode)
+        aio_app.router.add_get("/wildlife/{cluster_name}",
+                               self.detail_cluster)
+        aio_app.router.add_get("/wildlife/{cluster_name}/list",
+                               self.cluster_list_children)
+        # before the znode routes, which would take PUT .../acls for the
+        # data of a child znode named acls
+        for method in ("GET", "PUT"):
+            aio_app.router.add_route(method, znode + "/acls",
+                                     self.cluster_znode_acls)
+        aio_app.router.add_get(znode + "/data", self.cluster_znode_data)
+        aio_app.router.add_get(znode + "/children",
+                               self.cluster_znode_children)
+        for method in ("GET", "PUT", "DELETE"):
+            aio_app.router.add_route(method, znode, self.cluster_znode)
+        aio_app.router.add_get("/metrics", self.cluster_metrics)
+        return aio_app
+
+    @web.middleware
+    async def record_request(self, request, handler):
+        started = time.time()
+        resp = await handler(request)
+        self._compress(request, resp)
+        route = request.match_info.route.resource
+        route = route.canonical if route is not None else "unmatched"
+        cluster = request.match_info.get("cluster_name", "")
+        if cluster and cluster not in (self.app.clusters or ()):
+            # any client may name a cluster, keep the labels bounded
+            cluster = "unknown"
+        metrics.HTTP_LATENCY.observe(time.time() - started,
+                                     route=route,
+                                     method=request.method,
+                                     cluster=cluster)
+        metrics.HTTP_REQUESTS.inc(route=route,
+                                  method=request.method,
+                                  cluster=cluster,
+                                  status=resp.status)
+        for (cluster_name, exception) in request.get("wildlife_errors", ()):
+            metrics.HTTP_ERRORS.inc(cluster=cluster_name,
+                                    exception=exception)
+        return resp
+
+    def _compress(self, request, resp):
+        conf = getattr(self.app.wild and self.app.wild.config,
+                       "compression", None)
+        opts = compress.options(conf)
+        if (resp.status < 200 or resp.status in (204, 304) or
+                "Content-Encoding" in resp.headers or resp.body is None):
+            return
+        resp.headers.add("Vary", "Accept-Encoding")
+        encoding = compress.negotiate(request.headers.get("Accept-Encoding"),
+                                      opts)
+        if encoding is None or len(resp.body) < int(opts["min_size"]):
+            return
+        resp.body = compress.compress(resp.body, encoding, opts)
+        resp.headers["Content-Encoding"] = encoding
+        etag = resp.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            # the compressed bytes are not those of the identity encoding
+            resp.headers["ETag"] = "W/" + etag
+
+    async def _admit(self, request, cluster_name):
+        """queue or reject the request on the budgets of the cluster
+
+        A full in-flight cap rejects the request at once, since waiting
+        for a slot would block the event loop.
+        """
+
+        zcl_mngr = self.app.managers[cluster_name]
+        limiter = zcl_mngr.limiter
+        if limiter is None:
+            return None
+        kind = "read" if request.method in ("GET", "HEAD") else "write"
+        caller = wildutils.caller_identity(request.headers, request.remote,
+                                           zcl_mngr.sessions)
+        wait = limiter.reserve(kind, caller)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            limiter.acquire(0)
+        except limits.RateLimitedError:
+            limiter.refund(kind, caller)
+            raise
+        return limiter
+
+    async def _call(self, cluster_name, headers, method, *args, **kwargs):
+        """issue a KazooClient async method and wait for its result,
+        through a pooled session if the headers carry an acl
+
+        The reads of SHARED_METHODS wait for the identical call in flight
+        for the same auth identity, if any.
+        """
+
+        zcl_mngr = self.app.managers[cluster_name]
+        zcl_mngr.checkReady()
+        acl_config = wildutils.ACLConfig(headers)
+        if method not in SHARED_METHODS:
+            return await self._issue(zcl_mngr, acl_config, method,
+                                     *args, **kwargs)
+        identity = None
+        if acl_config.check_acl():
+            identity = (acl_config.scheme, acl_config.credential)
+        key = (cluster_name, identity, method, args,
+               tuple(sorted(kwargs.items())))
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._issue(zcl_mngr, acl_config,
+                                                     method, *args,
+                                                     **kwargs))
+            self._flights[key] = task
+            task.add_done_callback(
+                lambda done: self._flights.pop(key, None))
+        # a cancelled caller must not cancel the call of the others
+        return await asyncio.shield(task)
+
+    async def _issue(self, zcl_mngr, acl_config, method, *args, **kwargs):
+        if not acl_config.check_acl():
+            zclient = zcl_mngr._client
+            return await wait_result(getattr(zclient, method)(
+                *args, **kwargs))
+        loop = asyncio.get_event_loop()
+        # starting a pooled session blocks on the handshake
+        zclient = await loop.run_in_executor(None,
+                                             zcl_mngr.sessions.acquire,
+                                             acl_config.scheme,
+                                             acl_config.credential)
+        try:
+            return await wait_result(getattr(zclient, method)(
+                *args, **kwargs))
+        finally:
+            await loop.run_in_executor(None, zcl_mngr.sessions.release,
+                                       zclient)
+
+    async def _not_modified(self, request, cluster_name, znode,
+                            kind="data"):
+        """the 304 response if the If-None-Match header of the request
+        matches the current ETag of the znode, else None
+        """
+
+        if_none_match = request.headers.get("If-None-Match")
+        if not if_none_match:
+            return None
+        zstat = await self._call(cluster_name, request.headers,
+                                 "exists_async", znode)
+        if zstat is None:
+            raise kz_exceptions.NoNodeError()
+        etag = wildutils.znode_etag(zstat, kind)
+        # a weak comparison, as werkzeug does for the Flask routes
+        for tag in (tag.strip() for tag in if_none_match.split(",")):
+            weak = tag.startswith("W/")
+            if tag == "*" or (tag[2:] if weak else tag).strip('"') == etag:
+                break
+        else:
+            return None
+        headers = _etag(etag)
+        if weak:
+            # the ETag sent along with a compressed representation
+            headers["ETag"] = "W/" + headers["ETag"]
+        return web.Response(status=304,
+                            headers=dict(headers, Vary="Accept-Encoding"))
+
+    def _invalidate(self, cluster_name, znode):
+        # as wildlife.rest.invalidate_znode, the parent listing included
+        zcl_mngr = self.app.managers[cluster_name]
+        znode = wildutils.znode_path(znode)
+        if zcl_mngr.cache is not None:
+            zcl_mngr.cache.invalidate(znode)
+        if zcl_mngr.children_cache is not None:
+            zcl_mngr.children_cache.invalidate(znode)
+            zcl_mngr.children_cache.invalidate(posixpath.dirname(znode))
+
+    async def clusters(self, request):
+        data = {"clusters": list(self.app.clusters.keys()),
+                "ready": dict((name, manager.ready.is_set())
+                              for (name, manager)
+                              in self.app.managers.items())}
+        return _json(data)
+
+    async def all_clusters_znode(self, request):
+        znode = _znode(request)
+        names = request.query.get("clusters")
+        if names:
+            names = [name.strip() for name in names.split(",")
+                     if name.strip()]
+        else:
+            names = sorted(self.app.clusters or [])
+        try:
+            timeout = min(max(float(request.query.get("timeout",
+                                                      FANOUT_TIMEOUT)), 0),
+                          FANOUT_MAX_TIMEOUT)
+        except ValueError:
+            return web.Response(text="Please use a timeout in seconds.\n",
+                                status=400,
+                                content_type="text/html")
+
+        async def admitted_read(cluster_name):
+            self.app.managers[cluster_name].checkReady()
+            limiter = await self._admit(request, cluster_name)
+            try:
+                return await self._call(cluster_name, request.headers,
+                                        "get_async", znode)
+            finally:
+                if limiter is not None:
+                    limiter.release()
+
+        async def read(cluster_name):
+            if cluster_name not in self.app.clusters:
+                return {"error": "UnknownCluster", "status": 404}
+            try:
+                zdata = await asyncio.wait_for(admitted_read(cluster_name),
+                                               timeout)
+            except asyncio.TimeoutError:
+                return {"error": "Timeout", "status": 504}
+            except ClusterNotReadyError as excp:
+                return {"error": excp.__class__.__name__, "status": 503}
+            except limits.RateLimitedError as excp:
+                return {"error": excp.__class__.__name__, "status": 429}
+            except Exception as excp:
+                _record_error(request, cluster_name, excp)
+                return {"error": excp.__class__.__name__,
+                        "status": wildutils.znode_error(excp)[1]}
+            return dict(wildutils.znode_data(zdata[0]),
+                        znodeStat=wildutils.convert_zstat(zdata[1]))
+
+        results = await asyncio.gather(*[read(cluster_name)
+                                         for cluster_name in names])
+        return _json(dict(zip(names, results)))
+
+    @cluster_znode_exception
+    async def detail_cluster(self, request, cluster_name, znode):
+        return _json(self.app.managers[cluster_name].describe())
+
+    @cluster_znode_exception
+    async def cluster_list_children(self, request, cluster_name, znode):
+        zchildren = await self._call(cluster_name, request.headers,
+                                     "get_children_async", "/")
+        return _text(str(zchildren))
+
+    @cluster_znode_exception
+    async def cluster_znode(self, request, cluster_name, znode):
+        if request.method == "GET":
+            resp = await self._not_modified(request, cluster_name, znode)
+            if resp is not None:
+                return resp
+            zdata = await self._call(cluster_name, request.headers,
+                                     "get_async", znode)
+            data = dict(wildutils.znode_data(zdata[0]),
+                        znodeStat=wildutils.convert_zstat(zdata[1]))
+            resp = _json(data)
+            resp.headers.update(_etag(wildutils.znode_etag(zdata[1])))
+            return resp
+        elif request.method == "PUT":
+            _new_data = await request.read()
+            try:
+                zstat = await self._call(cluster_name, request.headers,
+                                         "set_async", znode, _new_data,
+                                         version=_expected_version(request))
+            except kz_exceptions.BadVersionError:
+                return _precondition_failed(request, cluster_name, znode)
+            self._invalidate(cluster_name, znode)
+            data = dict(wildutils.znode_data(_new_data),
+                        znodeStat=wildutils.convert_zstat(zstat))
+            resp = _json(data, status=201)
+            resp.headers.update(_etag(wildutils.znode_etag(zstat)))
+            return resp
+        elif request.method == "DELETE":
+            try:
+                await self._call(cluster_name, request.headers,
+                                 "delete_async", znode,
+                                 version=_expected_version(request))
+            except kz_exceptions.BadVersionError:
+                return _precondition_failed(request, cluster_name, znode)
+            self._invalidate(cluster_name, znode)
+            return web.Response(text="Successfully Delete Znode [%s] from "
+                                     "Cluster [%s].\n" % (znode,
+                                                          cluster_name),
+                                status=202,
+                                content_type="text/html")
+
+    @cluster_znode_exception
+    async def cluster_znode_acls(self, request, cluster_name, znode):
+        if request.method == "PUT":
+            if request.content_type not in ["text/plain", "text/xml"]:
+                return web.Response(text="The Content-Type is not "
+                                         "supported. Please use text/plain "
+                                         "or text/xml. \n",
+                                    status=406,
+                                    content_type="text/html")
+            acls_raw = ast.literal_eval(await request.text())
+            acls_list = [wildutils.ACLConfig(_acl_raw).make_acl()
+                         for _acl_raw in acls_raw]
+            zstat = await self._call(cluster_name, request.headers,
+                                     "set_acls_async", znode, acls_list)
+            return _json({"znodeStat": wildutils.convert_zstat(zstat)},
+                         status=201)
+        resp = await self._not_modified(request, cluster_name, znode,
+                                        "acls")
+        if resp is not None:
+            return resp
+        acls = await self._call(cluster_name, request.headers,
+                                "get_acls_async", znode)
+        resp = _text(str(acls[0]))
+        resp.headers.update(_etag(wildutils.znode_etag(acls[1], "acls")))
+        return resp
+
+    @cluster_znode_exception
+    async def cluster_znode_data(self, request, cluster_name, znode):
+        resp = await self._not_modified(request, cluster_name, znode)
+        if resp is not None:
+            return resp
+        zdata = await self._call(cluster_name, request.headers,
+                                 "get_async", znode)
+        accept = request.headers.get("Accept", "")
+        content_type = ("text/plain"
+                        if "text/plain" in accept and
+                        "application/octet-stream" not in accept
+                        else "application/octet-stream")
+        return web.Response(body=zdata[0] or b"",
+                            content_type=content_type,
+                            headers=_etag(wildutils.znode_etag(zdata[1])))
+
+    @cluster_znode_exception
+    async def cluster_znode_children(self, request, cluster_name, znode):
+        include_stat = wildutils.get_bool(request.query.get("include_stat",
+                                                            False))
+        if not include_stat:
+            resp = await self._not_modified(request, cluster_name, znode,
+                                            "children")
+            if resp is not None:
+                return resp
+        (zchildren, zstat) = await self._call(cluster_name, request.headers,
+                                              "get_children_async", znode,
+                                              include_data=True)
+        if not any(arg in request.query
+                   for arg in wildutils.CHILDREN_ARGS):
+            resp = _text(str(zchildren))
+        else:
+            data = wildutils.page_children(sorted(zchildren), zstat,
+                                           request.query)
+            if include_stat:
+                parent = wildutils.znode_path(znode)
+                stats = await asyncio.gather(*[
+                    self._call(cluster_name, request.headers,
+                               "exists_async",
+                               posixpath.join(parent, name))
+                    for name in data["children"]])
+                data["children"] = [
+                    {"name": name,
+                     "znodeStat": (wildutils.convert_zstat(stat)
+                                   if stat is not None else None)}
+                    for (name, stat) in zip(data["children"], stats)]
+            resp = _json(data)
+        if not include_stat:
+            resp.headers.update(_etag(wildutils.znode_etag(zstat,
+                                                           "children")))
+        return resp
+
+    async def cluster_metrics(self, request):
+        return web.Response(body=metrics.REGISTRY.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; "
+                                                     "version=0.0.4; "
+                                                     "charset=utf-8"})
+
+
+def serve(app, conf):
+    """start WildLife and serve the REST APIs of the WildApp on asyncio
+    """
+
+    aio_app = AsyncWild(app).make_app()
+
+    async def set_executor(aio_app):
+        # runs the pooled session handshakes, which block
+        asyncio.get_event_loop().set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(int(conf["threads"])))
+
+    aio_app.on_startup.append(set_executor)
+    app._startWild()
+    try:
+        web.run_app(aio_app,
+                    host=conf["host"],
+                    port=int(conf["port"]),
+                    backlog=int(conf["backlog"]),
+                    keepalive_timeout=int(conf["keepalive"]))
+    finally:
+        app._stopWild()
@@ -26,22 +26,42 @@ class WildApp(Flask):
                              instance_path=instance_path,
                              instance_relative_config=instance_relative_config)
         self.conf_path = conf_path
-        self.managers = None
-        self.clusters = None
+        self.wild = None
+
+    @property
+    def managers(self):
+        # always follow the latest reloaded configuration
+        if self.wild is None or self.wild.config is None:
+            return None
+        return self.wild.config.managers
+
+    @property
+    def clusters(self):
+        if self.wild is None or self.wild.config is None:
+            return None
+        return self.wild.config.clusters
 
     def _startWild(self):
         self.log.debug("Start WildLife")
         self.wild = WildLife(self.conf_path)
         try:
             self.wild.updateConfig()
-            self.managers = self.wild.config.managers
-            self.clusters = self.wild.config.clusters
         except IOError:
             self.log.error("Unable to find configuration file "
                            "%s" % self.conf_path)
         self.wild.start()
+        if self.wild.config is not None and self.wild.config.startup_timeout:
+            connecting = self.wild.waitReady(self.wild.config.startup_timeout)
+            if connecting:
+                self.log.warning("Clusters %s are still connecting, serve "
+                                 "them once ready." % connecting)
 
     def _stopWild(self):
         self.log.debug("Stop WildLife")
-        self.wild = WildLife(self.conf_path)
-        self.wild.stop()
+        if self.wild is not None and self.wild.config is not None:
+            self.wild.stop()
+
+    def _reloadWild(self):
+        self.log.debug("Reload WildLife")
+        if self.wild is not None:
+            self.wild.reload()
@@ -0,0 +1,407 @@
+import posixpath
+import collections
+import logging
+from kazoo import exceptions as kz_exceptions
+from kazoo.protocol.states import ZnodeStat
+from kazoo.security import ACL
+from wildlife import wildutils
+
+
+log = logging.getLogger("wildlife.bulk")
+
+# Operations per ZooKeeper multi-op, keeping a request below jute.maxbuffer
+TXN_CHUNK_SIZE = 100
+
+TXN_OPS = ("create", "set", "delete", "check")
+
+# Znodes read in flight while walking a subtree
+TREE_WINDOW = 64
+
+
+TreeNode = collections.namedtuple("TreeNode",
+                                  "path data stat children error")
+
+
+class SkippedError(kz_exceptions.KazooException):
+    """The operation was not submitted since a previous chunk failed
+    """
+
+    pass
+
+
+def parent_paths(path):
+    """return all the ancestors of a znode path, the nearest one first
+    """
+
+    parents = list()
+    path = posixpath.dirname(path.rstrip("/"))
+    while path and path != "/":
+        parents.append(path)
+        path = posixpath.dirname(path)
+    return parents
+
+
+def ensure_parents(client, paths, acl=None, known=None):
+    """create the missing parents of the znode paths, each parent once
+
+    :param known: a set of paths known to exist, updated in place
+    """
+
+    if known is None:
+        known = set()
+    for path in paths:
+        for parent in reversed(parent_paths(path)):
+            if parent in known:
+                continue
+            client.ensure_path(parent, acl=acl)
+            known.add(parent)
+    return known
+
+
+def check_window(window, name="window"):
+    """return window if at least one request may be in flight
+
+    :param name: the name of the argument in the error message
+    :raises: ValueError
+    """
+
+    if window < 1:
+        raise ValueError("The %s must be at least 1, not %s" % (name, window))
+    return window
+
+
+def walk_tree(client, root, window=TREE_WINDOW, data=True):
+    """walk the subtree beneath root in breadth-first order
+
+    The reads are pipelined, keeping at most ``window`` znodes in flight.
+    Znodes deleted during the walk are skipped.
+
+    :param data: False to skip reading the data of the znodes
+    :returns: a generator of :class:`TreeNode`, whose error is the
+        exception raised on reading the znode, if any
+    :raises: ValueError if window is below 1, before walking any znode
+    """
+
+    return _walkTree(client, root, check_window(window), data)
+
+
+def _walkTree(client, root, window, data):
+    pending = collections.deque([root])
+    inflight = collections.deque()
+    while pending or inflight:
+        while pending and len(inflight) < window:
+            path = pending.popleft()
+            inflight.append((path,
+                             client.get_async(path) if data else None,
+                             client.get_children_async(path,
+                                                       include_data=True)))
+        (path, data_result, children_result) = inflight.popleft()
+        try:
+            (children, stat) = children_result.get()
+            zdata = data_result.get()[0] if data else None
+        except kz_exceptions.NoNodeError:
+            continue
+        except kz_exceptions.KazooException as excp:
+            yield TreeNode(path, None, None, None, excp)
+            continue
+        for child in sorted(children):
+            pending.append(posixpath.join(path, child))
+        yield TreeNode(path, zdata, stat, children, None)
+
+
+def stat_paths(client, paths, window=TREE_WINDOW):
+    """read the znodeStat of the znodes on paths, keeping at most
+    ``window`` exists calls in flight
+
+    :returns: a generator of (path, znodeStat), whose znodeStat is None if
+        the znode has been deleted
+    """
+
+    paths = iter(paths)
+    inflight = collections.deque()
+    while True:
+        for path in paths:
+            inflight.append((path, client.exists_async(path)))
+            if len(inflight) >= window:
+                break
+        if not inflight:
+            return
+        (path, result) = inflight.popleft()
+        yield (path, result.get())
+
+
+def delete_tree(client, root, window=TREE_WINDOW, version=-1,
+                dry_run=False):
+    """delete the subtree beneath root bottom-up
+
+    The subtree is walked first, then its znodes are deleted in reverse
+    breadth-first order with at most ``window`` deletes in flight. Since
+    ZooKeeper applies the requests of a session in order, the children are
+    always deleted before their parent.
+
+    :param version: the expected version of root, checked before deleting
+        any znode
+    :param dry_run: True to only walk the subtree
+    :returns: (paths of the znodes deleted, or to be deleted on a dry run,
+        list of {"path": path, "error": exception name} of the failures)
+    """
+
+    check_window(window)
+    stat = client.exists(root)
+    if stat is None:
+        raise kz_exceptions.NoNodeError()
+    if version != -1 and stat.version != version:
+        raise kz_exceptions.BadVersionError()
+    paths = list()
+    failed = list()
+    for node in walk_tree(client, root, window=window, data=False):
+        # the znodes whose children cannot be read fail to be deleted
+        if node.error is not None and dry_run:
+            failed.append({"path": node.path,
+                           "error": node.error.__class__.__name__})
+        paths.append(node.path)
+    if dry_run:
+        return (paths, failed)
+
+    deleted = list()
+    inflight = collections.deque()
+    for path in reversed(paths):
+        inflight.append((path,
+                         client.delete_async(
+                             path, version=version if path == root else -1)))
+        while len(inflight) >= window or (inflight and path == root):
+            (_path, result) = inflight.popleft()
+            try:
+                result.get()
+                deleted.append(_path)
+            except kz_exceptions.NoNodeError:
+                continue
+            except kz_exceptions.KazooException as excp:
+                failed.append({"path": _path,
+                               "error": excp.__class__.__name__})
+    return (deleted, failed)
+
+
+def add_txn_op(txn, op, acl=None):
+    """add an operation to a kazoo transaction
+
+    :param op: a dict like {"op": "set", "path": "/a", "data": "x",
+        "version": -1}, whose "acl" of a create is a list of acl dicts
+        or of kazoo ACLs
+    :param acl: the default acl of the created znodes
+    """
+
+    _op = op.get("op", "create")
+    path = op["path"]
+    version = int(op.get("version", -1))
+    if _op == "create":
+        if op.get("acl") is not None:
+            acl = [_acl if isinstance(_acl, ACL)
+                   else wildutils.ACLConfig(_acl).make_acl()
+                   for _acl in op["acl"]]
+        txn.create(path,
+                   value=wildutils.get_bytes(op.get("data")),
+                   acl=acl,
+                   ephemeral=wildutils.get_bool(op.get("ephemeral", False)),
+                   sequence=wildutils.get_bool(op.get("sequence", False)))
+    elif _op == "set":
+        txn.set_data(path, wildutils.get_bytes(op.get("data")),
+                     version=version)
+    elif _op == "delete":
+        txn.delete(path, version=version)
+    elif _op == "check":
+        txn.check(path, version)
+    else:
+        raise ValueError("Unknown transaction operation %s on "
+                         "%s" % (_op, path))
+
+
+def commit_ops(client, ops, acl=None, chunk_size=TXN_CHUNK_SIZE):
+    """submit the operations through ZooKeeper multi-ops of chunk_size
+
+    Every chunk is atomic. Once a chunk fails, the following chunks are
+    not submitted.
+
+    :returns: a list with the result of every operation, i.e. the created
+        path, the ZnodeStat, True or the exception of the operation
+    """
+
+    results = list()
+    failed = False
+    for start in range(0, len(ops), chunk_size):
+        chunk = ops[start:start + chunk_size]
+        if failed:
+            results.extend([SkippedError()] * len(chunk))
+            continue
+        txn = client.transaction()
+        for op in chunk:
+            add_txn_op(txn, op, acl=acl)
+        chunk_results = txn.commit()
+        failed = any(isinstance(_result, Exception)
+                     for _result in chunk_results)
+        results.extend(chunk_results)
+    return results
+
+
+def convert_result(op, result):
+    """convert the result of commit_ops to a json serializable dict
+    """
+
+    data = {"op": op.get("op", "create"),
+            "path": op["path"]}
+    if isinstance(result, Exception):
+        data["error"] = result.__class__.__name__
+    elif isinstance(result, ZnodeStat):
+        data["znodeStat"] = wildutils.convert_zstat(result)
+    elif result is not True:
+        data["path"] = result
+    return data
+
+
+def first_error(results):
+    """return the exception failing a chunk, ignoring the rolled back ones
+    """
+
+    errors = [_result for _result in results
+              if isinstance(_result, Exception)]
+    for error in errors:
+        if not isinstance(error, (kz_exceptions.RolledBackError,
+                                  SkippedError)):
+            return error
+    return errors[0] if errors else None
+
+
+class TreeImporter(object):
+    """Restore znodes from (path, data[, acl]) records in batched
+    transactions
+
+    Records are grouped into multi-ops of ``chunk_size`` znodes, creating
+    the missing znodes and setting the data of the existing ones, with at
+    most ``window`` transactions in flight. The missing parents outside of
+    the records are created once. A failing chunk is retried znode by znode
+    so that only the faulty znodes are reported.
+
+    :param client: the KazooClient to restore the znodes with
+    :param acl: the default acl of the created znodes
+    """
+
+    def __init__(self, client, acl=None, chunk_size=TXN_CHUNK_SIZE,
+                 window=4):
+        self.client = client
+        self.acl = acl
+        self.chunk_size = chunk_size
+        self.window = window
+        self.created = list()
+        self.updated = list()
+        self.failed = list()
+        self._known = set(["/"])
+        self._chunk = list()
+        self._inflight = collections.deque()
+        self._creating = dict()
+
+    def add(self, path, data, acl=None):
+        """queue a znode to be restored
+
+        :param acl: a list of acl dicts as accepted by
+            :class:`wildlife.wildutils.ACLConfig`
+        """
+
+        if acl is not None:
+            acl = [wildutils.ACLConfig(_acl).make_acl() for _acl in acl]
+        self._chunk.append((path, wildutils.get_bytes(data), acl))
+        if len(self._chunk) >= self.chunk_size:
+            self._submit()
+
+    def fail(self, path, excp):
+        self.failed.append({"path": path,
+                            "error": excp.__class__.__name__})
+
+    def finish(self):
+        """submit the queued znodes and wait for all the transactions
+        """
+
+        if self._chunk:
+            self._submit()
+        while self._inflight:
+            self._complete()
+
+    def _submit(self):
+        chunk = self._chunk
+        self._chunk = list()
+        stats = [self.client.exists_async(_path) for (_path, _, _) in chunk]
+        paths = set()
+        txn = self.client.transaction()
+        ops = list()
+        for ((path, data, acl), stat) in zip(chunk, stats):
+            try:
+                exists = stat.get() is not None
+                if not exists:
+                    self._ensureParents(path, paths)
+            except kz_exceptions.KazooException as excp:
+                self.fail(path, excp)
+                continue
+            if exists:
+                txn.set_data(path, data)
+                self._known.add(path)
+            else:
+                txn.create(path, value=data, acl=acl or self.acl)
+            paths.add(path)
+            ops.append((path, data, acl, exists))
+        if not ops:
+            return
+        entry = (ops, txn.commit_async())
+        for (path, _, _, exists) in ops:
+            if not exists:
+                self._creating[path] = entry
+        self._inflight.append(entry)
+        while len(self._inflight) > self.window:
+            self._complete()
+
+    def _ensureParents(self, path, paths):
+        for parent in reversed(parent_paths(path)):
+            if parent in self._known or parent in paths:
+                continue
+            entry = self._creating.get(parent)
+            # wait for the transactions creating the parent
+            while entry is not None and entry in self._inflight:
+                self._complete()
+            if parent not in self._known:
+                self.client.ensure_path(parent, acl=self.acl)
+                self._known.add(parent)
+
+    def _complete(self):
+        (ops, result) = self._inflight.popleft()
+        for (path, _, _, exists) in ops:
+            self._creating.pop(path, None)
+        try:
+            results = result.get()
+        except kz_exceptions.KazooException as excp:
+            results = [excp]
+        if any(isinstance(_result, Exception) for _result in results):
+            self._retry(ops)
+            return
+        for (path, _, _, exists) in ops:
+            self._known.add(path)
+            (self.updated if exists else self.created).append(path)
+
+    def _retry(self, ops):
+        for (path, data, acl, exists) in ops:
+            try:
+                if exists:
+                    self.client.set(path, data)
+                    self.updated.append(path)
+                else:
+                    self.client.create(path, value=data,
+                                       acl=acl or self.acl,
+                                       makepath=True)
+                    self.created.append(path)
+                self._known.add(path)
+            except kz_exceptions.NodeExistsError:
+                try:
+                    self.client.set(path, data)
+                    self.updated.append(path)
+                    self._known.add(path)
+                except kz_exceptions.KazooException as excp:
+                    self.fail(path, excp)
+            except kz_exceptions.KazooException as excp:
+                self.fail(path, excp)
@@ -0,0 +1,246 @@
+import threading
+import collections
+import logging
+from wildlife import wildutils
+
+
+class WatchedCache(object):
+    """Base class of the in-memory caches kept current by ZooKeeper watches
+
+    An entry is populated on the first read, which also registers a watch
+    on the znode. Watch events invalidate the entry so that the next read
+    fetches the fresh value from ZooKeeper again. Entries are evicted in
+    LRU order once the cached bytes exceed ``max_bytes``. Entries are kept
+    under the absolute paths of the watch events, whichever spelling the
+    callers use.
+
+    :param client: the KazooClient used to populate the cache
+    :param max_bytes: the upper bound of the cached bytes
+    :param flights: a :class:`wildlife.flight.SingleFlight` sharing the
+        fetches of concurrent misses of a path
+    """
+
+    log = logging.getLogger("wildlife.WatchedCache")
+
+    # Approximate bookkeeping bytes of an entry besides its data
+    entry_overhead = 256
+
+    def __init__(self, client, max_bytes, flights=None):
+        self.client = client
+        self.max_bytes = max_bytes
+        self.flights = flights
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        """Return the cached value of the znode on path
+        """
+
+        path = wildutils.znode_path(path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._entries[path] = entry
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        if self.flights is None:
+            return self._load(path)
+        # the concurrent misses of the path share the fetch of the first
+        return self.flights.do((None, self.__class__.__name__, path),
+                               self._load, path)[0]
+
+    def _load(self, path):
+        with self._lock:
+            token = object()
+            self._pending[path] = token
+
+        value = self._fetch(path)
+
+        with self._lock:
+            # a watch event fired while fetching makes the value stale
+            if self._pending.get(path) is token:
+                del self._pending[path]
+                self._put(path, value)
+        return value
+
+    def peek(self, path):
+        """Return the cached value of the znode on path, or None if it is
+        not cached, without reading ZooKeeper
+        """
+
+        path = wildutils.znode_path(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            return entry[0] if entry is not None else None
+
+    def _fetch(self, path):
+        raise NotImplementedError()
+
+    def _sizeof(self, path, value):
+        raise NotImplementedError()
+
+    def _put(self, path, value):
+        # must be called with self._lock held
+        size = self._sizeof(path, value)
+        if size > self.max_bytes:
+            return
+        self._entries[path] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            (_, (_, _size)) = self._entries.popitem(last=False)
+            self.size -= _size
+            self.evictions += 1
+
+    def _watcher(self, event):
+        self.log.debug("Invalidate cached %s on %s "
+                       "event" % (event.path, event.type))
+        self.invalidate(event.path)
+
+    def invalidate(self, path):
+        path = wildutils.znode_path(path)
+        with self._lock:
+            self._pending.pop(path, None)
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self.size -= entry[1]
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries, e.g. when the watches may have been lost
+        """
+
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._pending.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "bytes": self.size,
+                    "max_bytes": self.max_bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "invalidations": self.invalidations,
+                    "evictions": self.evictions}
+
+
+class ZnodeCache(WatchedCache):
+    """Cache the (data, znodeStat) of znodes, kept current by data watches
+    """
+
+    log = logging.getLogger("wildlife.ZnodeCache")
+
+    def _fetch(self, path):
+        return self.client.get(path, watch=self._watcher)
+
+    def _sizeof(self, path, value):
+        return len(path) + len(value[0] or "") + self.entry_overhead
+
+
+class ChildrenCache(WatchedCache):
+    """Cache the (children, znodeStat) of znodes, kept current by
+    children watches
+
+    The znodeStat of the parent is kept along with its children, so its
+    ``cversion`` and ``pzxid`` tell which version of the listing is cached.
+    """
+
+    log = logging.getLogger("wildlife.ChildrenCache")
+
+    # Approximate bookkeeping bytes of a child name in the listing
+    child_overhead = 64
+
+    def _fetch(self, path):
+        return self.client.get_children(path, watch=self._watcher,
+                                        include_data=True)
+
+    def _sizeof(self, path, value):
+        return (len(path) + self.entry_overhead +
+                sum(len(child) + self.child_overhead
+                    for child in value[0]))
+
+
+class ChildrenSnapshots(object):
+    """Keep the sorted children listings of znodes, so that paging through
+    a huge listing does not sort it again on every page
+
+    A snapshot is only reused while the ``pzxid`` and ``aversion`` of the
+    znode are unchanged, i.e. no child has been created or deleted and the
+    acls have not been updated since it was taken. Snapshots are kept per
+    session identity and evicted in LRU order once they hold more than
+    ``max_children`` names.
+
+    :param max_children: the upper bound of the names kept in all snapshots
+    """
+
+    def __init__(self, max_children):
+        self.max_children = max_children
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._snapshots = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def get(self, path, identity, znodestat):
+        """Return the sorted children of the znode on path as of its
+        znodeStat, or None if there is no such snapshot
+        """
+
+        key = (wildutils.znode_path(path), identity)
+        with self._lock:
+            snapshot = self._snapshots.pop(key, None)
+            if snapshot is None:
+                self.misses += 1
+                return None
+            self._snapshots[key] = snapshot
+            if snapshot[0] != (znodestat.pzxid, znodestat.aversion):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return snapshot[1]
+
+    def put(self, path, identity, znodestat, children):
+        """Sort and keep the children of the znode on path
+        """
+
+        names = sorted(children)
+        key = (wildutils.znode_path(path), identity)
+        with self._lock:
+            previous = self._snapshots.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            if len(names) <= self.max_children:
+                self._snapshots[key] = ((znodestat.pzxid,
+                                         znodestat.aversion), names)
+                self.size += len(names)
+            while self.size > self.max_children:
+                (_, (_, _names)) = self._snapshots.popitem(last=False)
+                self.size -= len(_names)
+                self.evictions += 1
+        return names
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._snapshots),
+                    "children": self.size,
+                    "max_children": self.max_children,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
@@ -25,6 +25,7 @@ pid_file_module = extras.try_imports(['daemon.pidlockfile', 'daemon.pidfile'])
 
 import logging.config
 import os
+from wildlife import server
 import sys
 import signal
 import traceback
@@ -80,12 +81,48 @@ class WildLifeDaemon(object):
 
     def parse_arguments(self):
         parser = argparse.ArgumentParser(description='Conf Wildlife')
-        pass
-        # todo
         parser.add_argument('-c', dest='config',
                             default='/etc/wildlife/wildlife.yaml',
                             help='path to config file')
+        parser.add_argument('-d', dest='nodaemon', action='store_true',
+                            help='do not run as a daemon')
+        parser.add_argument('-l', dest='logconfig',
+                            help='path to log config file')
+        parser.add_argument('-p', dest='pidfile',
+                            default='/var/run/wildlife/wildlife.pid',
+                            help='path to pid file')
+        parser.add_argument('--version', dest='version', action='store_true',
+                            help='show version')
+        # Options of the WSGI server, overriding the "server" section of
+        # the config file
+        parser.add_argument('--server', dest='server',
+                            choices=server.SERVERS,
+                            help='WSGI server to serve the REST APIs')
+        parser.add_argument('--host', dest='host',
+                            help='address to bind')
+        parser.add_argument('--port', dest='port', type=int,
+                            help='port to bind')
+        parser.add_argument('--workers', dest='workers', type=int,
+                            help='number of worker processes (gunicorn)')
+        parser.add_argument('--threads', dest='threads', type=int,
+                            help='number of threads per worker')
+        parser.add_argument('--streams', dest='streams', type=int,
+                            help='number of long-polls and event streams '
+                                 'served at once (werkzeug)')
+        parser.add_argument('--backlog', dest='backlog', type=int,
+                            help='maximum number of pending connections')
+        parser.add_argument('--keepalive', dest='keepalive', type=int,
+                            help='seconds to keep an idle connection alive')
         self.args = parser.parse_args()
+        self.args.config = os.path.abspath(self.args.config)
+
+    def server_options(self):
+        from wildlife import WildLife
+        options = dict(WildLife(self.args.config).loadConfig().server)
+        for key in server.DEFAULTS:
+            if getattr(self.args, key) is not None:
+                options[key] = getattr(self.args, key)
+        return options
 
     def setup_logging(self):
         if self.args.logconfig:
@@ -102,6 +139,11 @@ class WildLifeDaemon(object):
     def exit_handler(self, signum, frame):
         self.wild._stopWild()
 
+    def reload_handler(self, signum, frame):
+        # gunicorn takes SIGHUP over in its master and forwards it to the
+        # workers, see wildlife.server
+        self.wild._reloadWild()
+
     def term_handler(self, signum, frame):
         os._exit(0)
 
@@ -110,6 +152,7 @@ class WildLifeDaemon(object):
         from wildlife.rest import app as wld_app, main as wld_main
 
         self.wild = wld_app
+        self.wild.conf_path = self.args.config
 
         signal.signal(signal.SIGINT, self.exit_handler)
         # For back compatibility:
@@ -117,9 +160,9 @@ class WildLifeDaemon(object):
 
         signal.signal(signal.SIGUSR2, stack_dump_handler)
         signal.signal(signal.SIGTERM, self.term_handler)
+        signal.signal(signal.SIGHUP, self.reload_handler)
 
-        # todo: hosts=?
-        wld_main()
+        wld_main(**self.server_options())
 
         while True:
             signal.pause()
@@ -130,8 +173,9 @@ def main():
     wld.parse_arguments()
 
     if wld.args.version:
-        # todo
-        pass
+        from pbr.version import VersionInfo
+        print(VersionInfo('wildlife').version_string())
+        return 0
 
     pid = pid_file_module.TimeoutPIDLockFile(wld.args.pidfile, 10)
     if is_pidfile_stale(pid):
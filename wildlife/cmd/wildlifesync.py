@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import logging
+import os
+import sys
+from kazoo.client import KazooClient
+from wildlife import bulk
+from wildlife import sync
+
+
+def window(value):
+    try:
+        return bulk.check_window(int(value))
+    except ValueError as excp:
+        raise argparse.ArgumentTypeError(str(excp))
+
+
+class WildLifeSync(object):
+    """Compare the same subtree on two clusters of the config file and
+    optionally apply the differences to the target one
+    """
+
+    def __init__(self):
+        self.args = None
+
+    def parse_arguments(self):
+        parser = argparse.ArgumentParser(
+            description='Diff and sync a subtree between two clusters')
+        parser.add_argument('-c', dest='config',
+                            default='/etc/wildlife/wildlife.yaml',
+                            help='path to config file')
+        parser.add_argument('source',
+                            help='name of the source cluster')
+        parser.add_argument('target',
+                            help='name of the target cluster')
+        parser.add_argument('root', nargs='?', default='/',
+                            help='path of the subtree to compare')
+        parser.add_argument('--apply', dest='apply', action='store_true',
+                            help='apply the differences to the target')
+        parser.add_argument('--window', dest='window', type=window,
+                            default=bulk.TREE_WINDOW,
+                            help='maximum number of znodes read in flight')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int,
+                            default=bulk.TXN_CHUNK_SIZE,
+                            help='operations per transaction')
+        parser.add_argument('--state', dest='state',
+                            help='path to a file remembering the znodes '
+                                 'found equal, to skip reading their data '
+                                 'on the next run')
+        parser.add_argument('-v', dest='verbose', action='store_true',
+                            help='log the ZooKeeper sessions')
+        self.args = parser.parse_args()
+        self.args.config = os.path.abspath(self.args.config)
+
+    def get_client(self, config, name):
+        cluster = config.clusters.get(name)
+        if cluster is None:
+            raise KeyError("No cluster named %s in %s" % (name,
+                                                          self.args.config))
+        client = KazooClient(hosts=cluster.hosts,
+                             timeout=cluster.timeout,
+                             auth_data=cluster.auth_data,
+                             randomize_hosts=cluster.randomize_hosts)
+        client.start()
+        return client
+
+    def load_memo(self):
+        memo = sync.SyncMemo()
+        if self.args.state and os.path.exists(self.args.state):
+            with open(self.args.state) as fp:
+                memo.load(json.load(fp))
+        return memo
+
+    def save_memo(self, memo):
+        if self.args.state:
+            with open(self.args.state, "w") as fp:
+                json.dump(memo.dump(), fp)
+
+    def main(self):
+        from wildlife import WildLife
+
+        logging.basicConfig(
+            level=logging.DEBUG if self.args.verbose else logging.WARNING)
+        config = WildLife(self.args.config).loadConfig()
+        source = self.get_client(config, self.args.source)
+        target = self.get_client(config, self.args.target)
+        try:
+            memo = self.load_memo()
+            diff = sync.TreeDiff(source, target,
+                                 "/" + self.args.root.strip("/"),
+                                 window=self.args.window,
+                                 memo=memo).run()
+            data = diff.summary()
+            if self.args.apply:
+                results = diff.apply(chunk_size=self.args.chunk_size)
+                data["applied"] = len([result
+                                       for (_, _, result) in results
+                                       if not isinstance(result,
+                                                         Exception)])
+                data["errors"] = [
+                    bulk.convert_result({"op": op, "path": path}, result)
+                    for (op, path, result) in results
+                    if isinstance(result, Exception)]
+            self.save_memo(memo)
+        finally:
+            for client in (source, target):
+                client.stop()
+                client.close()
+        print(json.dumps(data, indent=2, sort_keys=True))
+        if data["failed"] or data.get("errors"):
+            return 1
+        return 0
+
+
+def main():
+    wls = WildLifeSync()
+    wls.parse_arguments()
+    return wls.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import zlib
+
+
+# Content-Encodings in order of preference
+ENCODINGS = ("zstd", "gzip")
+
+DEFAULTS = {"enabled": True,
+            "min_size": 1024,
+            "gzip_level": 6,
+            "zstd_level": 3}
+
+# Streams whose events must reach the client as soon as they are sent
+UNCOMPRESSED_MIMETYPES = ("text/event-stream",)
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def options(conf=None):
+    """the compression options, i.e. the keys of DEFAULTS overridden by
+    the ``compression`` section of the configuration
+    """
+
+    opts = dict(DEFAULTS)
+    opts.update((k, v) for (k, v) in (conf or {}).items() if v is not None)
+    return opts
+
+
+def negotiate(accept_encoding, opts):
+    """the Content-Encoding to answer an Accept-Encoding header with, or
+    None to leave the response uncompressed
+
+    ``zstd`` is only offered if the zstandard package is installed.
+    """
+
+    if not opts["enabled"] or not accept_encoding:
+        return None
+    accepted = dict()
+    for item in accept_encoding.split(","):
+        params = item.strip().split(";")
+        quality = 1.0
+        for param in params[1:]:
+            (name, _, value) = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[params[0].strip().lower()] = quality
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality <= 0:
+            continue
+        if encoding == "zstd" and _zstandard() is None:
+            continue
+        return encoding
+    return None
+
+
+class Compressor(object):
+    """An incremental compressor of one response body
+
+    :param encoding: "gzip" or "zstd"
+    :param opts: the compression options, see :func:`options`
+    """
+
+    def __init__(self, encoding, opts):
+        self.encoding = encoding
+        if encoding == "zstd":
+            zstd = _zstandard()
+            self._obj = zstd.ZstdCompressor(
+                level=int(opts["zstd_level"])).compressobj()
+        else:
+            self._obj = zlib.compressobj(int(opts["gzip_level"]),
+                                         zlib.DEFLATED,
+                                         16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+def compress(data, encoding, opts):
+    """compress a whole response body
+    """
+
+    compressor = Compressor(encoding, opts)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_iter(chunks, encoding, opts):
+    """compress a streamed response body chunk by chunk, so that it is
+    never held in memory at once
+    """
+
+    compressor = Compressor(encoding, opts)
+    try:
+        for chunk in chunks:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode("utf-8")
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # e.g. the teardown of stream_with_context
+        if hasattr(chunks, "close"):
+            chunks.close()
@@ -0,0 +1,66 @@
+import threading
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Share one in-flight call among the identical calls made meanwhile
+
+    The first caller of a key runs the call, the callers of the same key
+    arriving before it returns wait for it and get the same result or
+    exception, so that a burst of identical reads costs ZooKeeper a single
+    request.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, func, *args, **kwargs):
+        """call func(*args, **kwargs), or wait for the identical call in
+        flight under key
+
+        :returns: (result, shared), shared being True if the result comes
+            from the call of another caller
+        """
+
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return (call.value, True)
+        try:
+            call.value = func(*args, **kwargs)
+        except BaseException as excp:
+            call.error = excp
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return (call.value, False)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls,
+                    "shared": self.shared,
+                    "inflight": len(self._calls)}
@@ -0,0 +1,204 @@
+import threading
+import time
+import collections
+
+
+# Callers whose token buckets are kept per cluster, in LRU order
+MAX_CALLERS = 10000
+
+
+class RateLimitedError(Exception):
+    """The request exceeds a budget of the cluster
+
+    :param retry_after: seconds after which the request may be admitted
+    """
+
+    def __init__(self, message, retry_after):
+        super(RateLimitedError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket(object):
+    """A token bucket refilled with ``rate`` tokens per second up to
+    ``burst`` tokens
+
+    A request short of tokens reserves the next one, so that requests
+    queued for a token are admitted in order.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """take a token, waiting at most max_wait seconds for it
+
+        :returns: the seconds to wait before using the token
+        :raises: RateLimitedError if the token comes later than max_wait
+        """
+
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if wait > max_wait:
+                raise RateLimitedError("Rate limit exceeded", wait)
+            self.tokens -= 1
+            return wait
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class InflightCap(object):
+    """Bound the number of requests served at once
+
+    :param limit: the maximum number of requests in flight
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.inflight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while self.inflight >= self.limit:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RateLimitedError("Too many requests in flight", 1)
+                self._cond.wait(remaining)
+            self.inflight += 1
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+
+class ClusterLimiter(object):
+    """The admission control of the requests to one cluster
+
+    Reads and writes are admitted by separate token buckets for the whole
+    cluster and for every caller, and the requests in flight are capped.
+    A request is queued for at most ``max_wait`` seconds before being
+    rejected.
+
+    :param conf: the ``rate_limits`` of the cluster configuration, e.g.
+        {"read": {"rate": 1000, "burst": 2000}, "write": {"rate": 100},
+        "client_read": {"rate": 50}, "client_write": {"rate": 10},
+        "max_inflight": 256, "max_wait": 0.5}, every key being optional
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.max_wait = float(conf.get("max_wait", 0))
+        self.buckets = dict()
+        for kind in ("read", "write"):
+            if conf.get(kind):
+                self.buckets[kind] = self._bucket(conf[kind])
+        self.inflight = None
+        if conf.get("max_inflight"):
+            self.inflight = InflightCap(int(conf["max_inflight"]))
+        self.rejected = 0
+        self._callers = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, conf):
+        return TokenBucket(conf["rate"], conf.get("burst"))
+
+    def _callerBucket(self, kind, caller):
+        conf = self.conf.get("client_" + kind)
+        if not conf:
+            return None
+        key = (kind, caller)
+        with self._lock:
+            bucket = self._callers.pop(key, None)
+            if bucket is None:
+                bucket = self._bucket(conf)
+            self._callers[key] = bucket
+            while len(self._callers) > MAX_CALLERS:
+                self._callers.popitem(last=False)
+        return bucket
+
+    def reserve(self, kind, caller, max_wait=None):
+        """take the tokens of a "read" or "write" request of caller
+
+        :returns: the seconds to wait before serving the request
+        :raises: RateLimitedError if it would wait longer than max_wait
+        """
+
+        if max_wait is None:
+            max_wait = self.max_wait
+        buckets = [self.buckets.get(kind), self._callerBucket(kind, caller)]
+        taken = list()
+        wait = 0.0
+        try:
+            for bucket in buckets:
+                if bucket is not None:
+                    wait = max(wait, bucket.reserve(max_wait))
+                    taken.append(bucket)
+        except RateLimitedError:
+            for bucket in taken:
+                bucket.refund()
+            with self._lock:
+                self.rejected += 1
+            raise
+        return wait
+
+    def refund(self, kind, caller):
+        """give back the tokens taken by :meth:`reserve`
+        """
+
+        for bucket in (self.buckets.get(kind),
+                       self._callerBucket(kind, caller)):
+            if bucket is not None:
+                bucket.refund()
+
+    def admit(self, kind, caller):
+        """take the tokens of a request, wait for them and then for a slot
+        in flight, see :meth:`release`
+
+        :raises: RateLimitedError, refunding the tokens if no slot frees
+            up in time
+        """
+
+        wait = self.reserve(kind, caller)
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            self.acquire(max(self.max_wait - wait, 0))
+        except RateLimitedError:
+            self.refund(kind, caller)
+            raise
+
+    def acquire(self, timeout):
+        """take a slot in flight, see :meth:`release`
+        """
+
+        if self.inflight is None:
+            return
+        try:
+            self.inflight.acquire(timeout)
+        except RateLimitedError:
+            with self._lock:
+                self.rejected += 1
+            raise
+
+    def release(self):
+        if self.inflight is not None:
+            self.inflight.release()
+
+    def stats(self):
+        with self._lock:
+            return {"rejected": self.rejected,
+                    "callers": len(self._callers),
+                    "inflight": (self.inflight.inflight
+                                 if self.inflight is not None else None)}
@@ -1,39 +1,191 @@
 import threading
-from kazoo.client import KazooClient
+import random
+import time
+from kazoo.client import KazooState
+from wildlife.metrics import MeteredKazooClient
+from wildlife.pool import SessionPool
+from wildlife.cache import ZnodeCache, ChildrenCache, ChildrenSnapshots
+from wildlife.flight import SingleFlight
+from wildlife.limits import ClusterLimiter
+from wildlife.watch import WatchHub, EventHub
 import logging
 
 
+class ClusterNotReadyError(Exception):
+    """The ClusterManager has not connected to the cluster yet
+    """
+
+    pass
+
+
 class ClusterManager(threading.Thread):
+    """Keep the connection to a ZooKeeper cluster alive
+
+    The manager sleeps on a condition variable and is woken up by the
+    KazooClient connection state listener. Whenever the session is lost,
+    it reconnects with an exponential backoff and jitter.
+
+    :param cluster: the :class:`wildlife.wildutils.Cluster` configuration
+    """
 
     log = logging.getLogger("wildlife.ClusterManager")
 
+    # Backoff in seconds between two reconnecting attempts
+    backoff_initial = 0.5
+    backoff_max = 60.0
+
     def __init__(self, cluster):
         super(ClusterManager, self).__init__(name=cluster.name)
         self.cluster = cluster
         self.name = self.cluster.name
         self._client = None
         self._stopped = False
+        self._cond = threading.Condition()
+        self.sessions = SessionPool(cluster,
+                                    max_size=cluster.session_pool_size,
+                                    idle_timeout=cluster.session_idle_timeout)
+        self.state = KazooState.LOST
+        self.last_state_change = time.time()
+        self.reconnects = 0
+        # set once connected, cleared while the session is being recreated
+        self.ready = threading.Event()
+        self.cache = None
+        self.children_cache = None
+        self.snapshots = None
+        if cluster.snapshot_max_children > 0:
+            self.snapshots = ChildrenSnapshots(cluster.snapshot_max_children)
+        self.watches = None
+        self.events = None
+        # SyncMemo of the diffs against every target cluster
+        self.sync_memos = dict()
+        self.limiter = None
+        if cluster.rate_limits:
+            self.limiter = ClusterLimiter(cluster.rate_limits)
+        # the identical reads in flight, shared by their callers
+        self.flights = SingleFlight()
 
     def stop(self):
-        self._stopped = True
-        self._client.stop()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self.sessions.close()
+        if self.events is not None:
+            self.events.close()
+        if self._client is not None:
+            self._client.stop()
+
+    def describe(self):
+        """the cluster configuration along with the connection details
+        and cache statistics, without the auth_data
+        """
+
+        info = dict(self.cluster.__dict__)
+        info.pop("auth_data", None)
+        info["connection"] = self.state
+        info["ready"] = self.ready.is_set()
+        info["last_state_change"] = self.last_state_change
+        info["reconnects"] = self.reconnects
+        info["cache"] = dict()
+        if self.cache is not None:
+            info["cache"]["znodes"] = self.cache.stats()
+        if self.children_cache is not None:
+            info["cache"]["children"] = self.children_cache.stats()
+        if self.snapshots is not None:
+            info["cache"]["snapshots"] = self.snapshots.stats()
+        if self.limiter is not None:
+            info["limits"] = self.limiter.stats()
+        info["flights"] = self.flights.stats()
+        return info
+
+    def checkReady(self):
+        if not self.ready.is_set():
+            raise ClusterNotReadyError("Cluster %s is still "
+                                       "connecting" % self.name)
 
     def _getClient(self):
         self.log.debug("Get KazooClient for %s" % self.name)
-        return KazooClient(hosts=self.cluster.hosts,
-                           timeout=self.cluster.timeout,
-                           auth_data=self.cluster.auth_data,
-                           randomize_hosts=self.cluster.randomize_hosts,
-                           logger=self.log)
+        return MeteredKazooClient(self.cluster.name,
+                                  hosts=self.cluster.hosts,
+                                  timeout=self.cluster.timeout,
+                                  auth_data=self.cluster.auth_data,
+                                  randomize_hosts=self.cluster.randomize_hosts,
+                                  logger=self.log)
+
+    def _stateListener(self, state):
+        # Called from the KazooClient connection thread, must not block
+        self.log.debug("Connection state of %s changed to "
+                       "%s" % (self.name, state))
+        if state != KazooState.CONNECTED:
+            # watch events may be missed while disconnected
+            for cache in (self.cache, self.children_cache):
+                if cache is not None:
+                    cache.clear()
+        if state == KazooState.CONNECTED:
+            self.ready.set()
+        elif state == KazooState.LOST:
+            self.ready.clear()
+            if self.watches is not None:
+                self.watches.reset()
+        with self._cond:
+            self.state = state
+            self.last_state_change = time.time()
+            self._cond.notify_all()
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max,
+                    self.backoff_initial * (2 ** min(attempts, 16)))
+        return random.uniform(delay / 2.0, delay)
 
     def run(self):
         self._client = self._getClient()
-        while not self._stopped:
-            if not self._client.connected:
-                try:
-                    self._client.stop()
-                    self._client.start()
-                except Exception as excp:
-                    self.log.exception("Exception of %s: "
-                                       "%s" % (self.cluster.name,
-                                               excp))
+        self.watches = WatchHub(self._client)
+        self.events = EventHub(self._client)
+        if self.cluster.cache_max_bytes > 0:
+            self.cache = ZnodeCache(self._client,
+                                    self.cluster.cache_max_bytes,
+                                    flights=self.flights)
+        if self.cluster.children_cache_max_bytes > 0:
+            self.children_cache = ChildrenCache(
+                self._client, self.cluster.children_cache_max_bytes,
+                flights=self.flights)
+        self._client.add_listener(self._stateListener)
+        attempts = 0
+        connected_once = False
+        while True:
+            connected = False
+            with self._cond:
+                # SUSPENDED is recovered by KazooClient itself, only a
+                # LOST session needs to be restarted
+                if (not self._stopped and
+                        self.state != KazooState.LOST):
+                    attempts = 0
+                    connected = True
+                    # also woken up to stop the pooled sessions left idle
+                    self._cond.wait(self.sessions.idle_timeout or None)
+            if connected:
+                # stopping sessions blocks, not under the condition
+                self.sessions.expire()
+                continue
+            with self._cond:
+                if self._stopped:
+                    return
+                if self.state != KazooState.LOST:
+                    continue
+                if attempts:
+                    self._cond.wait(self._backoff(attempts))
+                    if self._stopped:
+                        return
+                    if self.state != KazooState.LOST:
+                        continue
+            attempts += 1
+            try:
+                self._client.stop()
+                self._client.start()
+                if connected_once:
+                    with self._cond:
+                        self.reconnects += 1
+                connected_once = True
+            except Exception as excp:
+                self.log.exception("Exception of %s: "
+                                   "%s" % (self.cluster.name,
+                                           excp))
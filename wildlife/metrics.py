@@ -0,0 +1,243 @@
+import threading
+import time
+import bisect
+from kazoo.client import KazooClient
+
+
+# Default buckets of the latency histograms in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\")
+            .replace("\n", "\\n").replace('"', '\\"'))
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, _escape(value))
+                             for (name, value) in pairs)
+
+
+class Metric(object):
+    """Base class of the metrics exposed in the Prometheus text format
+
+    :param name: the metric name
+    :param doc: the help text of the metric
+    :param labels: the names of the labels
+    """
+
+    kind = None
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self):
+        return ["# HELP %s %s" % (self.name, self.doc),
+                "# TYPE %s %s" % (self.name, self.kind)]
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for (key, value) in items:
+            lines.append("%s%s %s" % (self.name,
+                                      _labels(self.labels, key),
+                                      repr(float(value))))
+        return lines
+
+
+class Counter(Metric):
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=BUCKETS):
+        super(Histogram, self).__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = self._values[key]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts[0][index] += 1
+            counts[1] += 1
+            counts[2] += value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((key, ([list(counts[0])] + counts[1:]))
+                           for (key, counts) in self._values.items())
+        for (key, (buckets, count, total)) in items:
+            cumulative = 0
+            for (bound, bucket) in zip(self.buckets, buckets):
+                cumulative += bucket
+                lines.append("%s_bucket%s %d" % (
+                    self.name,
+                    _labels(self.labels, key, ("le", repr(bound))),
+                    cumulative))
+            lines.append("%s_bucket%s %d" % (
+                self.name, _labels(self.labels, key, ("le", "+Inf")), count))
+            lines.append("%s_sum%s %s" % (self.name,
+                                          _labels(self.labels, key),
+                                          repr(total)))
+            lines.append("%s_count%s %d" % (self.name,
+                                            _labels(self.labels, key),
+                                            count))
+        return lines
+
+
+class Gauge(Metric):
+    """A gauge whose samples are collected on rendering
+
+    :param collect: a callable returning a list of (labels dict, value)
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=(), collect=None):
+        super(Gauge, self).__init__(name, doc, labels)
+        self.collect = collect
+
+    def render(self):
+        lines = self.header()
+        for (labels, value) in (self.collect() if self.collect else []):
+            lines.append("%s%s %s" % (self.name,
+                                      _labels(self.labels,
+                                              self._key(labels)),
+                                      repr(float(value))))
+        return lines
+
+
+class Registry(object):
+    """A set of metrics rendered together
+    """
+
+    def __init__(self):
+        self.metrics = list()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = list()
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "wildlife_http_requests_total",
+    "HTTP requests served",
+    ("route", "method", "cluster", "status")))
+
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "wildlife_http_request_duration_seconds",
+    "Latency of the HTTP requests",
+    ("route", "method", "cluster")))
+
+HTTP_ERRORS = REGISTRY.register(Counter(
+    "wildlife_http_errors_total",
+    "Exceptions handled on serving the HTTP requests",
+    ("cluster", "exception")))
+
+ZK_LATENCY = REGISTRY.register(Histogram(
+    "wildlife_zookeeper_op_duration_seconds",
+    "Latency of the ZooKeeper operations",
+    ("cluster", "op")))
+
+ZK_ERRORS = REGISTRY.register(Counter(
+    "wildlife_zookeeper_op_errors_total",
+    "Failed ZooKeeper operations",
+    ("cluster", "op", "exception")))
+
+
+class MeteredKazooClient(KazooClient):
+    """A KazooClient recording the latency of its ZooKeeper operations
+
+    The synchronous methods of KazooClient wait for their asynchronous
+    counterparts, so metering the latter covers both.
+
+    :param cluster_name: the cluster label of the recorded metrics
+    """
+
+    def __init__(self, cluster_name, **kwargs):
+        super(MeteredKazooClient, self).__init__(**kwargs)
+        self.cluster_name = cluster_name
+
+    def _metered(self, op, result):
+        start = time.time()
+
+        def record(async_result):
+            ZK_LATENCY.observe(time.time() - start,
+                               cluster=self.cluster_name, op=op)
+            if not async_result.successful():
+                ZK_ERRORS.inc(cluster=self.cluster_name, op=op,
+                              exception=async_result.exception
+                              .__class__.__name__)
+
+        result.rawlink(record)
+        return result
+
+    def get_async(self, path, watch=None):
+        return self._metered("get", super(MeteredKazooClient, self)
+                             .get_async(path, watch=watch))
+
+    def exists_async(self, path, watch=None):
+        return self._metered("exists", super(MeteredKazooClient, self)
+                             .exists_async(path, watch=watch))
+
+    def set_async(self, path, value, version=-1):
+        return self._metered("set", super(MeteredKazooClient, self)
+                             .set_async(path, value, version=version))
+
+    def create_async(self, *args, **kwargs):
+        return self._metered("create", super(MeteredKazooClient, self)
+                             .create_async(*args, **kwargs))
+
+    def delete_async(self, path, version=-1):
+        return self._metered("delete", super(MeteredKazooClient, self)
+                             .delete_async(path, version=version))
+
+    def get_children_async(self, path, watch=None, include_data=False):
+        return self._metered("get_children",
+                             super(MeteredKazooClient, self)
+                             .get_children_async(path, watch=watch,
+                                                 include_data=include_data))
+
+    def get_acls_async(self, path):
+        return self._metered("get_acls", super(MeteredKazooClient, self)
+                             .get_acls_async(path))
+
+    def set_acls_async(self, path, acls, version=-1):
+        return self._metered("set_acls", super(MeteredKazooClient, self)
+                             .set_acls_async(path, acls, version=version))
@@ -0,0 +1,195 @@
+import threading
+import time
+import collections
+from wildlife.flight import SingleFlight
+from wildlife.metrics import MeteredKazooClient
+import logging
+
+
+class _Session(object):
+    """A pooled KazooClient along with its bookkeeping
+    """
+
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.last_used = time.time()
+        self.in_use = 0
+        self.evicted = False
+
+
+class SessionPool(object):
+    """A pool of authenticated KazooClient sessions for one cluster
+
+    Sessions are keyed by (scheme, credential), reused across requests and
+    evicted in LRU order once ``max_size`` is exceeded or after being idle
+    for more than ``idle_timeout`` seconds. A session still checked out by
+    a request is only stopped after it has been released.
+
+    :param cluster: the :class:`wildlife.wildutils.Cluster` configuration
+    :param max_size: the maximum number of sessions kept in the pool
+    :param idle_timeout: seconds before an unused session is evicted
+    """
+
+    log = logging.getLogger("wildlife.SessionPool")
+
+    def __init__(self, cluster, max_size=32, idle_timeout=300.0):
+        self.cluster = cluster
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._handshakes = SingleFlight()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _getClient(self, scheme, credential):
+        self.log.debug("Create a pooled KazooClient for %s "
+                       "with scheme %s" % (self.cluster.name, scheme))
+        return MeteredKazooClient(self.cluster.name,
+                                  hosts=self.cluster.hosts,
+                                  timeout=self.cluster.timeout,
+                                  auth_data=[(scheme, credential)],
+                                  randomize_hosts=self.cluster.randomize_hosts,
+                                  logger=self.log)
+
+    def acquire(self, scheme, credential):
+        """Check out a started KazooClient authenticated with
+        (scheme, credential), creating one if it is not pooled yet
+
+        The concurrent requests of a key not pooled yet share the
+        handshake of a single session. Every call must be paired with
+        :meth:`release`.
+        """
+
+        key = (scheme, credential)
+        while True:
+            session = self._checkout(key)
+            if session is not None:
+                return session.client
+            self._handshakes.do(key, self._startSession, key)
+
+    def _checkout(self, key):
+        expired = list()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SessionPool of %s has been "
+                                   "closed" % self.cluster.name)
+            expired.extend(self._expire())
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.pop(key)
+                self._sessions[key] = session
+                session.in_use += 1
+                session.last_used = time.time()
+        self._stopSessions(expired)
+        return session
+
+    def _startSession(self, key):
+        client = self._getClient(*key)
+        try:
+            client.start()
+        except Exception:
+            self._stopClient(client)
+            raise
+        duplicate = None
+        with self._lock:
+            if key in self._sessions or self._closed:
+                duplicate = client
+                evicted = list()
+            else:
+                session = _Session(key, client)
+                client._wildlife_session = session
+                self._sessions[key] = session
+                evicted = self._evict()
+        if duplicate is not None:
+            self._stopClient(duplicate)
+        self._stopSessions(evicted)
+
+    def authenticated(self, scheme, credential):
+        """whether a pooled session has been authenticated with
+        (scheme, credential)
+        """
+
+        with self._lock:
+            return (scheme, credential) in self._sessions
+
+    def release(self, client):
+        """Return a KazooClient checked out by :meth:`acquire`
+        """
+
+        session = getattr(client, "_wildlife_session", None)
+        if session is None:
+            return
+        stop = None
+        with self._lock:
+            session.in_use -= 1
+            session.last_used = time.time()
+            if session.evicted and session.in_use <= 0:
+                stop = session
+        if stop is not None:
+            self._stopClient(stop.client)
+
+    def expire(self):
+        """Stop the sessions idle for more than idle_timeout seconds, as
+        acquire does, for the pools no longer checked out from
+        """
+
+        with self._lock:
+            expired = self._expire()
+        self._stopSessions(expired)
+
+    def close(self):
+        """Stop every pooled session and refuse further checkouts
+        """
+
+        with self._lock:
+            self._closed = True
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            idle = list()
+            for session in sessions:
+                session.evicted = True
+                if session.in_use <= 0:
+                    idle.append(session)
+        self._stopSessions(idle)
+
+    def _expire(self):
+        # must be called with self._lock held
+        if not self.idle_timeout:
+            return []
+        deadline = time.time() - self.idle_timeout
+        expired = [session for session in self._sessions.values()
+                   if session.in_use <= 0 and session.last_used < deadline]
+        for session in expired:
+            self._drop(session)
+        return expired
+
+    def _evict(self):
+        # must be called with self._lock held
+        # sessions still checked out are stopped on their last release
+        evicted = list()
+        while len(self._sessions) > self.max_size:
+            session = self._sessions.popitem(last=False)[1]
+            session.evicted = True
+            if session.in_use <= 0:
+                evicted.append(session)
+        return evicted
+
+    def _drop(self, session):
+        self._sessions.pop(session.key, None)
+        session.evicted = True
+
+    def _stopSessions(self, sessions):
+        for session in sessions:
+            self._stopClient(session.client)
+
+    def _stopClient(self, client):
+        try:
+            client.stop()
+            client.close()
+        except Exception as excp:
+            self.log.exception("Exception on stopping pooled KazooClient "
+                               "of %s: %s" % (self.cluster.name, excp))
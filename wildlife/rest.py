@@ -1,11 +1,23 @@
 from wildlife import WildApp
 import os
-from flask import make_response, request, Response
+from flask import make_response, request, Response, g, stream_with_context
 from wildlife import kz_exceptions
 import json
-import exceptions
 import functools
+import math
+import posixpath
+import threading
+import time
+import six
+from six.moves import queue
 from wildlife import wildutils
+from wildlife import bulk
+from wildlife import limits
+from wildlife import compress
+from wildlife import server
+from wildlife import sync
+from wildlife import metrics
+from wildlife.manager import ClusterNotReadyError
 
 
 # change to current directory
@@ -16,42 +28,65 @@ app = WildApp("wildlife for zookeeper",
               conf_path)
 
 
+# Maximum number of ZooKeeper requests in flight for a batch request
+BATCH_WINDOW = 1000
+
+# Content types of the raw data of a znode, the first one by default
+DATA_MIMETYPES = ["application/octet-stream", "text/plain"]
+
+# Maximum seconds a request may wait for a znode to change
+WATCH_MAX_TIMEOUT = 300
+
+# Maximum events buffered per subscriber of the subtree events
+EVENTS_MAX_BUFFER = 10000
+
+# Seconds between two keep-alive comments of an idle event stream
+EVENTS_KEEPALIVE = 15
+
+# Default and maximum seconds to wait for each cluster of a fan-out read
+FANOUT_TIMEOUT = 5
+FANOUT_MAX_TIMEOUT = 60
+
+
+def znode_error_status(excp):
+    """map an exception raised by KazooClient to a HTTP status code, as
+    cluster_znode_exception does
+    """
+
+    return wildutils.znode_error(excp)[1]
+
+
 def cluster_znode_exception(func):
     @functools.wraps(func)
-    def wrapper(cluster_name, znode):
+    def wrapper(cluster_name, znode, **kwargs):
         try:
             if cluster_name not in app.clusters:
                 return make_response("You Haven't Configured Cluster "
                                      "[%s]." % cluster_name,
                                      404)
-            return func(cluster_name, znode)
-        except (kz_exceptions.ConnectionClosedError,
-                kz_exceptions.ConnectionDropped,
-                kz_exceptions.ConnectionLoss,
-                kz_exceptions.ConnectionLossException):
-                return make_response("Connection Exception When Interacts "
-                                     "with Cluster [%s].\n" % cluster_name,
-                                     408)
-        except kz_exceptions.NoNodeException:
-            return make_response("Cannot Find Znode [%s] in Cluster "
-                                 "[%s].\n" % (znode, cluster_name),
-                                 404)
-        except kz_exceptions.InvalidACLException:
-            return make_response("Invalid ACLs on Accessing Znode [%s] in "
-                                 "Cluster [%s].\n" % (znode, cluster_name),
-                                 401)
-        except kz_exceptions.NoAuthException:
-            return make_response("Please Provide ACLs to Access Znode [%s] in "
-                                 "Cluster [%s].\n" % (znode, cluster_name),
-                                 401)
-        except kz_exceptions.ZookeeperError:
-            return make_response("ZooKeeper Server Error on Interacting with "
-                                 "Cluster [%s].\n" % cluster_name,
-                                 406)
-        except exceptions as excp:
-            return make_response("Unable to Handle this Request with "
-                                 "exception: %s.\n" % excp,
-                                 500)
+            admit(cluster_name)
+            try:
+                return func(cluster_name, znode, **kwargs)
+            except Exception as excp:
+                record_error(cluster_name, excp)
+                raise
+        except limits.RateLimitedError as excp:
+            resp = make_response("Too Many Requests to Cluster [%s]. Please "
+                                 "Retry Later.\n" % cluster_name,
+                                 429)
+            resp.headers["Retry-After"] = str(
+                int(math.ceil(max(excp.retry_after, 1))))
+            return resp
+        except ClusterNotReadyError:
+            resp = make_response("Cluster [%s] is Still Connecting. Please "
+                                 "Retry Later.\n" % cluster_name,
+                                 503)
+            resp.headers["Retry-After"] = "1"
+            return resp
+        except Exception as excp:
+            return make_response(*wildutils.znode_error(excp,
+                                                        cluster_name,
+                                                        znode))
     return wrapper
 
 
@@ -77,6 +112,9 @@ def hello():
         http://[host]:[port]/wildlife/[cluster_name]/[znode]
         e.g. http://localhost:5000/wildlife/cluster01/znode1/znode2/znode3
 
+        get the znode data including the znodeStat from every cluster: \
+        http://[host]:[port]/wildlife/_all/[znode]?clusters=[cluster_name]
+
         get the acls of a znode in a specific cluster: \
         http://[host]:[port]wildlife/[cluster_name]/[znode]/acls
 
@@ -84,15 +122,48 @@ def hello():
         http://[host]:[port]/wildlife/[cluster_name]/[znode]/children
         e.g. http://localhost:5000/wildlife/cluster01/znode1/znode2/children
 
+        page through the children of a znode as json: \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/children?limit=[n]
+        e.g. http://localhost:5000/wildlife/cluster01/queue/children?limit=100
+
         get only the data of a znode in a specific cluster: \
         http://[host]:[port]/wildlife/[cluster_name]/[znode]/data
         e.g. http://localhost:5000/wildlife/cluster01/znode1/znode2/znode3/data
 
+        wait for a znode modified after since_mzxid (long-polling): \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/watch
+        e.g. http://localhost:5000/wildlife/cluster01/znode1/watch?timeout=30
+
+        stream the changes of the subtree beneath a znode (SSE): \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/events
+
+        export the subtree beneath a znode as newline-delimited json: \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/tree
+        e.g. http://localhost:5000/wildlife/cluster01/znode1/tree
+
+        compare a subtree with the same subtree on a target cluster: \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/diff?target=[c]
+
+        get the metrics in the Prometheus text format: \
+        http://[host]:[port]/metrics
+
 
     ``POST``
         create a znode in a specific cluster: \
         http://[host]:[port]/wildlife/[cluster_name]
 
+        get many znodes including their znodeStat in one request: \
+        http://[host]:[port]/wildlife/[cluster_name]/_batch_get
+
+        submit creates, sets, deletes and checks in transactions: \
+        http://[host]:[port]/wildlife/[cluster_name]/_txn
+
+        import the subtree beneath a znode from newline-delimited json: \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/_import
+
+        apply the differences of a subtree to a target cluster: \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]/diff?target=[c]
+
 
     ``PUT``
         update the znode data: \
@@ -103,6 +174,9 @@ def hello():
         delete the znode: \
         http://[host]:[port]/wildlife/[cluster_name]/[znode]
 
+        delete the subtree beneath a znode: \
+        http://[host]:[port]/wildlife/[cluster_name]/[znode]?recursive=true
+
     """
 
     usage_msg = "<br/>\n".join(["Welcome to WildLife: The REST APIs for "
@@ -121,13 +195,16 @@ def clusters():
     ``Response`` (json data):
         {
 
-         "clusters": [cluster_list]
+         "clusters": [cluster_list],
+         "ready": {"cluster01": true, "cluster02": false}
 
         }
 
     """
 
-    data = {"clusters": app.clusters.keys()}
+    data = {"clusters": list(app.clusters.keys()),
+            "ready": dict((name, manager.ready.is_set())
+                          for (name, manager) in app.managers.items())}
 
     resp = Response(json.dumps(data),
                     status=200,
@@ -148,6 +225,13 @@ def detail_cluster(cluster_name, znode):
         {
 
          "connection": "CONNECTED",
+         "ready": true,
+         "last_state_change": 1449033225.435,
+         "reconnects": 0,
+         "cache": {"znodes": {"entries": 120, "bytes": 81920,
+                              "max_bytes": 67108864, "hits": 9000,
+                              "misses": 120, "invalidations": 3,
+                              "evictions": 0}},
          "hosts": "10.x.xx.xxx:2181,10.x.xx.xxx:2182",
          "name": "cluster01",
          "timeout": 10.0,
@@ -157,10 +241,7 @@ def detail_cluster(cluster_name, znode):
 
     """
 
-    _cluster_info = dict()
-    _cluster_info.update(app.clusters[cluster_name].__dict__)
-    _cluster_info.pop("auth_data", None)
-    _cluster_info["connection"] = app.managers[cluster_name]._client.state
+    _cluster_info = app.managers[cluster_name].describe()
     resp = Response(json.dumps(_cluster_info),
                     status=200,
                     mimetype="application/json")
@@ -203,20 +284,36 @@ def cluster_create_znode(cluster_name, znode, headers=None):
     ``Response`` (string):
         [created_znode_path_list]
 
+    ``POST`` http://[host]:[port]/wildlife/[cluster_name]?transaction=true
+
+    Create all the znodes through ZooKeeper multi-ops of ``chunk_size``
+    (default 100) znodes instead of one request per znode. The missing
+    parents are created beforehand, and every chunk is atomic.
+
+    ``Response`` (json data):
+        see `cluster_txn`
+
     """
 
     _zclient = get_client(cluster_name,
                           headers or request.headers)
-    acl_config = wildutils.ACLConfig(headers or request.headers)
+    acl = header_acls(headers or request.headers)
     data = request_data(request)
+    if wildutils.get_bool(request.args.get("transaction", False)):
+        chunk_size = txn_chunk_size()
+        ops = [{"op": "create", "path": _znode, "data": _zdata}
+               for (_znode, _zdata) in data.items()]
+        bulk.ensure_parents(_zclient, data.keys(), acl=acl)
+        return commit_txn(cluster_name, _zclient, ops, acl, chunk_size)
     real_path_list = list()
     for (_znode, _zdata) in data.items():
         _znodepath = _zclient.create(_znode,
-                                     value=bytes(_zdata),
+                                     value=wildutils.get_bytes(_zdata),
                                      makepath=True,
-                                     acl=acl_config.make_acl(),
+                                     acl=acl,
                                      ephemeral=False,
                                      sequence=False)
+        invalidate_znode(cluster_name, _znodepath)
         real_path_list.append(_znodepath)
     resp = Response(str(real_path_list),
                     status=200,
@@ -224,6 +321,98 @@ def cluster_create_znode(cluster_name, znode, headers=None):
     return resp
 
 
+@app.route("/wildlife/<cluster_name>/_txn", methods=["POST"],
+           defaults={"znode": None})
+@cluster_znode_exception
+def cluster_txn(cluster_name, znode, headers=None):
+    """submit creates, sets, deletes and version checks as ZooKeeper
+    multi-op transactions
+
+    The operations are committed in chunks of ``chunk_size`` (default
+    100) operations. Every chunk is atomic; once a chunk fails the
+    following chunks are skipped.
+
+    ``POST`` http://[host]:[port]/wildlife/[cluster_name]/_txn?chunk_size=100
+
+    ``Headers`` (optional, if you need want to create these znodes
+        with an acl or the znodes you are accessing need an acl):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1",
+          "all": True
+
+         }
+
+    ``Content-Type``: "application/json"
+
+    ``DATA``:
+        [
+         {"op": "create", "path": "/znode1", "data": "data1"},
+         {"op": "check", "path": "/znode2", "version": 3},
+         {"op": "set", "path": "/znode2", "data": "data2", "version": 3},
+         {"op": "delete", "path": "/znode3", "version": -1}
+        ]
+
+    ``Response`` (json data):
+        {
+
+         "atomic": true,
+         "results": [
+            {"op": "create", "path": "/znode1"},
+            {"op": "check", "path": "/znode2"},
+            {"op": "set", "path": "/znode2", "znodeStat": {...}},
+            {"op": "delete", "path": "/znode3"}
+         ]
+
+        }
+
+        The status is 200 if all the operations succeed, otherwise the
+        status of the failing operation with its "error" in results.
+
+    """
+
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    ops = request.get_json(force=True)
+    if (not isinstance(ops, list) or
+            not all(isinstance(_op, dict) and _op.get("op") in bulk.TXN_OPS
+                    and "path" in _op for _op in ops)):
+        return make_response("Please POST a JSON list of operations, each "
+                             "with a 'path' and an 'op' of %s.\n"
+                             % ", ".join(bulk.TXN_OPS),
+                             400)
+    return commit_txn(cluster_name, _zclient, ops,
+                      header_acls(headers or request.headers),
+                      txn_chunk_size())
+
+
+def txn_chunk_size():
+    """the ``chunk_size`` argument of the request
+
+    :raises: ValueError if it is below 1
+    """
+
+    return bulk.check_window(int(request.args.get("chunk_size",
+                                                  bulk.TXN_CHUNK_SIZE)),
+                             name="chunk_size")
+
+
+def commit_txn(cluster_name, zclient, ops, acl, chunk_size):
+    results = bulk.commit_ops(zclient, ops, acl=acl, chunk_size=chunk_size)
+    for (_op, _result) in zip(ops, results):
+        if not isinstance(_result, Exception):
+            invalidate_znode(cluster_name, _op["path"])
+    error = bulk.first_error(results)
+    data = {"atomic": len(ops) <= chunk_size,
+            "results": [bulk.convert_result(_op, _result)
+                        for (_op, _result) in zip(ops, results)]}
+    resp = Response(json.dumps(data),
+                    status=200 if error is None else znode_error_status(error),
+                    mimetype="application/json")
+    return resp
+
+
 @app.route("/wildlife/<cluster_name>/list", methods=["GET"],
            defaults={"znode": None})
 @cluster_znode_exception
@@ -250,6 +439,187 @@ def cluster_list_children(cluster_name, znode, headers=None):
                                   headers=headers or request.headers)
 
 
+@app.route("/wildlife/<cluster_name>/_batch_get", methods=["POST"],
+           defaults={"znode": None})
+@cluster_znode_exception
+def cluster_batch_get(cluster_name, znode, headers=None):
+    """get the data and znodeStat of many znodes in one request
+
+    All the reads are issued to ZooKeeper in parallel.
+
+    ``POST`` http://[host]:[port]/wildlife/[cluster_name]/_batch_get
+
+    ``Headers`` (optional, if the znodes you are accessing need an acl):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1"
+
+         }
+
+    ``Content-Type``: "application/json"
+
+    ``DATA``:
+        ["/znode1/znode2", "/znode3"]
+
+    ``Response`` (json data):
+        {
+
+         "/znode1/znode2":
+            {
+
+             "znodeStat": {"version": 0, "dataLength": 19, ...},
+             "data": "data for this znode"
+
+            },
+
+         "/znode3":
+            {
+
+             "error": "NoNodeError",
+             "status": 404
+
+            }
+
+        }
+
+        the data which is not UTF-8 is encoded in base64 along with
+        "encoding": "base64", as for `cluster_znode_tree`
+
+    """
+
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    paths = request.get_json(force=True, silent=True)
+    if isinstance(paths, dict):
+        paths = paths.get("paths", [])
+    if (not isinstance(paths, list) or
+            not all(isinstance(_path, six.string_types) for _path in paths)):
+        return make_response("Please POST a JSON list of znode paths.\n",
+                             400)
+    data = dict()
+    for start in range(0, len(paths), BATCH_WINDOW):
+        _window = paths[start:start + BATCH_WINDOW]
+        results = [(_path, _zclient.get_async(_path)) for _path in _window]
+        for (_path, _result) in results:
+            try:
+                zdata = _result.get()
+                data[_path] = wildutils.znode_data(zdata[0])
+                data[_path]["znodeStat"] = wildutils.convert_zstat(zdata[1])
+            except kz_exceptions.KazooException as excp:
+                data[_path] = {"error": excp.__class__.__name__,
+                               "status": znode_error_status(excp)}
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    return resp
+
+
+@app.route("/wildlife/_all/<path:znode>", methods=["GET"])
+def all_clusters_znode(znode, headers=None):
+    """get the znode data including the znodeStat from every cluster
+
+    The reads are issued to all the clusters in parallel, each cluster
+    answering within ``timeout`` (default 5, at most 60) seconds or
+    reporting a 504 error, so that a slow cluster does not hold the
+    response. The admission and the session of every cluster are taken
+    in parallel as well. ``clusters`` restricts the read to some clusters.
+
+    ``GET`` http://[host]:[port]/wildlife/_all/[znode]?clusters=[names]
+
+    e.g. http://localhost:5000/wildlife/_all/znode1?clusters=cluster01
+
+    ``Headers`` (optional, if the znode you are accessing needs an acl):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1"
+
+         }
+
+    ``Response`` (json data):
+        {
+
+         "cluster01":
+            {
+
+             "znodeStat": {"version": 0, "dataLength": 19, ...},
+             "data": "data for this znode"
+
+            },
+
+         "cluster02":
+            {
+
+             "error": "NoNodeError",
+             "status": 404
+
+            }
+
+        }
+
+    """
+
+    names = request.args.get("clusters")
+    if names:
+        names = [name.strip() for name in names.split(",") if name.strip()]
+    else:
+        names = sorted(app.clusters or [])
+    try:
+        timeout = min(max(float(request.args.get("timeout",
+                                                 FANOUT_TIMEOUT)), 0),
+                      FANOUT_MAX_TIMEOUT)
+    except ValueError:
+        return make_response("Please use a timeout in seconds.\n",
+                             400)
+    headers = headers or request.headers
+    data = dict()
+    readers = list()
+    for cluster_name in names:
+        if cluster_name not in app.clusters:
+            data[cluster_name] = {"error": "UnknownCluster",
+                                  "status": 404}
+            continue
+        # the admission and the session handshake of a slow cluster must
+        # not delay the reads of the others
+        outcome = dict()
+        reader = threading.Thread(target=fanout_get,
+                                  args=(app.managers[cluster_name],
+                                        headers, request.remote_addr,
+                                        znode, outcome),
+                                  name="Fanout-%s" % cluster_name)
+        reader.daemon = True
+        reader.start()
+        readers.append((cluster_name, reader, outcome))
+    deadline = time.time() + timeout
+    for (cluster_name, reader, outcome) in readers:
+        reader.join(max(deadline - time.time(), 0))
+        if reader.is_alive():
+            data[cluster_name] = {"error": "Timeout",
+                                  "status": 504}
+            continue
+        excp = outcome.get("error")
+        if excp is None:
+            zdata = outcome["result"]
+            data[cluster_name] = dict(
+                wildutils.znode_data(zdata[0]),
+                znodeStat=wildutils.convert_zstat(zdata[1]))
+        elif isinstance(excp, ClusterNotReadyError):
+            data[cluster_name] = {"error": excp.__class__.__name__,
+                                  "status": 503}
+        elif isinstance(excp, limits.RateLimitedError):
+            data[cluster_name] = {"error": excp.__class__.__name__,
+                                  "status": 429}
+        else:
+            record_error(cluster_name, excp)
+            data[cluster_name] = {"error": excp.__class__.__name__,
+                                  "status": znode_error_status(excp)}
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    return resp
+
+
 @app.route("/wildlife/<cluster_name>/<path:znode>",
            methods=["GET", "PUT", "DELETE"])
 @cluster_znode_exception
@@ -294,6 +664,12 @@ def cluster_znode(cluster_name, znode, headers=None):
 
         }
 
+        the data which is not UTF-8 is encoded in base64, along with
+        "encoding": "base64", in the responses of ``PUT`` as well
+
+    ``ETag``: "[mzxid]-[version]" of the znode, a request whose
+    ``If-None-Match`` matches it gets 304 without a body
+
 
     ``PUT`` http://[host]:[port]/wildlife/[cluster_name]/[znode]
 
@@ -310,6 +686,10 @@ def cluster_znode(cluster_name, znode, headers=None):
 
     ``DATA``
 
+    ``version`` (optional): only update the znode at this version, else
+        409; or ``If-Match``: the ETag "[mzxid]-[version]" of a ``GET``,
+        else 412
+
     ``Response`` (json data):
         {
 
@@ -345,32 +725,60 @@ def cluster_znode(cluster_name, znode, headers=None):
 
          }
 
+    ``version`` or ``If-Match`` (optional): as for ``PUT``
+
+    ``recursive`` (optional): "true" to delete the whole subtree beneath
+        the znode, with at most ``window`` (default 64) deletes in flight,
+        or only count its znodes with ``dry_run=true``
+
     ``Response`` (string):
         Successfully Delete Znode [znode] from Cluster [cluster_name].
 
+    ``Response`` (json data, if ``recursive``):
+        {"deleted": 100000, "failed": []}, or {"count": 100000,
+        "failed": []} on a dry run, failed listing the {"path": ...,
+        "error": ...} of the znodes which could not be deleted
+
     """
 
     _zclient = get_client(cluster_name,
                           headers or request.headers)
     if request.method == "GET":
-        zdata = _zclient.get(znode)
-        data = {"data": zdata[0],
-                "znodeStat": wildutils.convert_zstat(zdata[1])}
+        resp = not_modified(cluster_name, _zclient, znode)
+        if resp is not None:
+            return resp
+        zdata = get_znode(cluster_name, _zclient, znode)
+        data = dict(wildutils.znode_data(zdata[0]),
+                    znodeStat=wildutils.convert_zstat(zdata[1]))
         resp = Response(json.dumps(data),
                         status=200,
                         mimetype="application/json")
+        resp.set_etag(wildutils.znode_etag(zdata[1]))
         return resp
     elif request.method == "PUT":
         _new_data = request_data(request)
-        zdata = _zclient.set(znode, _new_data)
-        data = {"data": _new_data,
-                "znodeStat": wildutils.convert_zstat(zdata)}
+        try:
+            zdata = _zclient.set(znode, _new_data,
+                                 version=expected_version(request))
+        except kz_exceptions.BadVersionError:
+            return precondition_failed(cluster_name, znode)
+        invalidate_znode(cluster_name, znode)
+        data = dict(wildutils.znode_data(_new_data),
+                    znodeStat=wildutils.convert_zstat(zdata))
         resp = Response(json.dumps(data),
                         status=201,
                         mimetype="application/json")
+        resp.set_etag(wildutils.znode_etag(zdata))
         return resp
     elif request.method == "DELETE":
-        _zclient.delete(znode, recursive=False)
+        if wildutils.get_bool(request.args.get("recursive", False)):
+            return delete_znode_tree(cluster_name, _zclient, znode)
+        try:
+            _zclient.delete(znode, version=expected_version(request),
+                            recursive=False)
+        except kz_exceptions.BadVersionError:
+            return precondition_failed(cluster_name, znode)
+        invalidate_znode(cluster_name, znode)
         return make_response("Successfully Delete Znode [%s] from "
                              "Cluster [%s].\n" % (znode, cluster_name),
                              202)
@@ -398,6 +806,9 @@ def cluster_znode_acls(cluster_name, znode, headers=None):
     ``Response`` (string):
         [ACL(perms=31, acl_list=['ALL'], id=Id(scheme=u'world', id=u'anyone'))]
 
+    ``ETag``: "a[czxid]-[aversion]" of the znode, a request whose
+    ``If-None-Match`` matches it gets 304 without a body
+
 
     ``PUT`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/acls
 
@@ -447,9 +858,15 @@ def cluster_znode_acls(cluster_name, znode, headers=None):
     _zclient = get_client(cluster_name,
                           headers or request.headers)
     if request.method == "GET":
-        acls = _zclient.get_acls(znode)[0]
-        return make_response(str(acls),
+        resp = not_modified(cluster_name, _zclient, znode, "acls")
+        if resp is not None:
+            return resp
+        (acls, zstat) = shared_read(cluster_name, _zclient, "get_acls",
+                                    znode)
+        resp = make_response(str(acls),
                              200)
+        resp.set_etag(wildutils.znode_etag(zstat, "acls"))
+        return resp
 
     if request.method == "PUT":
         if request.content_type not in ["text/plain", "text/xml"]:
@@ -489,18 +906,29 @@ def cluster_znode_data(cluster_name, znode, headers=None):
 
          }
 
-    ``Response`` (string):
-        data for this znode
+    ``Accept`` (optional): "application/octet-stream" (default) or
+        "text/plain"
+
+    ``Response`` (application/octet-stream):
+        the bytes of the data for this znode, unmodified
+
+    ``ETag``: "[mzxid]-[version]" of the znode, a request whose
+    ``If-None-Match`` matches it gets 304 without a body
 
     """
 
-    zdata_resp = cluster_znode(cluster_name,
-                               znode,
-                               headers=headers)
-    zdata = json.loads(zdata_resp.get_data())
-    resp = Response(zdata["data"],
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    resp = not_modified(cluster_name, _zclient, znode)
+    if resp is not None:
+        return resp
+    zdata = get_znode(cluster_name, _zclient, znode)
+    mimetype = (request.accept_mimetypes.best_match(DATA_MIMETYPES) or
+                DATA_MIMETYPES[0])
+    resp = Response(zdata[0] or b"",
                     status=200,
-                    mimetype="text/plain")
+                    mimetype=mimetype)
+    resp.set_etag(wildutils.znode_etag(zdata[1]))
     return resp
 
 
@@ -524,32 +952,879 @@ def cluster_znode_children(cluster_name, znode, headers=None):
     ``Response`` (string):
         [children_list]
 
+    ``ETag``: "c[pzxid]-[cversion]" of the znode, a request whose
+    ``If-None-Match`` matches it gets 304 without a body
+
+
+    ``GET`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/children
+        ?limit=[limit]&cursor=[cursor]&prefix=[prefix]&sort=[asc|desc]
+        &include_stat=[true|false]
+
+    e.g. http://localhost:5000/wildlife/cluster01/queue/children?limit=2
+
+    Page through the children sorted by name: ``cursor`` is the
+    ``cursor`` of the previous page, i.e. the last name it has returned,
+    so the pages stay consistent while children are created or deleted.
+    Only the children starting with ``prefix`` are listed, and
+    ``include_stat`` reads the znodeStat of the children of the page.
+
+    ``Response`` (json data):
+        {
+
+         "children": ["item-0000000000", "item-0000000001"],
+         "total": 200000,
+         "pzxid": 8589936439,
+         "cursor": "item-0000000001"
+
+        }
+
+        with ``include_stat``, the children are listed as
+        {"name": "item-0000000000", "znodeStat": {...}}, and ``cursor``
+        is null on the last page
+
     """
 
     _zclient = get_client(cluster_name,
                           headers or request.headers)
-    zchildren = _zclient.get_children(znode)
-    return make_response(str(zchildren),
-                         200)
+    include_stat = wildutils.get_bool(request.args.get("include_stat",
+                                                       False))
+    if not include_stat:
+        # the znodeStat of the children are not covered by the ETag
+        resp = not_modified(cluster_name, _zclient, znode, "children")
+        if resp is not None:
+            return resp
+    if not any(arg in request.args for arg in wildutils.CHILDREN_ARGS):
+        (zchildren, zstat) = get_znode_children(cluster_name, _zclient,
+                                                znode)
+        resp = make_response(str(zchildren),
+                             200)
+        resp.set_etag(wildutils.znode_etag(zstat, "children"))
+        return resp
+
+    (names, zstat) = sorted_children(cluster_name, _zclient, znode)
+    data = wildutils.page_children(names, zstat, request.args)
+    page = data["children"]
+    if include_stat:
+        parent = wildutils.znode_path(znode)
+        stats = [stat for (_, stat)
+                 in bulk.stat_paths(_zclient, [posixpath.join(parent, name)
+                                               for name in page])]
+        data["children"] = [
+            {"name": name,
+             "znodeStat": (wildutils.convert_zstat(stat)
+                           if stat is not None else None)}
+            for (name, stat) in zip(page, stats)]
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    if not include_stat:
+        resp.set_etag(wildutils.znode_etag(zstat, "children"))
+    return resp
+
+
+@app.route("/wildlife/<cluster_name>/<path:znode>/watch", methods=["GET"])
+@cluster_znode_exception
+def cluster_znode_watch(cluster_name, znode, headers=None):
+    """wait for a znode to change (long-polling)
+
+    Answer immediately if the znode has been modified after
+    ``since_mzxid``, otherwise wait at most ``timeout`` (default 30,
+    at most 300) seconds for it to be modified, created or deleted. All
+    the requests waiting for the same znode share one ZooKeeper watch.
+
+    ``GET`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/watch
+
+    e.g. http://localhost:5000/wildlife/cluster01/znode1/watch?since_mzxid=0
+
+    ``Headers`` (optional, if the znode you are accessing needs an acl):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1"
+
+         }
+
+    ``Response`` (json data):
+        the znode data including the znodeStat as `cluster_znode`, or
+        304 without a body if the znode has not changed before timeout,
+        or 404 if the znode has been deleted
+
+    """
+
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    since_mzxid = int(request.args.get("since_mzxid", 0))
+    timeout = min(float(request.args.get("timeout", 30)), WATCH_MAX_TIMEOUT)
+    watches = app.managers[cluster_name].watches
+    # parked on the watch, the request must not hold a slot in flight
+    release_admission(cluster_name)
+    if not watches.wait(znode, since_mzxid, timeout):
+        return Response(status=304)
+    zdata = get_znode(cluster_name, _zclient, znode)
+    data = dict(wildutils.znode_data(zdata[0]),
+                znodeStat=wildutils.convert_zstat(zdata[1]))
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    return resp
+
+
+@app.route("/wildlife/<cluster_name>/events", methods=["GET"],
+           defaults={"znode": "/"})
+@app.route("/wildlife/<cluster_name>/<path:znode>/events", methods=["GET"])
+@cluster_znode_exception
+def cluster_znode_events(cluster_name, znode, headers=None):
+    """stream the change notifications of the subtree beneath a znode as
+    Server-Sent Events
+
+    Subscribers of the same znode share one TreeCache of the subtree. Each
+    subscriber buffers at most ``buffer`` (1 to 10000, default 1000) events;
+    once full the events are dropped (``overflow=drop``, reported by a
+    "dropped" event) or the stream is closed (``overflow=disconnect``).
+
+    ``GET`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/events
+
+    e.g. http://localhost:5000/wildlife/cluster01/znode1/events?buffer=1000
+
+    ``Response`` (text/event-stream):
+        event: data-changed
+        data: {"path": "/znode1/znode2", "znodeStat": {...}}
+
+        event: child-added
+        data: {"path": "/znode1/znode3", "znodeStat": {...}}
+
+        event: child-removed
+        data: {"path": "/znode1/znode3", "znodeStat": {...}}
+
+        event: deleted
+        data: {"path": "/znode1", "znodeStat": {...}}
+
+        event: closed
+        data: {"reason": "overflow"}
+
+    """
+
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    root = wildutils.znode_path(znode)
+    if _zclient.exists(root) is None:
+        raise kz_exceptions.NoNodeError()
+    overflow = request.args.get("overflow", "drop")
+    if overflow not in ("drop", "disconnect"):
+        return make_response("Please use overflow=drop or "
+                             "overflow=disconnect.\n",
+                             400)
+    buffer_size = min(int(request.args.get("buffer", 1000)),
+                      EVENTS_MAX_BUFFER)
+    if buffer_size < 1:
+        return make_response("Please use a buffer of at least 1 event.\n",
+                             400)
+    try:
+        events = app.managers[cluster_name].events
+        subscriber = events.subscribe(root, buffer_size, overflow)
+    except ImportError:
+        return make_response("Subtree Events Require kazoo>=2.1.\n",
+                             501)
+
+    def generate():
+        try:
+            while not subscriber.closed:
+                try:
+                    (name, data) = subscriber.queue.get(
+                        timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscriber.dropped:
+                    dropped = subscriber.dropped
+                    subscriber.dropped = 0
+                    yield ("event: dropped\ndata: %s\n\n"
+                           % json.dumps({"count": dropped}))
+                yield "event: %s\ndata: %s\n\n" % (name, json.dumps(data))
+            yield ("event: closed\ndata: %s\n\n"
+                   % json.dumps({"reason": subscriber.reason}))
+        finally:
+            events.unsubscribe(subscriber)
+
+    # the stream may stay open for hours without reading ZooKeeper
+    release_admission(cluster_name)
+    resp = Response(stream_with_context(generate()),
+                    status=200,
+                    mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@app.route("/wildlife/<cluster_name>/tree", methods=["GET"],
+           defaults={"znode": "/"})
+@app.route("/wildlife/<cluster_name>/<path:znode>/tree", methods=["GET"])
+@cluster_znode_exception
+def cluster_znode_tree(cluster_name, znode, headers=None):
+    """export the subtree beneath a znode as newline-delimited json
+
+    The znodes are streamed in breadth-first order while walking the
+    subtree, keeping at most ``window`` (default 64) reads in flight.
+
+    ``GET`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/tree
+
+    e.g. http://localhost:5000/wildlife/cluster01/znode1/tree?window=64
+
+    ``Headers`` (optional, if the znodes you are accessing need an acl):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1"
+
+         }
+
+    ``Response`` (application/x-ndjson):
+        {"path": "/znode1", "data": "data1", "znodeStat": {...}}
+        {"path": "/znode1/znode2", "data": "data2", "znodeStat": {...}}
+        {"path": "/znode1/znode3", "error": "NoAuthError"}
+
+        the data which is not UTF-8 is encoded in base64, as
+        {"path": "/znode4", "data": "3q2+7w==", "encoding": "base64",
+         "znodeStat": {...}}
+
+    """
+
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    root = wildutils.znode_path(znode)
+    if _zclient.exists(root) is None:
+        raise kz_exceptions.NoNodeError()
+    # a bad window must answer 400 before the stream starts
+    nodes = bulk.walk_tree(_zclient, root,
+                           window=int(request.args.get("window",
+                                                       bulk.TREE_WINDOW)))
+
+    def generate():
+        for node in nodes:
+            if node.error is not None:
+                line = {"path": node.path,
+                        "error": node.error.__class__.__name__}
+            else:
+                line = {"path": node.path,
+                        "znodeStat": wildutils.convert_zstat(node.stat)}
+                line.update(wildutils.znode_data(node.data))
+            yield json.dumps(line) + "\n"
+
+    return Response(stream_with_context(generate()),
+                    status=200,
+                    mimetype="application/x-ndjson")
+
+
+@app.route("/wildlife/<cluster_name>/_import", methods=["POST"],
+           defaults={"znode": "/"})
+@app.route("/wildlife/<cluster_name>/<path:znode>/_import", methods=["POST"])
+@cluster_znode_exception
+def cluster_znode_import(cluster_name, znode, headers=None):
+    """import (restore) the subtree beneath a znode from newline-delimited
+    json, e.g. the output of `cluster_znode_tree`
+
+    The znodes are written in transactions of ``chunk_size`` (default 100)
+    znodes with at most ``window`` (default 4) transactions in flight.
+    Missing znodes are created and the data of existing ones is updated.
+    Relative paths are resolved against the znode; absolute paths
+    starting with ``source`` are moved beneath the znode.
+
+    ``POST`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/_import
+
+    e.g. http://localhost:5000/wildlife/cluster02/znode1/_import?source=/znode1
+
+    ``Headers`` (optional, if you need want to create these znodes
+        with an acl or the znodes you are accessing need an acl):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1",
+          "all": True
+
+         }
+
+    ``Content-Type``: "application/x-ndjson"
+
+    ``DATA``:
+        {"path": "/znode1", "data": "data1"}
+        {"path": "/znode1/znode2", "data": "data2",
+         "acl": [{"scheme": "digest", "credential": "user1,password1",
+                  "all": true}]}
+        {"path": "/znode1/znode4", "data": "3q2+7w==", "encoding": "base64"}
+
+    ``Response`` (json data):
+        {
+
+         "created": 1,
+         "updated": 1,
+         "failed": [{"path": "/znode1/znode3", "error": "NoAuthError"}]
+
+        }
+
+    """
+
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    root = wildutils.znode_path(znode)
+    source = request.args.get("source")
+    importer = bulk.TreeImporter(
+        _zclient,
+        acl=header_acls(headers or request.headers),
+        chunk_size=txn_chunk_size(),
+        window=int(request.args.get("window", 4)))
+    for line in request.stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if "error" in record:
+                continue
+            path = record["path"]
+            data = wildutils.record_data(record)
+        except (ValueError, KeyError, TypeError) as excp:
+            importer.fail(None, excp)
+            continue
+        if source and (path + "/").startswith(source.rstrip("/") + "/"):
+            path = root.rstrip("/") + path[len(source.rstrip("/")):]
+        elif not path.startswith("/"):
+            path = posixpath.join(root, path)
+        path = path.rstrip("/") or "/"
+        if path == "/" or not (path + "/").startswith(root.rstrip("/") + "/"):
+            importer.fail(path, ValueError())
+            continue
+        importer.add(path, data, acl=record.get("acl"))
+    importer.finish()
+    for path in importer.created + importer.updated:
+        invalidate_znode(cluster_name, path)
+    data = {"created": len(importer.created),
+            "updated": len(importer.updated),
+            "failed": importer.failed}
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    return resp
+
+
+@app.route("/wildlife/<cluster_name>/diff", methods=["GET", "POST"],
+           defaults={"znode": "/"})
+@app.route("/wildlife/<cluster_name>/<path:znode>/diff",
+           methods=["GET", "POST"])
+@cluster_znode_exception
+def cluster_znode_diff(cluster_name, znode, headers=None):
+    """compare the subtree beneath a znode with the same subtree on a
+    target cluster, and apply the differences to the target
+
+    The znodeStat of both subtrees are compared first: the data are only
+    read when the dataLength is the same on both sides and they have been
+    modified since the last diff of the two clusters. Ephemeral znodes
+    are not synced.
+
+    ``GET`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/diff
+        ?target=[target_cluster_name]
+
+    e.g. http://localhost:5000/wildlife/cluster01/znode1/diff?target=cluster02
+
+    ``Headers`` (optional, if the znodes you are accessing need an acl,
+    also used for the target cluster):
+         {
+
+          "scheme": "digest",
+          "credential": "user1,password1"
+
+         }
+
+    ``Response`` (json data):
+        {
+
+         "created": ["/znode1/znode2"],
+         "updated": ["/znode1"],
+         "deleted": ["/znode1/znode3/znode4", "/znode1/znode3"],
+         "failed": [],
+         "compared": 3,
+         "data_compared": 1
+
+        }
+
+        listing the znodes to create, update and delete on the target
+
+
+    ``POST`` http://[host]:[port]/wildlife/[cluster_name]/[znode]/diff
+        ?target=[target_cluster_name]&chunk_size=100
+
+    Apply the differences to the target in transactions of ``chunk_size``
+    operations, creating the znodes with the acls of the headers, or
+    else with the acls of the source znodes.
+
+    ``Response`` (json data):
+        the differences as for ``GET``, along with the number of
+        ``applied`` operations and the ``errors`` of the failed ones
+
+    """
+
+    target = request.args.get("target")
+    if not target:
+        return make_response("Please Specify the target Cluster.\n", 400)
+    if target not in app.clusters:
+        return make_response("You Haven't Configured Cluster "
+                             "[%s]." % target,
+                             404)
+    _zclient = get_client(cluster_name,
+                          headers or request.headers)
+    _target_zclient = get_client(target,
+                                 headers or request.headers)
+    chunk_size = txn_chunk_size()
+    memos = app.managers[cluster_name].sync_memos
+    diff = sync.TreeDiff(
+        _zclient, _target_zclient, wildutils.znode_path(znode),
+        window=int(request.args.get("window", bulk.TREE_WINDOW)),
+        memo=memos.setdefault(target, sync.SyncMemo())).run()
+    data = diff.summary()
+    if request.method == "POST":
+        results = diff.apply(
+            acl=header_acls(headers or request.headers),
+            chunk_size=chunk_size)
+        data["applied"] = 0
+        data["errors"] = list()
+        for (op, path, result) in results:
+            if isinstance(result, Exception):
+                data["errors"].append(
+                    bulk.convert_result({"op": op, "path": path}, result))
+                continue
+            data["applied"] += 1
+            invalidate_znode(target, path)
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    return resp
+
+
+@app.route("/metrics", methods=["GET"])
+def cluster_metrics():
+    """get the metrics of wildlife in the Prometheus text format
+
+    ``GET`` http://[host]:[port]/metrics
+
+    ``Response`` (text/plain; version=0.0.4):
+        # HELP wildlife_http_requests_total HTTP requests served
+        # TYPE wildlife_http_requests_total counter
+        wildlife_http_requests_total{route="/wildlife/<cluster_name>",...} 3.0
+
+    """
+
+    return Response(metrics.REGISTRY.render(),
+                    status=200,
+                    mimetype="text/plain; version=0.0.4")
+
+
+def _collect_managers(collect):
+    def collector():
+        samples = list()
+        for (name, manager) in (app.managers or {}).items():
+            samples.extend(collect(name, manager))
+        return samples
+    return collector
+
+
+def _collect_caches(key):
+    def collect(name, manager):
+        for (cache_name, cache) in (("znodes", manager.cache),
+                                    ("children", manager.children_cache)):
+            if cache is not None:
+                yield ({"cluster": name, "cache": cache_name},
+                       cache.stats()[key])
+    return _collect_managers(collect)
+
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "wildlife_cluster_state",
+    "Connection state of the ClusterManagers, 1 for the current state",
+    ("cluster", "state"),
+    _collect_managers(lambda name, manager: [({"cluster": name,
+                                               "state": manager.state},
+                                              1)])))
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "wildlife_cluster_ready",
+    "Whether the ClusterManagers are connected and serving",
+    ("cluster",),
+    _collect_managers(lambda name, manager: [({"cluster": name},
+                                              manager.ready.is_set())])))
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "wildlife_cluster_reconnects",
+    "Sessions recreated by the ClusterManagers",
+    ("cluster",),
+    _collect_managers(lambda name, manager: [({"cluster": name},
+                                              manager.reconnects)])))
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "wildlife_cluster_sessions",
+    "Authenticated sessions pooled by the ClusterManagers",
+    ("cluster",),
+    _collect_managers(lambda name, manager: [({"cluster": name},
+                                              len(manager.sessions))])))
+
+for _key in ("entries", "bytes", "hits", "misses", "invalidations",
+             "evictions"):
+    metrics.REGISTRY.register(metrics.Gauge(
+        "wildlife_cache_%s" % _key,
+        "The %s of the caches of the ClusterManagers" % _key,
+        ("cluster", "cache"),
+        _collect_caches(_key)))
+
+
+@app.before_request
+def start_timer():
+    g.wildlife_started = time.time()
+
+
+def record_error(cluster_name, excp):
+    """remember an exception handled on serving the request of a
+    configured cluster, counted by record_request with the request
+    """
+
+    g.wildlife_errors = getattr(g, "wildlife_errors", [])
+    g.wildlife_errors.append((cluster_name, excp.__class__.__name__))
+
+
+@app.after_request
+def record_request(resp):
+    started = getattr(g, "wildlife_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        cluster = (request.view_args or {}).get("cluster_name", "")
+        if cluster and cluster not in (app.clusters or ()):
+            # any client may name a cluster, keep the labels bounded
+            cluster = "unknown"
+        metrics.HTTP_LATENCY.observe(time.time() - started,
+                                     route=route,
+                                     method=request.method,
+                                     cluster=cluster)
+        metrics.HTTP_REQUESTS.inc(route=route,
+                                  method=request.method,
+                                  cluster=cluster,
+                                  status=resp.status_code)
+    for (cluster_name, exception) in getattr(g, "wildlife_errors", ()):
+        metrics.HTTP_ERRORS.inc(cluster=cluster_name, exception=exception)
+    return resp
+
+
+@app.after_request
+def compress_response(resp):
+    """compress the response body with the Content-Encoding negotiated
+    from Accept-Encoding, chunk by chunk for the streamed responses
+
+    The ETag of a compressed response is made weak, the validator of a
+    strong one being bound to the exact bytes of the identity encoding.
+    """
+
+    conf = getattr(app.wild and app.wild.config, "compression", None)
+    opts = compress.options(conf)
+    if resp.status_code == 304:
+        # the ETag the client got along with a compressed representation
+        etag = resp.get_etag()[0]
+        if etag and request.if_none_match.is_weak(etag):
+            resp.set_etag(etag, weak=True)
+        resp.vary.add("Accept-Encoding")
+        return resp
+    if (resp.status_code < 200 or resp.status_code == 204 or
+            "Content-Encoding" in resp.headers or
+            resp.mimetype in compress.UNCOMPRESSED_MIMETYPES):
+        return resp
+    encoding = compress.negotiate(request.headers.get("Accept-Encoding"),
+                                  opts)
+    resp.vary.add("Accept-Encoding")
+    if encoding is None:
+        return resp
+    if resp.is_streamed:
+        resp.response = compress.compress_iter(resp.response, encoding,
+                                               opts)
+        resp.headers.pop("Content-Length", None)
+    else:
+        data = resp.get_data()
+        if len(data) < int(opts["min_size"]):
+            return resp
+        resp.set_data(compress.compress(data, encoding, opts))
+    resp.headers["Content-Encoding"] = encoding
+    etag = resp.get_etag()[0]
+    if etag:
+        # the compressed bytes are not those of the identity encoding
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def admit(cluster_name):
+    """queue or reject the request on the budgets of the cluster, only once
+    per request although the routes may call each other
+
+    The slot in flight is released once the request is torn down, i.e.
+    after the whole body of a streamed response has been sent, or by
+    `release_admission`.
+
+    :raises: RateLimitedError
+    """
+
+    zcl_mngr = app.managers[cluster_name]
+    limiter = zcl_mngr.limiter
+    admitted = getattr(g, "wildlife_admitted", None)
+    if admitted is None:
+        admitted = g.wildlife_admitted = dict()
+    if limiter is None or cluster_name in admitted:
+        return
+    kind = "read" if request.method in ("GET", "HEAD") else "write"
+    limiter.admit(kind, wildutils.caller_identity(request.headers,
+                                                  request.remote_addr,
+                                                  zcl_mngr.sessions))
+    admitted[cluster_name] = limiter
+
+
+def release_admission(cluster_name):
+    """release the slot in flight of the request before it waits without
+    reading ZooKeeper, e.g. on a watch or for the events of a stream,
+    so that it does not hold off the other requests of the cluster
+    """
+
+    admitted = getattr(g, "wildlife_admitted", dict())
+    limiter = admitted.get(cluster_name)
+    if limiter is not None:
+        # still admitted, the routes calling each other must not admit it
+        # again
+        admitted[cluster_name] = None
+        limiter.release()
+
+
+def fanout_get(zcl_mngr, headers, address, znode, outcome):
+    """get (data, znodeStat) of a znode from one cluster of a fan-out read
+    into outcome["result"], or the exception into outcome["error"]
+
+    It runs in a thread of its own, outside of the request, so it releases
+    its slot in flight and its pooled session itself.
+    """
+
+    try:
+        zcl_mngr.checkReady()
+        limiter = zcl_mngr.limiter
+        if limiter is not None:
+            limiter.admit("read", wildutils.caller_identity(
+                headers, address, zcl_mngr.sessions))
+        try:
+            acl_config = wildutils.ACLConfig(headers)
+            if not acl_config.check_acl():
+                outcome["result"] = zcl_mngr._client.get(znode)
+                return
+            zclient = zcl_mngr.sessions.acquire(acl_config.scheme,
+                                                acl_config.credential)
+            try:
+                outcome["result"] = zclient.get(znode)
+            finally:
+                zcl_mngr.sessions.release(zclient)
+        finally:
+            if limiter is not None:
+                limiter.release()
+    except Exception as excp:
+        outcome["error"] = excp
 
 
 def get_client(cluster_name, headers):
     zcl_mngr = app.managers[cluster_name]
+    zcl_mngr.checkReady()
     acl_config = wildutils.ACLConfig(headers)
     if not acl_config.check_acl():
         zclient = zcl_mngr._client
     else:
-        from kazoo.client import KazooClient
-        auth_data = (acl_config.scheme, acl_config.credential)
-        zclient = KazooClient(hosts=zcl_mngr.cluster.hosts,
-                              timeout=zcl_mngr.cluster.timeout,
-                              auth_data=auth_data,
-                              randomize_hosts=zcl_mngr.cluster.randomize_hosts,
-                              logger=zcl_mngr.log)
+        zclient = zcl_mngr.sessions.acquire(acl_config.scheme,
+                                            acl_config.credential)
+        # hand the session back to the pool once the request is torn down
+        if not hasattr(g, "wildlife_sessions"):
+            g.wildlife_sessions = list()
+        g.wildlife_sessions.append((zcl_mngr.sessions, zclient))
 
     return zclient
 
 
+def header_acls(headers):
+    acl = wildutils.ACLConfig(headers).make_acl()
+    if acl is None:
+        return None
+    return [acl]
+
+
+def session_identity(zclient):
+    """the auth identity of a pooled session, None for the shared client
+    """
+
+    session = getattr(zclient, "_wildlife_session", None)
+    return session.key if session is not None else None
+
+
+def shared_read(cluster_name, zclient, op, znode, **kwargs):
+    """call zclient.op(znode, **kwargs), sharing the identical call in
+    flight for the same auth identity with its callers
+    """
+
+    zcl_mngr = app.managers[cluster_name]
+    key = (session_identity(zclient), op, znode,
+           tuple(sorted(kwargs.items())))
+    return zcl_mngr.flights.do(key, getattr(zclient, op), znode,
+                               **kwargs)[0]
+
+
+def get_znode(cluster_name, zclient, znode):
+    """get (data, znodeStat) of a znode, from the cluster cache if
+    the znode is read through the shared client of the ClusterManager
+    """
+
+    zcl_mngr = app.managers[cluster_name]
+    znode = wildutils.znode_path(znode)
+    if zcl_mngr.cache is not None and zclient is zcl_mngr._client:
+        return zcl_mngr.cache.get(znode)
+    return shared_read(cluster_name, zclient, "get", znode)
+
+
+def get_znode_children(cluster_name, zclient, znode):
+    """get (children, znodeStat) of a znode, from the cluster cache if
+    the znode is read through the shared client of the ClusterManager
+    """
+
+    zcl_mngr = app.managers[cluster_name]
+    znode = wildutils.znode_path(znode)
+    if zcl_mngr.children_cache is not None and zclient is zcl_mngr._client:
+        return zcl_mngr.children_cache.get(znode)
+    return shared_read(cluster_name, zclient, "get_children", znode,
+                       include_data=True)
+
+
+def sorted_children(cluster_name, zclient, znode):
+    """get (sorted children, znodeStat) of a znode, reusing the sorted
+    snapshot of the ClusterManager while the znode has the same children
+    """
+
+    zcl_mngr = app.managers[cluster_name]
+    znode = wildutils.znode_path(znode)
+    if zcl_mngr.snapshots is None:
+        (children, zstat) = get_znode_children(cluster_name, zclient, znode)
+        return (sorted(children), zstat)
+    identity = session_identity(zclient)
+    children = None
+    if zcl_mngr.children_cache is not None and zclient is zcl_mngr._client:
+        (children, zstat) = zcl_mngr.children_cache.get(znode)
+    else:
+        # the stat tells whether the snapshot is current
+        zstat = shared_read(cluster_name, zclient, "exists", znode)
+        if zstat is None:
+            raise kz_exceptions.NoNodeError()
+    names = zcl_mngr.snapshots.get(znode, identity, zstat)
+    if names is None:
+        if children is None:
+            (children, zstat) = shared_read(cluster_name, zclient,
+                                            "get_children", znode,
+                                            include_data=True)
+        names = zcl_mngr.snapshots.put(znode, identity, zstat, children)
+    return (names, zstat)
+
+
+def not_modified(cluster_name, zclient, znode, kind="data"):
+    """the 304 response if the If-None-Match header of the request matches
+    the current ETag of the znode, else None
+
+    The znodeStat comes from the cluster cache or a single exists call.
+    """
+
+    if not request.if_none_match:
+        return None
+    zcl_mngr = app.managers[cluster_name]
+    znode = wildutils.znode_path(znode)
+    cache = {"data": zcl_mngr.cache,
+             "children": zcl_mngr.children_cache}.get(kind)
+    cached = None
+    if cache is not None and zclient is zcl_mngr._client:
+        cached = cache.peek(znode)
+    if cached is not None:
+        zstat = cached[1]
+    else:
+        zstat = shared_read(cluster_name, zclient, "exists", znode)
+    if zstat is None:
+        raise kz_exceptions.NoNodeError()
+    etag = wildutils.znode_etag(zstat, kind)
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return resp
+
+
+def delete_znode_tree(cluster_name, zclient, znode):
+    """delete the subtree beneath a znode for ``?recursive=true``, or only
+    count its znodes for ``&dry_run=true``
+    """
+
+    dry_run = wildutils.get_bool(request.args.get("dry_run", False))
+    try:
+        window = bulk.check_window(int(request.args.get("window",
+                                                        bulk.TREE_WINDOW)))
+    except ValueError:
+        return make_response("Please use a window of at least 1.\n",
+                             400)
+    try:
+        (paths, failed) = bulk.delete_tree(
+            zclient, wildutils.znode_path(znode),
+            window=window,
+            version=expected_version(request),
+            dry_run=dry_run)
+    except kz_exceptions.BadVersionError:
+        return precondition_failed(cluster_name, znode)
+    if dry_run:
+        data = {"count": len(paths),
+                "failed": failed}
+    else:
+        for path in paths:
+            invalidate_znode(cluster_name, path)
+        data = {"deleted": len(paths),
+                "failed": failed}
+    resp = Response(json.dumps(data),
+                    status=200,
+                    mimetype="application/json")
+    return resp
+
+
+def expected_version(request):
+    return wildutils.expected_version(request.args.get("version"),
+                                      request.headers.get("If-Match"))
+
+
+def precondition_failed(cluster_name, znode):
+    """the response of a write whose expected version does not match:
+    412 for an If-Match header, 409 for the version argument
+    """
+
+    message = wildutils.znode_error(kz_exceptions.BadVersionError(),
+                                    cluster_name, znode)[0]
+    if request.args.get("version") is None:
+        return make_response(message, 412)
+    return make_response(message, 409)
+
+
+def invalidate_znode(cluster_name, znode):
+    # read-your-writes without waiting for the watch events
+    zcl_mngr = app.managers[cluster_name]
+    znode = wildutils.znode_path(znode)
+    if zcl_mngr.cache is not None:
+        zcl_mngr.cache.invalidate(znode)
+    if zcl_mngr.children_cache is not None:
+        zcl_mngr.children_cache.invalidate(znode)
+        zcl_mngr.children_cache.invalidate(posixpath.dirname(znode))
+
+
+@app.teardown_request
+def release_clients(excp=None):
+    for (pool, zclient) in getattr(g, "wildlife_sessions", []):
+        pool.release(zclient)
+    g.wildlife_sessions = list()
+    for limiter in getattr(g, "wildlife_admitted", {}).values():
+        if limiter is not None:
+            limiter.release()
+    g.wildlife_admitted = dict()
+
+
 def request_data(request):
     if request.content_type == "application/x-www-form-urlencoded":
         data = request.form
@@ -569,9 +1844,11 @@ def request_data(request):
     return data
 
 
-def main(host="localhost"):
-    app._startWild()
-    app.run(host=host)
+def main(host="localhost", port=5000, **options):
+    """serve the REST APIs, see :func:`wildlife.server.serve` for options
+    """
+
+    server.serve(app, host=host, port=port, **options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+import logging
+import signal
+import sys
+import threading
+
+
+log = logging.getLogger("wildlife.server")
+
+SERVERS = ("werkzeug", "gunicorn", "aio")
+
+DEFAULTS = {"host": "localhost",
+            "port": 5000,
+            "server": "werkzeug",
+            "workers": 1,
+            "threads": 16,
+            "streams": 256,
+            "backlog": 2048,
+            "keepalive": 5}
+
+# Path suffixes of the requests which may last for minutes, i.e. the
+# long-polls and the event streams
+LONG_LIVED = ("/watch", "/events")
+
+
+def serve(app, **options):
+    """serve the :class:`wildlife.app.WildApp` until interrupted
+
+    ``werkzeug`` serves at most ``threads`` requests at once in this
+    process, besides at most ``streams`` long-polls and event streams,
+    while ``gunicorn`` (to be installed separately) pre-forks ``workers``
+    processes of ``threads`` threads each. WildLife is started in every
+    process serving the requests, since the KazooClient threads do not
+    survive a fork, and SIGHUP reloads its config in every worker. ``aio``
+    serves the read and write routes of the znodes on asyncio (see
+    :mod:`wildlife.aio`, requiring Python 3.5+ and aiohttp), with
+    ``threads`` threads for the blocking calls. Only ``gunicorn`` runs
+    several ``workers``.
+
+    :param options: the keys of DEFAULTS, i.e. host, port, server, workers,
+        threads, streams, backlog and keepalive (seconds an idle connection
+        is kept)
+    """
+
+    conf = dict(DEFAULTS)
+    conf.update((k, v) for (k, v) in options.items() if v is not None)
+    if conf["server"] not in SERVERS:
+        raise ValueError("Unknown server %s, please choose one of "
+                         "%s" % (conf["server"], ", ".join(SERVERS)))
+    if conf["server"] == "aio" and sys.version_info < (3, 5):
+        raise ValueError("The aio server requires Python 3.5+")
+    log.info("Serving WildLife on %s:%s with %s" % (conf["host"],
+                                                    conf["port"],
+                                                    conf["server"]))
+    if conf["server"] != "gunicorn" and int(conf["workers"]) > 1:
+        log.warning("%s serves in a single process, ignoring workers: "
+                    "%s" % (conf["server"], conf["workers"]))
+    if conf["server"] == "gunicorn":
+        _serveGunicorn(app, conf)
+    elif conf["server"] == "aio":
+        try:
+            from wildlife import aio
+        except ImportError:
+            raise RuntimeError("Please install aiohttp, e.g. the aio "
+                               "extra of wildlife, to serve WildLife with "
+                               "aio")
+        aio.serve(app, conf)
+    else:
+        _serveWerkzeug(app, conf)
+
+
+class BoundedApp(object):
+    """Run at most ``threads`` requests of a WSGI app at once, the others
+    waiting for a slot, and at most ``streams`` long-lived requests
+    besides them, the others getting 503
+
+    A slot is held from the call of the app until its response has been
+    sent, so that neither an idle keep-alive connection nor a long-poll
+    holds off the other requests.
+    """
+
+    def __init__(self, app, threads, streams):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(max(threads, 1))
+        self.streams = threading.BoundedSemaphore(max(streams, 1))
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        path = environ.get("PATH_INFO", "").rstrip("/")
+        if path.endswith(LONG_LIVED):
+            slots = self.streams
+            if not slots.acquire(False):
+                start_response("503 Service Unavailable",
+                               [("Content-Type", "text/plain"),
+                                ("Retry-After", "1")])
+                return [b"Too Many Long-Polls and Event Streams. Please "
+                        b"Retry Later.\n"]
+        else:
+            slots = self.slots
+            slots.acquire()
+        try:
+            app_iter = self.app(environ, start_response)
+        except Exception:
+            slots.release()
+            raise
+        # the server closes the iterator once the response has been sent
+        return ClosingIterator(app_iter, slots.release)
+
+
+def _serveWerkzeug(app, conf):
+    from werkzeug import serving
+
+    class RequestHandler(serving.WSGIRequestHandler):
+        # HTTP/1.1 keeps the connections alive until this timeout
+        protocol_version = "HTTP/1.1"
+        timeout = conf["keepalive"]
+
+    app._startWild()
+    try:
+        # a thread per connection, the requests are bounded by BoundedApp
+        srv = serving.ThreadedWSGIServer(
+            conf["host"], int(conf["port"]),
+            BoundedApp(app, int(conf["threads"]), int(conf["streams"])),
+            handler=RequestHandler)
+        srv.socket.listen(int(conf["backlog"]))
+        srv.serve_forever()
+    finally:
+        app._stopWild()
+
+
+def _serveGunicorn(app, conf):
+    try:
+        from gunicorn.app.base import BaseApplication
+        from gunicorn.arbiter import Arbiter
+    except ImportError:
+        raise RuntimeError("Please install gunicorn to serve WildLife "
+                           "with gunicorn")
+
+    class ReloadingArbiter(Arbiter):
+        # SIGHUP reloads the config of WildLife in every worker in place,
+        # rather than restarting the workers and all their sessions
+        def handle_hup(self):
+            self.log.info("Reload WildLife in the workers")
+            self.kill_workers(signal.SIGHUP)
+
+    def reload_handler(signum, frame):
+        app._reloadWild()
+
+    class GunicornApplication(BaseApplication):
+
+        def load_config(self):
+            self.cfg.set("bind", "%s:%s" % (conf["host"], conf["port"]))
+            self.cfg.set("workers", int(conf["workers"]))
+            self.cfg.set("threads", int(conf["threads"]))
+            self.cfg.set("worker_class",
+                         "gthread" if int(conf["threads"]) > 1 else "sync")
+            self.cfg.set("backlog", int(conf["backlog"]))
+            self.cfg.set("keepalive", int(conf["keepalive"]))
+            self.cfg.set("post_fork",
+                         lambda arbiter, worker: app._startWild())
+            # gunicorn resets the signal handlers of a worker on its start
+            self.cfg.set("post_worker_init",
+                         lambda worker: signal.signal(signal.SIGHUP,
+                                                      reload_handler))
+            self.cfg.set("worker_exit",
+                         lambda arbiter, worker: app._stopWild())
+
+        def load(self):
+            return app
+
+        def run(self):
+            ReloadingArbiter(self).run()
+
+    GunicornApplication().run()
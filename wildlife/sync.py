@@ -0,0 +1,283 @@
+import threading
+import posixpath
+import collections
+import logging
+from kazoo import exceptions as kz_exceptions
+from wildlife import bulk
+
+
+log = logging.getLogger("wildlife.sync")
+
+# Pairs of znodes remembered as having the same data
+MEMO_MAX_ENTRIES = 100000
+
+
+class SyncMemo(object):
+    """Remember the znodes found to have the same data on the source and
+    the target cluster, along with the mzxid of both sides
+
+    The mzxid changes on every update of the data, so while both mzxids
+    are unchanged the data are known to be equal without reading them
+    again. The entries are evicted in LRU order.
+
+    :param max_entries: the upper bound of the remembered znodes
+    """
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def equal(self, path, source_stat, target_stat):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                return False
+            self._entries[path] = entry
+            return entry == (source_stat.mzxid, target_stat.mzxid)
+
+    def remember(self, path, source_stat, target_stat):
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = (source_stat.mzxid, target_stat.mzxid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def dump(self):
+        """the entries as a json serializable dict
+        """
+
+        with self._lock:
+            return dict((path, list(entry))
+                        for (path, entry) in self._entries.items())
+
+    def load(self, entries):
+        with self._lock:
+            for (path, entry) in entries.items():
+                self._entries[path] = tuple(entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _children(result):
+    try:
+        return result.get()
+    except kz_exceptions.NoNodeError:
+        return None
+
+
+class TreeDiff(object):
+    """Compute the differences between the subtree beneath root on a
+    source and a target cluster, and apply them to the target
+
+    Both subtrees are walked in breadth-first order with their znodeStat
+    only. The data of a znode are only read from both sides when the
+    ``dataLength`` is the same on both sides and the :class:`SyncMemo`
+    does not already know them to be equal. A branch missing on one side
+    is listed without reading any data. Ephemeral znodes are not synced,
+    neither created nor deleted along with their ancestors.
+
+    :param source: the KazooClient of the source cluster
+    :param target: the KazooClient of the target cluster
+    :param window: the maximum number of znodes read in flight
+    :param memo: the :class:`SyncMemo` of the pair of clusters
+    """
+
+    def __init__(self, source, target, root, window=bulk.TREE_WINDOW,
+                 memo=None):
+        self.source = source
+        self.target = target
+        self.root = root
+        self.window = bulk.check_window(window)
+        self.memo = memo if memo is not None else SyncMemo()
+        # (op, path) in an order they can be applied in
+        self.entries = list()
+        self.failed = list()
+        self.compared = 0
+        self.data_compared = 0
+
+    def fail(self, path, excp):
+        self.failed.append({"path": path,
+                            "error": excp.__class__.__name__})
+
+    def run(self):
+        """walk both subtrees and collect the differences
+        """
+
+        if self.source.exists(self.root) is None:
+            # never wipe the target subtree out for a mistyped root
+            raise kz_exceptions.NoNodeError()
+        candidates = list()
+        pending = collections.deque([self.root])
+        inflight = collections.deque()
+        while pending or inflight:
+            while pending and len(inflight) < self.window:
+                path = pending.popleft()
+                inflight.append((
+                    path,
+                    self.source.get_children_async(path, include_data=True),
+                    self.target.get_children_async(path, include_data=True)))
+            (path, source_result, target_result) = inflight.popleft()
+            try:
+                source_node = _children(source_result)
+                target_node = _children(target_result)
+            except kz_exceptions.KazooException as excp:
+                self.fail(path, excp)
+                continue
+            if source_node is None and target_node is None:
+                continue
+            elif source_node is None:
+                self._deleted(path)
+                continue
+            elif target_node is None:
+                self._created(path)
+                continue
+            ((source_children, source_stat),
+             (target_children, target_stat)) = (source_node, target_node)
+            self.compared += 1
+            persistent = not (source_stat.ephemeralOwner or
+                              target_stat.ephemeralOwner)
+            if (persistent and
+                    source_stat.dataLength != target_stat.dataLength):
+                # differing without reading the data
+                self.entries.append(("set", path))
+            elif (persistent and source_stat.dataLength and
+                  not self.memo.equal(path, source_stat, target_stat)):
+                candidates.append(path)
+            source_children = set(source_children)
+            target_children = set(target_children)
+            for child in sorted(source_children | target_children):
+                child_path = posixpath.join(path, child)
+                if child not in target_children:
+                    self._created(child_path)
+                elif child not in source_children:
+                    self._deleted(child_path)
+                else:
+                    pending.append(child_path)
+        self._compareData(candidates)
+        return self
+
+    def _created(self, path):
+        for node in bulk.walk_tree(self.source, path, window=self.window,
+                                   data=False):
+            if node.error is not None:
+                self.fail(node.path, node.error)
+            elif not node.stat.ephemeralOwner:
+                self.entries.append(("create", node.path))
+
+    def _deleted(self, path):
+        nodes = list(bulk.walk_tree(self.target, path, window=self.window,
+                                    data=False))
+        # the ancestors of the znodes left in place cannot be deleted
+        kept = set()
+        # the children first
+        for node in reversed(nodes):
+            if node.error is not None:
+                self.fail(node.path, node.error)
+            elif node.stat.ephemeralOwner or node.path in kept:
+                pass
+            else:
+                self.entries.append(("delete", node.path))
+                continue
+            kept.add(posixpath.dirname(node.path))
+
+    def _compareData(self, paths):
+        for start in range(0, len(paths), self.window):
+            results = [(path,
+                        self.source.get_async(path),
+                        self.target.get_async(path))
+                       for path in paths[start:start + self.window]]
+            for (path, source_result, target_result) in results:
+                try:
+                    (source_data, source_stat) = source_result.get()
+                    (target_data, target_stat) = target_result.get()
+                except kz_exceptions.NoNodeError:
+                    # deleted meanwhile, the next diff will tell
+                    continue
+                except kz_exceptions.KazooException as excp:
+                    self.fail(path, excp)
+                    continue
+                self.data_compared += 1
+                if source_data != target_data:
+                    self.entries.append(("set", path))
+                else:
+                    self.memo.remember(path, source_stat, target_stat)
+
+    def summary(self):
+        data = {"created": [],
+                "updated": [],
+                "deleted": [],
+                "failed": self.failed,
+                "compared": self.compared,
+                "data_compared": self.data_compared}
+        names = {"create": "created", "set": "updated", "delete": "deleted"}
+        for (op, path) in self.entries:
+            data[names[op]].append(path)
+        return data
+
+    def apply(self, acl=None, chunk_size=bulk.TXN_CHUNK_SIZE):
+        """apply the differences to the target in transactions of
+        chunk_size operations, reading the data from the source
+
+        The missing ancestors of the root are created beforehand.
+
+        :param acl: the acl of the created znodes, by default the acl of
+            each znode on the source
+        :returns: the (op, path, result) of every operation, the result
+            being as for :func:`wildlife.bulk.commit_ops`
+        """
+
+        created = set(path for (op, path) in self.entries if op == "create")
+        writes = [path for (op, path) in self.entries if op != "delete"]
+        data = dict()
+        acls = dict()
+        for start in range(0, len(writes), self.window):
+            results = [(path,
+                        self.source.get_async(path),
+                        self.source.get_acls_async(path)
+                        if acl is None and path in created else None)
+                       for path in writes[start:start + self.window]]
+            for (path, result, acl_result) in results:
+                try:
+                    data[path] = result.get()[0]
+                    if acl_result is not None:
+                        acls[path] = acl_result.get()[0]
+                except kz_exceptions.KazooException as excp:
+                    data.pop(path, None)
+                    self.fail(path, excp)
+        ops = list()
+        for (op, path) in self.entries:
+            if op == "delete":
+                ops.append({"op": op, "path": path})
+            elif op == "create" and path in data:
+                ops.append({"op": op, "path": path, "data": data[path],
+                            "acl": acls.get(path)})
+            elif path in data:
+                ops.append({"op": op, "path": path, "data": data[path]})
+        if self.root in created:
+            try:
+                self._ensureParents(acl)
+            except kz_exceptions.KazooException as excp:
+                # the creates fail along with their parents
+                self.fail(self.root, excp)
+        results = bulk.commit_ops(self.target, ops, acl=acl,
+                                  chunk_size=chunk_size)
+        return [(op["op"], op["path"], result)
+                for (op, result) in zip(ops, results)]
+
+    def _ensureParents(self, acl=None):
+        """create the missing ancestors of the root on the target, with
+        acl or else the acl of the same znode on the source
+        """
+
+        for parent in reversed(bulk.parent_paths(self.root)):
+            if self.target.exists(parent) is not None:
+                continue
+            try:
+                self.target.create(
+                    parent, acl=acl or self.source.get_acls(parent)[0])
+            except kz_exceptions.NodeExistsError:
+                pass
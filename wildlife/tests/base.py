@@ -0,0 +1,105 @@
+import time
+import unittest
+import yaml
+from wildlife import WildLife
+from wildlife.manager import ClusterManager
+from wildlife.pool import SessionPool
+from wildlife.tests.fakes import FakeClient, FakeEnsemble
+
+
+class FakeSessionPool(SessionPool):
+    """A SessionPool of the sessions of a FakeEnsemble
+
+    :param handshake: seconds each pooled session takes to connect
+    """
+
+    def __init__(self, ensemble, cluster, handshake=0, **kwargs):
+        super(FakeSessionPool, self).__init__(cluster, **kwargs)
+        self.ensemble = ensemble
+        self.handshake = handshake
+        self.created = 0
+
+    def _getClient(self, scheme, credential):
+        self.created += 1
+        return FakeClient(self.ensemble, auth_data=[(scheme, credential)],
+                          handshake=self.handshake)
+
+
+class FakeClusterManager(ClusterManager):
+    """A ClusterManager connected to a FakeEnsemble
+    """
+
+    def __init__(self, cluster, ensemble):
+        super(FakeClusterManager, self).__init__(cluster)
+        self.ensemble = ensemble
+        self.sessions = FakeSessionPool(
+            ensemble, cluster, max_size=cluster.session_pool_size,
+            idle_timeout=cluster.session_idle_timeout)
+
+    def _getClient(self):
+        return FakeClient(self.ensemble, auth_data=self.cluster.auth_data)
+
+
+def wait_until(predicate, timeout=5):
+    """poll predicate until it is true, for the threads of a test
+    """
+
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for the condition")
+        time.sleep(0.01)
+
+
+def load_config(clusters, **options):
+    """load the Config of WildLife serving the clusters
+
+    :param clusters: the options of every cluster by name
+    """
+
+    content = dict(options)
+    content["wildlife"] = sorted(clusters)
+    content["clusters"] = [dict(opts, name=name, hosts="127.0.0.1:2181")
+                           for (name, opts) in sorted(clusters.items())]
+    return WildLife(None).loadConfig(yaml.safe_dump(content))
+
+
+class WildTestCase(unittest.TestCase):
+    """Serve wildlife.rest from the clusters of ``clusters``, each one
+    backed by a FakeEnsemble in ``self.ensembles``, with the top-level
+    ``options`` of the configuration
+    """
+
+    clusters = {"cluster01": {}}
+    options = {}
+
+    def setUp(self):
+        from wildlife import rest
+
+        self.ensembles = dict()
+        self.wild = WildLife(None)
+        config = load_config(self.clusters, **self.options)
+        for (name, cluster) in config.clusters.items():
+            self.ensembles[name] = FakeEnsemble()
+            manager = FakeClusterManager(cluster, self.ensembles[name])
+            manager.daemon = True
+            config.managers[name] = manager
+            manager.start()
+            self.assertTrue(manager.ready.wait(5))
+        self.wild.setConfig(config)
+        self.app = rest.app
+        self._wild = self.app.wild
+        self.app.wild = self.wild
+        self.addCleanup(self._stopWild)
+        self.client = self.app.test_client()
+        self.zk = self.ensembles["cluster01"].client()
+        self.addCleanup(self.zk.stop)
+
+    def _stopWild(self):
+        self.app.wild = self._wild
+        self.wild.stop()
+        for manager in self.wild.config.managers.values():
+            manager.join(5)
+
+    def manager(self, name="cluster01"):
+        return self.wild.config.managers[name]
@@ -0,0 +1,458 @@
+import collections
+import copy
+import posixpath
+import threading
+import time
+from kazoo import exceptions as kz_exceptions
+from kazoo.client import KazooState
+from kazoo.handlers.threading import SequentialThreadingHandler
+from kazoo.protocol.paths import _prefix_root
+from kazoo.protocol.states import EventType, KeeperState, WatchedEvent
+from kazoo.protocol.states import ZnodeStat
+from kazoo.security import OPEN_ACL_UNSAFE
+import six
+
+
+class _Znode(object):
+
+    def __init__(self, data, acl, zxid, owner=0):
+        self.data = data
+        self.acl = list(acl)
+        self.children = list()
+        self.czxid = self.mzxid = self.pzxid = zxid
+        self.ctime = self.mtime = int(time.time() * 1000)
+        self.version = 0
+        self.cversion = 0
+        self.aversion = 0
+        self.ephemeralOwner = owner
+
+    def stat(self):
+        return ZnodeStat(self.czxid, self.mzxid, self.ctime, self.mtime,
+                         self.version, self.cversion, self.aversion,
+                         self.ephemeralOwner, len(self.data),
+                         len(self.children), self.pzxid)
+
+
+class FakeEnsemble(object):
+    """An in-memory ZooKeeper ensemble shared by the sessions of
+    :class:`FakeClient`
+
+    Every write fires the one-shot data and children watches registered on
+    the znodes it touches, as ZooKeeper does, in the thread of the writer.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.zxid = 0
+        self.sessions = 0
+        self.nodes = {"/": _Znode(b"", OPEN_ACL_UNSAFE, 0)}
+        self._data_watches = collections.defaultdict(list)
+        self._child_watches = collections.defaultdict(list)
+
+    def client(self, **kwargs):
+        """a started FakeClient of this ensemble
+        """
+
+        client = FakeClient(self, **kwargs)
+        client.start()
+        return client
+
+    def watches(self, path):
+        """the number of watches registered on the znode on path
+        """
+
+        with self.lock:
+            return (len(self._data_watches.get(path, ())) +
+                    len(self._child_watches.get(path, ())))
+
+    def openSession(self):
+        with self.lock:
+            self.sessions += 1
+            return self.sessions
+
+    def closeSession(self, session_id):
+        with self.lock:
+            ephemerals = sorted((path for (path, node) in self.nodes.items()
+                                 if node.ephemeralOwner == session_id),
+                                reverse=True)
+        for path in ephemerals:
+            try:
+                self.run("delete", path, -1)
+            except kz_exceptions.NoNodeError:
+                pass
+
+    def run(self, op, *args):
+        """apply one read or write, then fire the watches it triggers
+        """
+
+        triggers = list()
+        with self.lock:
+            result = getattr(self, "_" + op)(triggers, *args)
+            callbacks = self._popWatches(triggers)
+        self._fire(callbacks)
+        return result
+
+    def multi(self, ops):
+        """apply the (op, args) of a transaction all or nothing
+        """
+
+        triggers = list()
+        with self.lock:
+            nodes = copy.deepcopy(self.nodes)
+            zxid = self.zxid
+            results = list()
+            for (i, (op, args)) in enumerate(ops):
+                try:
+                    results.append(getattr(self, "_" + op)(triggers, *args))
+                except kz_exceptions.ZookeeperError as excp:
+                    self.nodes = nodes
+                    self.zxid = zxid
+                    return ([kz_exceptions.RolledBackError()] * i + [excp] +
+                            [kz_exceptions.RuntimeInconsistency()] *
+                            (len(ops) - i - 1))
+            callbacks = self._popWatches(triggers)
+        self._fire(callbacks)
+        return results
+
+    def _popWatches(self, triggers):
+        # must be called with self.lock held
+        callbacks = list()
+        for (watches, path, event_type) in triggers:
+            event = WatchedEvent(event_type, KeeperState.CONNECTED, path)
+            for watch in watches.pop(path, []):
+                callbacks.append((watch, event))
+        return callbacks
+
+    def _fire(self, callbacks):
+        for (watch, event) in callbacks:
+            watch(event)
+
+    def _next(self):
+        self.zxid += 1
+        return self.zxid
+
+    def _node(self, path):
+        node = self.nodes.get(path)
+        if node is None:
+            raise kz_exceptions.NoNodeError()
+        return node
+
+    def _checkVersion(self, version, current):
+        if version != -1 and version != current:
+            raise kz_exceptions.BadVersionError()
+
+    def _watch(self, watches, path, watch):
+        # one watch per (path, callback), as KazooClient keeps them
+        if watch is not None and watch not in watches[path]:
+            watches[path].append(watch)
+
+    def _exists(self, triggers, path, watch):
+        self._watch(self._data_watches, path, watch)
+        node = self.nodes.get(path)
+        return node.stat() if node is not None else None
+
+    def _get(self, triggers, path, watch):
+        node = self._node(path)
+        self._watch(self._data_watches, path, watch)
+        return (node.data, node.stat())
+
+    def _get_children(self, triggers, path, watch):
+        node = self._node(path)
+        self._watch(self._child_watches, path, watch)
+        return (list(node.children), node.stat())
+
+    def _get_acls(self, triggers, path):
+        node = self._node(path)
+        return (list(node.acl), node.stat())
+
+    def _create(self, triggers, path, value, acl, ephemeral, sequence,
+                owner):
+        parent_path = posixpath.dirname(path)
+        parent = self._node(parent_path)
+        if parent.ephemeralOwner:
+            raise kz_exceptions.NoChildrenForEphemeralsError()
+        if sequence:
+            path += "%010d" % parent.cversion
+        if path in self.nodes:
+            raise kz_exceptions.NodeExistsError()
+        zxid = self._next()
+        self.nodes[path] = _Znode(value, acl or OPEN_ACL_UNSAFE, zxid,
+                                  owner if ephemeral else 0)
+        parent.children.append(posixpath.basename(path))
+        parent.cversion += 1
+        parent.pzxid = zxid
+        triggers.append((self._data_watches, path, EventType.CREATED))
+        triggers.append((self._child_watches, parent_path, EventType.CHILD))
+        return path
+
+    def _set(self, triggers, path, value, version):
+        node = self._node(path)
+        self._checkVersion(version, node.version)
+        node.data = value
+        node.version += 1
+        node.mzxid = self._next()
+        node.mtime = int(time.time() * 1000)
+        triggers.append((self._data_watches, path, EventType.CHANGED))
+        return node.stat()
+
+    def _delete(self, triggers, path, version):
+        if path == "/":
+            raise kz_exceptions.BadArgumentsError()
+        node = self._node(path)
+        self._checkVersion(version, node.version)
+        if node.children:
+            raise kz_exceptions.NotEmptyError()
+        parent_path = posixpath.dirname(path)
+        parent = self.nodes[parent_path]
+        del self.nodes[path]
+        parent.children.remove(posixpath.basename(path))
+        parent.cversion += 1
+        parent.pzxid = self._next()
+        triggers.append((self._data_watches, path, EventType.DELETED))
+        triggers.append((self._child_watches, path, EventType.DELETED))
+        triggers.append((self._child_watches, parent_path, EventType.CHILD))
+        return True
+
+    def _check(self, triggers, path, version):
+        node = self._node(path)
+        if version != node.version:
+            raise kz_exceptions.BadVersionError()
+        return True
+
+    def _set_acls(self, triggers, path, acls, version):
+        node = self._node(path)
+        self._checkVersion(version, node.aversion)
+        node.acl = list(acls)
+        node.aversion += 1
+        return node.stat()
+
+
+class FakeTransaction(object):
+    """The multi-op transaction of :class:`FakeClient`, mirroring
+    kazoo's TransactionRequest
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.operations = list()
+
+    def create(self, path, value=b"", acl=None, ephemeral=False,
+               sequence=False):
+        self.operations.append(("create", (self.client._path(path),
+                                           self.client._value(value), acl,
+                                           ephemeral, sequence,
+                                           self.client.session_id)))
+
+    def set_data(self, path, value, version=-1):
+        self.operations.append(("set", (self.client._path(path),
+                                        self.client._value(value),
+                                        version)))
+
+    def delete(self, path, version=-1):
+        self.operations.append(("delete", (self.client._path(path),
+                                           version)))
+
+    def check(self, path, version):
+        self.operations.append(("check", (self.client._path(path),
+                                          version)))
+
+    def commit_async(self):
+        return self.client._call("multi", self.client.ensemble.multi,
+                                 list(self.operations))
+
+    def commit(self):
+        return self.commit_async().get()
+
+
+class FakeClient(object):
+    """A KazooClient session of a :class:`FakeEnsemble`
+
+    Paths are normalized the way KazooClient does. ``calls`` counts the
+    requests sent per operation.
+
+    :param handshake: seconds each :meth:`start` takes to connect
+    :param delay: seconds each request takes, the ``*_async`` requests
+        then complete in another thread
+    """
+
+    def __init__(self, ensemble, auth_data=None, handshake=0, delay=0):
+        self.ensemble = ensemble
+        self.auth_data = set(auth_data or [])
+        self.handshake = handshake
+        self.delay = delay
+        self.handler = SequentialThreadingHandler()
+        self.state = KazooState.LOST
+        self.connected = False
+        self.session_id = None
+        self.starts = 0
+        self.calls = collections.Counter()
+        self.chroot = ""
+        # looked up by the TreeCache of kazoo, the watches being kept by
+        # the ensemble
+        self._data_watchers = dict()
+        self._child_watchers = dict()
+        self._listeners = list()
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _setState(self, state):
+        self.state = state
+        self.connected = state == KazooState.CONNECTED
+        for listener in list(self._listeners):
+            listener(state)
+
+    def start(self, timeout=15):
+        with self._lock:
+            self.starts += 1
+        time.sleep(self.handshake)
+        if self.session_id is not None:
+            return
+        self.handler.start()
+        self.session_id = self.ensemble.openSession()
+        self._setState(KazooState.CONNECTED)
+
+    def stop(self):
+        if self.session_id is None:
+            return
+        self.ensemble.closeSession(self.session_id)
+        self.session_id = None
+        self._setState(KazooState.LOST)
+        self.handler.stop()
+
+    def close(self):
+        pass
+
+    def _path(self, path):
+        if not isinstance(path, six.string_types):
+            raise TypeError("Invalid type for 'path' (string expected)")
+        return _prefix_root("", path)
+
+    def _value(self, value):
+        if not isinstance(value, bytes):
+            raise TypeError("Invalid type for 'value' (must be a byte "
+                            "string)")
+        return value
+
+    def _call(self, op, func, *args):
+        result = self.handler.async_result()
+
+        def request():
+            with self._lock:
+                self.calls[op] += 1
+            if self.delay:
+                time.sleep(self.delay)
+            try:
+                if not self.connected:
+                    raise kz_exceptions.ConnectionClosedError(
+                        "Connection has been closed")
+                result.set(func(*args))
+            except Exception as excp:
+                result.set_exception(excp)
+
+        if self.delay:
+            t = threading.Thread(target=request)
+            t.daemon = True
+            t.start()
+        else:
+            request()
+        return result
+
+    def _run(self, op, *args):
+        return self._call(op, self.ensemble.run, op, *args)
+
+    def exists_async(self, path, watch=None):
+        return self._run("exists", self._path(path), watch)
+
+    def exists(self, path, watch=None):
+        return self.exists_async(path, watch=watch).get()
+
+    def get_async(self, path, watch=None):
+        return self._run("get", self._path(path), watch)
+
+    def get(self, path, watch=None):
+        return self.get_async(path, watch=watch).get()
+
+    def get_children_async(self, path, watch=None, include_data=False):
+        result = self.handler.async_result()
+
+        def done(async_result):
+            try:
+                (children, stat) = async_result.get()
+            except Exception as excp:
+                result.set_exception(excp)
+                return
+            result.set((children, stat) if include_data else children)
+
+        self._run("get_children", self._path(path),
+                  watch).rawlink(done)
+        return result
+
+    def get_children(self, path, watch=None, include_data=False):
+        (children, stat) = self._run("get_children", self._path(path),
+                                     watch).get()
+        return (children, stat) if include_data else children
+
+    def get_acls_async(self, path):
+        return self._run("get_acls", self._path(path))
+
+    def get_acls(self, path):
+        return self.get_acls_async(path).get()
+
+    def set_acls_async(self, path, acls, version=-1):
+        return self._run("set_acls", self._path(path), acls, version)
+
+    def set_acls(self, path, acls, version=-1):
+        return self.set_acls_async(path, acls, version=version).get()
+
+    def create_async(self, path, value=b"", acl=None, ephemeral=False,
+                     sequence=False, makepath=False):
+        path = self._path(path)
+        value = self._value(value)
+        if makepath:
+            self.ensure_path(posixpath.dirname(path), acl=acl)
+        return self._run("create", path, value, acl, ephemeral, sequence,
+                         self.session_id)
+
+    def create(self, path, value=b"", acl=None, ephemeral=False,
+               sequence=False, makepath=False):
+        return self.create_async(path, value=value, acl=acl,
+                                 ephemeral=ephemeral, sequence=sequence,
+                                 makepath=makepath).get()
+
+    def ensure_path(self, path, acl=None):
+        path = self._path(path)
+        missing = list()
+        while path != "/" and self.exists(path) is None:
+            missing.append(path)
+            path = posixpath.dirname(path)
+        for path in reversed(missing):
+            try:
+                self.create(path, acl=acl)
+            except kz_exceptions.NodeExistsError:
+                pass
+        return True
+
+    def set_async(self, path, value, version=-1):
+        return self._run("set", self._path(path), self._value(value),
+                         version)
+
+    def set(self, path, value, version=-1):
+        return self.set_async(path, value, version=version).get()
+
+    def delete_async(self, path, version=-1):
+        return self._run("delete", self._path(path), version)
+
+    def delete(self, path, version=-1, recursive=False):
+        path = self._path(path)
+        if recursive:
+            for child in self.get_children(path):
+                self.delete(posixpath.join(path, child), recursive=True)
+        return self.delete_async(path, version=version).get()
+
+    def transaction(self):
+        return FakeTransaction(self)
@@ -0,0 +1,104 @@
+import json
+import unittest
+from wildlife.tests.base import WildTestCase
+
+try:
+    import asyncio
+    from aiohttp.test_utils import TestClient, TestServer
+    from wildlife import aio
+except (ImportError, SyntaxError):
+    # Python < 3.5 or no aiohttp
+    aio = None
+
+
+@unittest.skipIf(aio is None, "the aio server requires Python 3.5+ and "
+                              "aiohttp")
+class AioTest(WildTestCase):
+
+    clusters = {"cluster01": {"cache_max_bytes": 1024 * 1024,
+                              "children_cache_max_bytes": 1024 * 1024}}
+    options = {"compression": {"min_size": 1}}
+
+    def setUp(self):
+        super(AioTest, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.aio_client = TestClient(
+            TestServer(aio.AsyncWild(self.app).make_app()), loop=self.loop)
+        self.loop.run_until_complete(self.aio_client.start_server())
+        self.addCleanup(self.loop.run_until_complete,
+                        self.aio_client.close())
+        self.zk.create("/a/b", b"1", makepath=True)
+
+    def request(self, method, path, **kwargs):
+        resp = self.loop.run_until_complete(
+            self.aio_client.request(method, path, **kwargs))
+        text = self.loop.run_until_complete(resp.text())
+        return (resp.status, text)
+
+    def etag(self, path, **headers):
+        resp = self.loop.run_until_complete(
+            self.aio_client.request("GET", path, headers=headers))
+        self.loop.run_until_complete(resp.read())
+        return (resp.status, resp.headers.get("ETag"))
+
+    def test_get(self):
+        (status, text) = self.request("GET", "/wildlife/cluster01/a/b")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(text)["data"], "1")
+
+    def test_binary_znode(self):
+        self.zk.create("/bin", b"\xde\xad\xbe\xef")
+        (status, text) = self.request("GET", "/wildlife/cluster01/bin")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(text)["encoding"], "base64")
+
+    def test_put_acls(self):
+        acls = '[{"scheme": "world", "credential": "anyone", "read": True}]'
+        (status, text) = self.request("PUT", "/wildlife/cluster01/a/acls",
+                                      data=acls,
+                                      headers={"Content-Type": "text/plain"})
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(text)["znodeStat"]["aversion"], 1)
+        (acls, _) = self.zk.get_acls("/a")
+        self.assertEqual([acl.perms for acl in acls], [1])
+        self.assertIsNone(self.zk.exists("/a/acls"))
+
+    def test_put_acls_content_type(self):
+        (status, _) = self.request("PUT", "/wildlife/cluster01/a/acls",
+                                   data="[]",
+                                   headers={"Content-Type": "text/html"})
+        self.assertEqual(status, 406)
+
+    def test_metrics(self):
+        self.request("GET", "/wildlife/cluster01/a/b")
+        (status, text) = self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertIn("wildlife_http_requests_total", text)
+
+    def test_invalidate_parent_listing(self):
+        manager = self.manager()
+        manager.children_cache.get("/a")
+        manager.cache.get("/a/b")
+        aio.AsyncWild(self.app)._invalidate("cluster01", "a/b")
+        self.assertIsNone(manager.children_cache.peek("/a"))
+        self.assertIsNone(manager.cache.peek("/a/b"))
+
+    def test_delete(self):
+        (status, _) = self.request("DELETE", "/wildlife/cluster01/a/b")
+        self.assertEqual(status, 202)
+        (status, text) = self.request("GET", "/wildlife/cluster01/a/children")
+        self.assertEqual(text, "[]")
+
+    def test_compressed_etag_is_weak(self):
+        (_, identity) = self.etag("/wildlife/cluster01/a/b/data",
+                                  **{"Accept-Encoding": "identity"})
+        self.assertFalse(identity.startswith("W/"))
+        (_, etag) = self.etag("/wildlife/cluster01/a/b/data",
+                              **{"Accept-Encoding": "gzip"})
+        self.assertEqual(etag, "W/" + identity)
+        self.assertEqual(self.etag("/wildlife/cluster01/a/b/data",
+                                   **{"Accept-Encoding": "gzip",
+                                      "If-None-Match": etag}),
+                         (304, etag))
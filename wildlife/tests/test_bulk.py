@@ -0,0 +1,220 @@
+import json
+import unittest
+from kazoo import exceptions as kz_exceptions
+from wildlife import bulk
+from wildlife.tests.base import WildTestCase
+from wildlife.tests.fakes import FakeEnsemble
+
+
+class RestTreeTest(WildTestCase):
+
+    def setUp(self):
+        super(RestTreeTest, self).setUp()
+        self.zk.create("/a/b", b"1", makepath=True)
+        self.zk.create("/a/bin", b"\xde\xad\xbe\xef")
+
+    def tree(self, znode, **kwargs):
+        resp = self.client.get("/wildlife/cluster01/%s/tree" % znode,
+                               **kwargs)
+        self.assertEqual(resp.status_code, 200)
+        return [json.loads(line) for line
+                in resp.get_data(as_text=True).splitlines()]
+
+    def test_tree(self):
+        lines = self.tree("a")
+        self.assertEqual([line["path"] for line in lines],
+                         ["/a", "/a/b", "/a/bin"])
+        self.assertEqual(lines[1]["data"], "1")
+        self.assertNotIn("encoding", lines[1])
+
+    def test_binary_znode(self):
+        line = self.tree("a")[2]
+        self.assertEqual(line["encoding"], "base64")
+        self.assertEqual(line["data"], "3q2+7w==")
+        self.assertEqual(line["znodeStat"]["dataLength"], 4)
+
+    def test_bad_window(self):
+        resp = self.client.get("/wildlife/cluster01/a/tree?window=0")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_import_round_trip(self):
+        body = "\n".join(json.dumps(line) for line in self.tree("a"))
+        resp = self.client.post("/wildlife/cluster01/c/_import?source=/a",
+                                data=body,
+                                content_type="application/x-ndjson")
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.get_data(as_text=True))
+        self.assertEqual(data["failed"], [])
+        self.assertEqual(self.zk.get("/c/bin")[0], b"\xde\xad\xbe\xef")
+        self.assertEqual(self.zk.get("/c/b")[0], b"1")
+
+    def test_import_malformed_base64(self):
+        body = json.dumps({"path": "/a/c", "data": "3q2",
+                           "encoding": "base64"})
+        resp = self.client.post("/wildlife/cluster01/a/_import",
+                                data=body,
+                                content_type="application/x-ndjson")
+        data = json.loads(resp.get_data(as_text=True))
+        self.assertEqual(len(data["failed"]), 1)
+        self.assertIsNone(self.zk.exists("/a/c"))
+
+
+class _Result(object):
+
+    def __init__(self, client, result):
+        self.client = client
+        self.result = result
+
+    def get(self):
+        self.client.inflight -= 1
+        return self.result.get()
+
+
+class _WindowClient(object):
+    """count the async calls of a client issued but not waited for yet
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not name.endswith("_async"):
+            return method
+
+        def call(*args, **kwargs):
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+            return _Result(self, method(*args, **kwargs))
+        return call
+
+
+class DeleteTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zk = FakeEnsemble().client()
+        self.addCleanup(self.zk.stop)
+        for i in range(10):
+            self.zk.create("/a/b%d/c" % i, makepath=True)
+
+    def test_walk_breadth_first(self):
+        paths = [node.path for node in bulk.walk_tree(self.zk, "/a")]
+        self.assertEqual(paths[:3], ["/a", "/a/b0", "/a/b1"])
+        self.assertEqual(paths[-1], "/a/b9/c")
+        self.assertEqual(len(paths), 21)
+
+    def test_bounded_window(self):
+        client = _WindowClient(self.zk)
+        (deleted, failed) = bulk.delete_tree(client, "/a", window=4)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(deleted), 21)
+        self.assertEqual(deleted[-1], "/a")
+        self.assertIsNone(self.zk.exists("/a"))
+        self.assertLessEqual(client.max_inflight, 4)
+
+    def test_dry_run(self):
+        (paths, failed) = bulk.delete_tree(self.zk, "/a", dry_run=True)
+        self.assertEqual(len(paths), 21)
+        self.assertIsNotNone(self.zk.exists("/a/b0/c"))
+
+    def test_version_checked_first(self):
+        self.assertRaises(kz_exceptions.BadVersionError, bulk.delete_tree,
+                          self.zk, "/a", version=3)
+        self.assertIsNotNone(self.zk.exists("/a/b0/c"))
+
+
+class RestDeleteTreeTest(WildTestCase):
+
+    def setUp(self):
+        super(RestDeleteTreeTest, self).setUp()
+        self.zk.create("/a/b/c", makepath=True)
+
+    def delete(self, query):
+        resp = self.client.delete("/wildlife/cluster01/a?" + query)
+        return (resp.status_code, resp.get_data(as_text=True))
+
+    def test_dry_run(self):
+        (status, text) = self.delete("recursive=true&dry_run=true")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(text), {"count": 3, "failed": []})
+        self.assertIsNotNone(self.zk.exists("/a/b/c"))
+
+    def test_recursive(self):
+        (status, text) = self.delete("recursive=true&window=1")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(text), {"deleted": 3, "failed": []})
+        self.assertIsNone(self.zk.exists("/a"))
+
+    def test_version_mismatch(self):
+        self.assertEqual(self.delete("recursive=true&version=5")[0], 409)
+        self.assertIsNotNone(self.zk.exists("/a/b/c"))
+
+    def test_bad_window(self):
+        self.assertEqual(self.delete("recursive=true&window=0")[0], 400)
+
+
+class TreeImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zk = FakeEnsemble().client()
+        self.addCleanup(self.zk.stop)
+
+    def test_create_and_update(self):
+        self.zk.create("/a", b"old")
+        importer = bulk.TreeImporter(self.zk, chunk_size=2, window=1)
+        for (path, data) in (("/a", "1"), ("/a/b", "2"), ("/x/y/z", "3")):
+            importer.add(path, data)
+        importer.finish()
+        self.assertEqual(importer.updated, ["/a"])
+        self.assertEqual(sorted(importer.created), ["/a/b", "/x/y/z"])
+        self.assertEqual(importer.failed, [])
+        self.assertEqual(self.zk.get("/a")[0], b"1")
+        self.assertEqual(self.zk.get("/x/y/z")[0], b"3")
+
+    def test_failing_chunk_retried_per_znode(self):
+        importer = bulk.TreeImporter(self.zk, chunk_size=10)
+        importer.add("/a", "1")
+        # an ephemeral parent cannot have children
+        owner = self.zk.ensemble.client()
+        self.addCleanup(owner.stop)
+        owner.create("/e", ephemeral=True)
+        importer.add("/e/child", "2")
+        importer.finish()
+        self.assertEqual(importer.created, ["/a"])
+        self.assertEqual([failed["path"] for failed in importer.failed],
+                         ["/e/child"])
+        self.assertEqual(self.zk.get("/a")[0], b"1")
+
+
+class RestImportTest(WildTestCase):
+
+    def post(self, znode, records, query=""):
+        body = "\n".join(json.dumps(record) for record in records)
+        resp = self.client.post("/wildlife/cluster01/%s/_import%s"
+                                % (znode, query),
+                                data=body,
+                                content_type="application/x-ndjson")
+        return (resp.status_code, json.loads(resp.get_data(as_text=True)))
+
+    def test_relative_paths(self):
+        (status, data) = self.post("r", [{"path": "a", "data": "1"},
+                                         {"path": "a/b", "data": "2"}])
+        self.assertEqual(status, 200)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(self.zk.get("/r/a/b")[0], b"2")
+
+    def test_paths_outside_the_znode(self):
+        (_, data) = self.post("r", [{"path": "/other", "data": "1"}])
+        self.assertEqual(data["created"], 0)
+        self.assertEqual(data["failed"], [{"path": "/other",
+                                           "error": "ValueError"}])
+        self.assertIsNone(self.zk.exists("/other"))
+
+    def test_bad_chunk_size(self):
+        resp = self.client.post("/wildlife/cluster01/r/_import?chunk_size=0",
+                                data=json.dumps({"path": "a"}),
+                                content_type="application/x-ndjson")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIsNone(self.zk.exists("/r"))
@@ -0,0 +1,143 @@
+import ast
+import json
+import unittest
+from wildlife.cache import ZnodeCache, ChildrenSnapshots
+from wildlife.tests.base import WildTestCase
+from wildlife.tests.fakes import FakeEnsemble
+
+
+class ZnodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zk = FakeEnsemble().client()
+        self.zk.create("/a/b", b"1", makepath=True)
+        self.cache = ZnodeCache(self.zk, 1024 * 1024)
+
+    def test_relative_path_shares_the_entry(self):
+        self.assertEqual(self.cache.get("a/b")[0], b"1")
+        self.assertEqual(self.cache.get("/a/b")[0], b"1")
+        self.assertEqual(self.zk.calls["get"], 1)
+        self.assertEqual(self.cache.peek("a/b/")[0], b"1")
+
+    def test_watch_event_invalidates_the_relative_path(self):
+        self.cache.get("a/b")
+        self.zk.set("/a/b", b"2")
+        self.assertIsNone(self.cache.peek("a/b"))
+        self.assertEqual(self.cache.get("a/b")[0], b"2")
+
+    def test_invalidate_relative_path(self):
+        self.cache.get("/a/b")
+        self.cache.invalidate("a/b")
+        self.assertEqual(len(self.cache), 0)
+
+
+class RestZnodeCacheTest(WildTestCase):
+
+    clusters = {"cluster01": {"cache_max_bytes": 1024 * 1024}}
+
+    def setUp(self):
+        super(RestZnodeCacheTest, self).setUp()
+        self.zk.create("/a/b", b"1", makepath=True)
+
+    def get_data(self, znode):
+        resp = self.client.get("/wildlife/cluster01/%s" % znode)
+        if resp.status_code != 200:
+            return resp.status_code
+        return json.loads(resp.get_data(as_text=True))["data"]
+
+    def test_external_change(self):
+        self.assertEqual(self.get_data("a/b"), "1")
+        self.zk.set("/a/b", b"2")
+        self.assertEqual(self.get_data("a/b"), "2")
+
+    def test_stale_etag_after_external_change(self):
+        resp = self.client.get("/wildlife/cluster01/a/b")
+        etag = resp.headers["ETag"]
+        self.zk.set("/a/b", b"2")
+        resp = self.client.get("/wildlife/cluster01/a/b",
+                               headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_delete(self):
+        self.assertEqual(self.get_data("a/b"), "1")
+        resp = self.client.delete("/wildlife/cluster01/a/b")
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(self.get_data("a/b"), 404)
+
+    def test_recursive_delete(self):
+        self.assertEqual(self.get_data("a"), "")
+        self.assertEqual(self.get_data("a/b"), "1")
+        resp = self.client.delete("/wildlife/cluster01/a?recursive=true")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.get_data("a/b"), 404)
+        self.assertEqual(self.get_data("a"), 404)
+
+    def test_put(self):
+        self.assertEqual(self.get_data("a/b"), "1")
+        resp = self.client.put("/wildlife/cluster01/a/b", data="2",
+                               content_type="text/plain")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.get_data("a/b"), "2")
+
+
+class ChildrenSnapshotsTest(unittest.TestCase):
+
+    def test_relative_path_shares_the_snapshot(self):
+        zk = FakeEnsemble().client()
+        zk.create("/a/b", makepath=True)
+        (children, zstat) = zk.get_children("/a", include_data=True)
+        snapshots = ChildrenSnapshots(100)
+        snapshots.put("a", None, zstat, children)
+        self.assertEqual(snapshots.get("/a", None, zstat), ["b"])
+        zk.create("/a/c")
+        zstat = zk.exists("/a")
+        self.assertIsNone(snapshots.get("a/", None, zstat))
+
+
+class RestChildrenCacheTest(WildTestCase):
+
+    clusters = {"cluster01": {"children_cache_max_bytes": 1024 * 1024}}
+
+    def setUp(self):
+        super(RestChildrenCacheTest, self).setUp()
+        self.zk.create("/a/b", makepath=True)
+
+    def get_children(self, znode):
+        resp = self.client.get("/wildlife/cluster01/%s/children" % znode)
+        return sorted(ast.literal_eval(resp.get_data(as_text=True)))
+
+    def get_page(self, znode):
+        resp = self.client.get("/wildlife/cluster01/%s/children"
+                               "?limit=10" % znode)
+        return json.loads(resp.get_data(as_text=True))["children"]
+
+    def test_child_create(self):
+        self.assertEqual(self.get_children("a"), ["b"])
+        self.assertEqual(self.get_page("a"), ["b"])
+        self.zk.create("/a/c")
+        self.assertEqual(self.get_children("a"), ["b", "c"])
+        self.assertEqual(self.get_page("a"), ["b", "c"])
+
+    def test_child_create_through_rest(self):
+        self.assertEqual(self.get_children("a"), ["b"])
+        resp = self.client.post("/wildlife/cluster01",
+                                data=json.dumps({"/a/c": "1"}),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.get_children("a"), ["b", "c"])
+
+    def test_child_delete(self):
+        self.assertEqual(self.get_children("a"), ["b"])
+        self.assertEqual(self.get_page("a"), ["b"])
+        resp = self.client.delete("/wildlife/cluster01/a/b")
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(self.get_children("a"), [])
+        self.assertEqual(self.get_page("a"), [])
+
+    def test_stale_etag_after_child_delete(self):
+        resp = self.client.get("/wildlife/cluster01/a/children")
+        etag = resp.headers["ETag"]
+        self.zk.delete("/a/b")
+        resp = self.client.get("/wildlife/cluster01/a/children",
+                               headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
@@ -0,0 +1,55 @@
+import gzip
+import io
+from wildlife.tests.base import WildTestCase
+
+
+class RestCompressTest(WildTestCase):
+
+    options = {"compression": {"min_size": 1}}
+
+    def setUp(self):
+        super(RestCompressTest, self).setUp()
+        self.zk.create("/a", b"1" * 64)
+
+    def get(self, path, **headers):
+        return self.client.get(path, headers=headers)
+
+    def test_gzip(self):
+        resp = self.get("/wildlife/cluster01/a/data",
+                        **{"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        body = gzip.GzipFile(fileobj=io.BytesIO(resp.get_data())).read()
+        self.assertEqual(body, b"1" * 64)
+
+    def test_identity(self):
+        resp = self.get("/wildlife/cluster01/a/data",
+                        **{"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertFalse(resp.headers["ETag"].startswith("W/"))
+
+    def test_compressed_etag_is_weak(self):
+        identity = self.get("/wildlife/cluster01/a/data").headers["ETag"]
+        resp = self.get("/wildlife/cluster01/a/data",
+                        **{"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["ETag"], "W/" + identity)
+
+    def test_weak_etag_revalidates(self):
+        etag = self.get("/wildlife/cluster01/a/data",
+                        **{"Accept-Encoding": "gzip"}).headers["ETag"]
+        resp = self.get("/wildlife/cluster01/a/data",
+                        **{"Accept-Encoding": "gzip",
+                           "If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.headers["ETag"], etag)
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+
+    def test_weak_etag_refused_by_if_match(self):
+        etag = self.get("/wildlife/cluster01/a/data",
+                        **{"Accept-Encoding": "gzip"}).headers["ETag"]
+        resp = self.client.put("/wildlife/cluster01/a", data="2",
+                               content_type="text/plain",
+                               headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.zk.get("/a")[0], b"1" * 64)
@@ -0,0 +1,40 @@
+import json
+from wildlife.tests.base import WildTestCase
+
+
+class RestFanoutTest(WildTestCase):
+
+    clusters = {"cluster01": {}, "cluster02": {}}
+
+    def setUp(self):
+        super(RestFanoutTest, self).setUp()
+        self.zk.create("/a", b"1")
+
+    def fanout(self, query=""):
+        resp = self.client.get("/wildlife/_all/a" + query)
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.get_data(as_text=True))
+
+    def test_every_cluster(self):
+        data = self.fanout()
+        self.assertEqual(sorted(data), ["cluster01", "cluster02"])
+        self.assertEqual(data["cluster01"]["data"], "1")
+        self.assertEqual(data["cluster02"], {"error": "NoNodeError",
+                                             "status": 404})
+
+    def test_named_clusters(self):
+        data = self.fanout("?clusters=cluster01,bogus")
+        self.assertEqual(sorted(data), ["bogus", "cluster01"])
+        self.assertEqual(data["bogus"], {"error": "UnknownCluster",
+                                         "status": 404})
+
+    def test_slow_cluster_times_out(self):
+        self.manager("cluster02")._client.delay = 1
+        data = self.fanout("?timeout=0.2")
+        self.assertEqual(data["cluster01"]["data"], "1")
+        self.assertEqual(data["cluster02"], {"error": "Timeout",
+                                             "status": 504})
+
+    def test_bad_timeout(self):
+        resp = self.client.get("/wildlife/_all/a?timeout=soon")
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+from wildlife.flight import SingleFlight
+from wildlife.tests.base import WildTestCase
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.runs = 0
+
+    def slow(self, value):
+        self.runs += 1
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def concurrently(self, value, count=5):
+        outcomes = list()
+
+        def call():
+            try:
+                outcomes.append(self.flights.do("key", self.slow, value))
+            except Exception as excp:
+                outcomes.append(excp)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        while self.flights.stats()["calls"] < count:
+            time.sleep(0.01)
+        self.release.set()
+        for t in threads:
+            t.join(5)
+        return outcomes
+
+    def test_shared_result(self):
+        outcomes = self.concurrently(1)
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(sorted(outcomes),
+                         [(1, False)] + [(1, True)] * 4)
+        self.assertEqual(self.flights.stats(),
+                         {"calls": 5, "shared": 4, "inflight": 0})
+
+    def test_shared_exception(self):
+        error = ValueError("boom")
+        outcomes = self.concurrently(error)
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(outcomes, [error] * 5)
+        self.assertEqual(len(self.flights), 0)
+
+    def test_sequential_calls_not_shared(self):
+        self.release.set()
+        self.assertEqual(self.flights.do("key", self.slow, 1), (1, False))
+        self.assertEqual(self.flights.do("key", self.slow, 2), (2, False))
+        self.assertEqual(self.runs, 2)
+
+
+class RestFlightTest(WildTestCase):
+
+    def test_identical_reads_share_one_call(self):
+        self.zk.create("/a", b"1")
+        zclient = self.manager()._client
+        zclient.delay = 0.2
+        responses = list()
+
+        def get():
+            responses.append(self.client.get("/wildlife/cluster01/a"))
+
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual([resp.status_code for resp in responses],
+                         [200] * 5)
+        self.assertEqual(zclient.calls["get"], 1)
@@ -0,0 +1,137 @@
+import threading
+import unittest
+from wildlife import limits
+from wildlife import wildutils
+from wildlife.tests.base import WildTestCase, FakeSessionPool
+from wildlife.tests.base import load_config, wait_until
+from wildlife.tests.fakes import FakeEnsemble
+
+
+class ClusterLimiterTest(unittest.TestCase):
+
+    def test_reserve_over_burst(self):
+        limiter = limits.ClusterLimiter({"read": {"rate": 1, "burst": 2}})
+        limiter.reserve("read", "a")
+        limiter.reserve("read", "a")
+        self.assertRaises(limits.RateLimitedError,
+                          limiter.reserve, "read", "a")
+        self.assertEqual(limiter.stats()["rejected"], 1)
+
+    def test_caller_buckets(self):
+        limiter = limits.ClusterLimiter({"client_read": {"rate": 1}})
+        limiter.reserve("read", "a")
+        self.assertRaises(limits.RateLimitedError,
+                          limiter.reserve, "read", "a")
+        limiter.reserve("read", "b")
+
+    def test_admit_refunds_without_slot(self):
+        limiter = limits.ClusterLimiter({"client_read": {"rate": 1},
+                                         "max_inflight": 1})
+        limiter.admit("read", "a")
+        self.assertRaises(limits.RateLimitedError,
+                          limiter.admit, "read", "b")
+        limiter.release()
+        # the token of b has been given back
+        limiter.admit("read", "b")
+
+
+class CallerIdentityTest(unittest.TestCase):
+
+    def setUp(self):
+        cluster = load_config({"cluster01": {}}).clusters["cluster01"]
+        self.sessions = FakeSessionPool(FakeEnsemble(), cluster)
+        self.addCleanup(self.sessions.close)
+
+    def test_address_without_headers(self):
+        self.assertEqual(wildutils.caller_identity({}, "10.0.0.1",
+                                                   self.sessions),
+                         "10.0.0.1")
+
+    def test_address_until_authenticated(self):
+        headers = {"scheme": "digest", "credential": "user1:password1"}
+        self.assertEqual(wildutils.caller_identity(headers, "10.0.0.1",
+                                                   self.sessions),
+                         "10.0.0.1")
+        self.sessions.release(self.sessions.acquire("digest",
+                                                    "user1:password1"))
+        caller = wildutils.caller_identity(headers, "10.0.0.1",
+                                           self.sessions)
+        self.assertTrue(caller.startswith("digest:user1:"))
+
+    def test_user_named_with_another_password(self):
+        for credential in ("user1:password1", "user1:guessed"):
+            self.sessions.release(self.sessions.acquire("digest",
+                                                        credential))
+        self.assertNotEqual(
+            wildutils.caller_identity({"scheme": "digest",
+                                       "credential": "user1:password1"},
+                                      "10.0.0.1", self.sessions),
+            wildutils.caller_identity({"scheme": "digest",
+                                       "credential": "user1:guessed"},
+                                      "10.0.0.1", self.sessions))
+
+
+class RestLimitsTest(WildTestCase):
+
+    clusters = {"cluster01": {"rate_limits": {"max_inflight": 2,
+                                              "max_wait": 0}}}
+
+    def setUp(self):
+        super(RestLimitsTest, self).setUp()
+        self.zk.create("/a", b"1")
+        self.limiter = self.manager().limiter
+
+    def test_parked_watches_release_their_slot(self):
+        mzxid = self.zk.exists("/a").mzxid
+        responses = list()
+
+        def poll():
+            responses.append(self.client.get(
+                "/wildlife/cluster01/a/watch?since_mzxid=%d&timeout=10" %
+                mzxid))
+
+        threads = [threading.Thread(target=poll) for _ in range(2)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        watches = self.manager().watches
+        wait_until(lambda: "/a" in watches._paths and
+                   watches._paths["/a"].waiters == 2)
+        self.assertEqual(self.limiter.stats()["inflight"], 0)
+        resp = self.client.get("/wildlife/cluster01/a")
+        self.assertEqual(resp.status_code, 200)
+        self.zk.set("/a", b"2")
+        for t in threads:
+            t.join(5)
+        self.assertEqual([resp.status_code for resp in responses],
+                         [200, 200])
+        self.assertEqual(self.limiter.stats()["inflight"], 0)
+
+    def test_slot_released_on_teardown(self):
+        for _ in range(3):
+            resp = self.client.get("/wildlife/cluster01/a")
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.limiter.stats()["inflight"], 0)
+
+
+class RestCallerLimitsTest(WildTestCase):
+
+    clusters = {"cluster01": {"rate_limits": {"client_read": {"rate": 1},
+                                              "max_wait": 0}}}
+
+    def test_retry_after(self):
+        self.zk.create("/a", b"1")
+        self.assertEqual(self.client.get("/wildlife/cluster01/a").status_code,
+                         200)
+        resp = self.client.get("/wildlife/cluster01/a")
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+
+    def test_unverified_headers_share_the_address_bucket(self):
+        self.zk.create("/a", b"1")
+        self.assertEqual(self.client.get("/wildlife/cluster01/a").status_code,
+                         200)
+        resp = self.client.get("/wildlife/cluster01/a",
+                               headers={"scheme": "digest",
+                                        "credential": "user1:password1"})
+        self.assertEqual(resp.status_code, 429)
@@ -0,0 +1,53 @@
+from kazoo.client import KazooState
+from wildlife.manager import ClusterManager
+from wildlife.tests.base import WildTestCase, wait_until
+
+
+class ClusterManagerTest(WildTestCase):
+
+    clusters = {"cluster01": {"cache_max_bytes": 1024 * 1024}}
+
+    def test_reconnect_after_session_lost(self):
+        manager = self.manager()
+        client = manager._client
+        self.assertEqual(client.starts, 1)
+        # the session expires
+        client.stop()
+        wait_until(lambda: manager.ready.is_set() and
+                   manager.state == KazooState.CONNECTED)
+        self.assertEqual(client.starts, 2)
+        self.assertEqual(manager.reconnects, 1)
+        self.assertEqual(manager.describe()["reconnects"], 1)
+
+    def test_suspended_clears_the_cache(self):
+        self.zk.create("/a", b"1")
+        manager = self.manager()
+        manager.cache.get("/a")
+        self.assertIsNotNone(manager.cache.peek("/a"))
+        manager._stateListener(KazooState.SUSPENDED)
+        self.assertIsNone(manager.cache.peek("/a"))
+        # a suspended session is recovered by kazoo itself
+        self.assertTrue(manager.ready.is_set())
+
+    def test_not_ready(self):
+        self.zk.create("/a", b"1")
+        self.manager().ready.clear()
+        resp = self.client.get("/wildlife/cluster01/a")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+
+    def test_backoff_bounds(self):
+        manager = self.manager()
+        for attempts in range(1, 30):
+            delay = manager._backoff(attempts)
+            self.assertLessEqual(delay, ClusterManager.backoff_max)
+            self.assertGreaterEqual(
+                delay, min(ClusterManager.backoff_max,
+                           ClusterManager.backoff_initial *
+                           2 ** attempts) / 2.0)
+
+    def test_stop(self):
+        manager = self.manager()
+        manager.stop()
+        manager.join(5)
+        self.assertFalse(manager.is_alive())
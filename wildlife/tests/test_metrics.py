@@ -0,0 +1,51 @@
+import re
+from wildlife import metrics
+from wildlife.tests.base import WildTestCase
+
+
+class RestMetricsTest(WildTestCase):
+
+    def scrape(self):
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_data(as_text=True)
+
+    def sample(self, name, **labels):
+        pattern = r"^%s\{([^}]*)\} (\S+)$" % re.escape(name)
+        total = 0.0
+        for match in re.finditer(pattern, self.scrape(), re.MULTILINE):
+            found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1)))
+            if all(found.get(k) == str(v) for (k, v) in labels.items()):
+                total += float(match.group(2))
+        return total
+
+    def test_request_counted(self):
+        before = self.sample("wildlife_http_requests_total",
+                             cluster="cluster01", status=404)
+        self.client.get("/wildlife/cluster01/missing")
+        self.assertEqual(self.sample("wildlife_http_requests_total",
+                                     cluster="cluster01", status=404),
+                         before + 1)
+
+    def test_unknown_clusters_share_a_label(self):
+        for name in ("bogus1", "bogus2"):
+            self.client.get("/wildlife/%s/a" % name)
+        text = self.scrape()
+        self.assertNotIn("bogus", text)
+        self.assertIn('cluster="unknown"', text)
+
+    def test_error_counted_once_per_exception(self):
+        before = self.sample("wildlife_http_errors_total",
+                             cluster="cluster01", exception="NoNodeError")
+        self.client.get("/wildlife/cluster01/missing")
+        self.assertEqual(self.sample("wildlife_http_errors_total",
+                                     cluster="cluster01",
+                                     exception="NoNodeError"),
+                         before + 1)
+
+    def test_registry_renders_every_metric(self):
+        text = metrics.REGISTRY.render()
+        for name in ("wildlife_http_requests_total",
+                     "wildlife_http_request_duration_seconds",
+                     "wildlife_zookeeper_op_duration_seconds"):
+            self.assertIn("# TYPE %s" % name, text)
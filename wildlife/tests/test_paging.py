@@ -0,0 +1,74 @@
+import json
+import unittest
+from wildlife import wildutils
+from wildlife.tests.base import WildTestCase
+
+NAMES = ["a1", "a2", "b1", "b2", "b3", "c1"]
+
+
+class _Stat(object):
+    pzxid = 7
+
+
+class PageChildrenTest(unittest.TestCase):
+
+    def page(self, **args):
+        return wildutils.page_children(NAMES, _Stat(), args)
+
+    def test_prefix_range(self):
+        self.assertEqual(wildutils.prefix_range(NAMES, "b"), (2, 5))
+        self.assertEqual(wildutils.prefix_range(NAMES, "d"), (6, 6))
+        self.assertEqual(wildutils.prefix_range(NAMES, ""), (0, 6))
+
+    def test_pages(self):
+        first = self.page(limit="4")
+        self.assertEqual(first["children"], ["a1", "a2", "b1", "b2"])
+        self.assertEqual(first["cursor"], "b2")
+        self.assertEqual(first["total"], 6)
+        last = self.page(limit="4", cursor=first["cursor"])
+        self.assertEqual(last["children"], ["b3", "c1"])
+        self.assertIsNone(last["cursor"])
+
+    def test_prefix_desc(self):
+        data = self.page(prefix="b", sort="desc", limit="2")
+        self.assertEqual(data["children"], ["b3", "b2"])
+        self.assertEqual(data["total"], 3)
+        data = self.page(prefix="b", sort="desc", limit="2",
+                         cursor=data["cursor"])
+        self.assertEqual(data["children"], ["b1"])
+        self.assertIsNone(data["cursor"])
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, self.page, sort="up")
+        self.assertRaises(ValueError, self.page, limit="-1")
+
+
+class RestPagingTest(WildTestCase):
+
+    def setUp(self):
+        super(RestPagingTest, self).setUp()
+        self.zk.create("/q")
+        for name in NAMES:
+            self.zk.create("/q/" + name, b"x")
+
+    def children(self, query):
+        resp = self.client.get("/wildlife/cluster01/q/children?" + query)
+        return (resp.status_code, json.loads(resp.get_data(as_text=True)))
+
+    def test_stable_while_children_change(self):
+        (_, first) = self.children("limit=3")
+        self.assertEqual(first["children"], ["a1", "a2", "b1"])
+        self.zk.delete("/q/a1")
+        self.zk.create("/q/a0")
+        (_, second) = self.children("limit=3&cursor=" + first["cursor"])
+        self.assertEqual(second["children"], ["b2", "b3", "c1"])
+
+    def test_include_stat(self):
+        (status, data) = self.children("prefix=c&include_stat=true")
+        self.assertEqual(status, 200)
+        self.assertEqual(data["children"][0]["name"], "c1")
+        self.assertEqual(data["children"][0]["znodeStat"]["dataLength"], 1)
+
+    def test_bad_sort(self):
+        resp = self.client.get("/wildlife/cluster01/q/children?sort=up")
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+from wildlife.tests.base import FakeSessionPool, load_config
+from wildlife.tests.fakes import FakeEnsemble
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def pool(self, **kwargs):
+        cluster = load_config({"cluster01": {}}).clusters["cluster01"]
+        pool = FakeSessionPool(FakeEnsemble(), cluster, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuse(self):
+        pool = self.pool()
+        client = pool.acquire("digest", "user1:password1")
+        pool.release(client)
+        self.assertIs(pool.acquire("digest", "user1:password1"), client)
+        self.assertEqual(pool.created, 1)
+
+    def test_cold_key_shares_one_handshake(self):
+        pool = self.pool(handshake=0.2)
+        clients = list()
+        start = threading.Event()
+
+        def acquire():
+            start.wait()
+            clients.append(pool.acquire("digest", "user1:password1"))
+
+        threads = [threading.Thread(target=acquire) for _ in range(10)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        start.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(clients), 10)
+        self.assertEqual(pool.created, 1)
+        self.assertEqual(len(set(map(id, clients))), 1)
+        for client in clients:
+            pool.release(client)
+        self.assertEqual(clients[0]._wildlife_session.in_use, 0)
+
+    def test_keys_handshake_concurrently(self):
+        pool = self.pool(handshake=0.2)
+        threads = [threading.Thread(target=pool.acquire,
+                                    args=("digest", "user%d:password" % i))
+                   for i in range(5)]
+        started = time.time()
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertLess(time.time() - started, 0.2 * 5)
+        self.assertEqual(pool.created, 5)
+
+    def test_evicted_session_stopped_on_release(self):
+        pool = self.pool(max_size=1)
+        first = pool.acquire("digest", "user1:password1")
+        second = pool.acquire("digest", "user2:password2")
+        self.assertEqual(len(pool), 1)
+        self.assertTrue(first.connected)
+        pool.release(first)
+        self.assertFalse(first.connected)
+        pool.release(second)
+        self.assertTrue(second.connected)
+
+    def test_expire(self):
+        pool = self.pool(idle_timeout=0.01)
+        client = pool.acquire("digest", "user1:password1")
+        pool.release(client)
+        time.sleep(0.02)
+        pool.expire()
+        self.assertEqual(len(pool), 0)
+        self.assertFalse(client.connected)
+
+    def test_closed(self):
+        pool = self.pool()
+        pool.close()
+        self.assertRaises(RuntimeError, pool.acquire, "digest",
+                          "user1:password1")
@@ -0,0 +1,209 @@
+import json
+from wildlife.tests.base import WildTestCase
+
+
+class RestBatchGetTest(WildTestCase):
+
+    def setUp(self):
+        super(RestBatchGetTest, self).setUp()
+        self.zk.create("/a", b"1")
+        self.zk.create("/bin", b"\xde\xad\xbe\xef")
+
+    def batch_get(self, body):
+        resp = self.client.post("/wildlife/cluster01/_batch_get",
+                                data=body,
+                                content_type="application/json")
+        return (resp.status_code, resp.get_data(as_text=True))
+
+    def test_batch_get(self):
+        (status, text) = self.batch_get(json.dumps(["/a", "/missing"]))
+        self.assertEqual(status, 200)
+        data = json.loads(text)
+        self.assertEqual(data["/a"]["data"], "1")
+        self.assertEqual(data["/missing"], {"error": "NoNodeError",
+                                            "status": 404})
+
+    def test_binary_znode(self):
+        (status, text) = self.batch_get(json.dumps(["/a", "/bin"]))
+        self.assertEqual(status, 200)
+        data = json.loads(text)
+        self.assertEqual(data["/a"]["data"], "1")
+        self.assertEqual(data["/bin"]["data"], "3q2+7w==")
+        self.assertEqual(data["/bin"]["encoding"], "base64")
+
+    def test_malformed_json(self):
+        self.assertEqual(self.batch_get("[\"/a\"")[0], 400)
+
+    def test_not_a_list_of_strings(self):
+        self.assertEqual(self.batch_get(json.dumps([1, 2]))[0], 400)
+        self.assertEqual(self.batch_get(json.dumps("/a"))[0], 400)
+        self.assertEqual(self.batch_get(json.dumps({"paths": [None]}))[0],
+                         400)
+
+
+class RestTxnTest(WildTestCase):
+
+    def post(self, path, body):
+        resp = self.client.post(path, data=json.dumps(body),
+                                content_type="application/json")
+        return (resp.status_code, resp.get_data(as_text=True))
+
+    def test_create(self):
+        (status, _) = self.post("/wildlife/cluster01", {"/a/b": "1"})
+        self.assertEqual(status, 200)
+        self.assertEqual(self.zk.get("/a/b")[0], b"1")
+
+    def test_create_transaction(self):
+        (status, text) = self.post("/wildlife/cluster01?transaction=true",
+                                   {"/a/b": "1", "/a/c": "2"})
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(text)["atomic"])
+        self.assertEqual(self.zk.get("/a/c")[0], b"2")
+
+    def test_txn(self):
+        self.zk.create("/a", b"1")
+        (status, text) = self.post("/wildlife/cluster01/_txn?chunk_size=1",
+                                   [{"op": "set", "path": "/a",
+                                     "data": "2", "version": 0},
+                                    {"op": "create", "path": "/b"}])
+        self.assertEqual(status, 200)
+        self.assertFalse(json.loads(text)["atomic"])
+        self.assertEqual(self.zk.get("/a")[0], b"2")
+        self.assertIsNotNone(self.zk.exists("/b"))
+
+    def test_chunk_size_below_one(self):
+        for chunk_size in (0, -1):
+            (status, _) = self.post(
+                "/wildlife/cluster01/_txn?chunk_size=%d" % chunk_size,
+                [{"op": "create", "path": "/b"}])
+            self.assertEqual(status, 400)
+            (status, _) = self.post(
+                "/wildlife/cluster01?transaction=true&chunk_size=%d" %
+                chunk_size, {"/a/b": "1"})
+            self.assertEqual(status, 400)
+        self.assertIsNone(self.zk.exists("/a"))
+        self.assertIsNone(self.zk.exists("/b"))
+
+
+class RestConditionalGetTest(WildTestCase):
+
+    def setUp(self):
+        super(RestConditionalGetTest, self).setUp()
+        self.zk.create("/a", b"1")
+        self.zk.create("/a/b", b"2")
+
+    def etag(self, path):
+        resp = self.client.get(path)
+        self.assertEqual(resp.status_code, 200)
+        return resp.headers["ETag"]
+
+    def test_not_modified(self):
+        for path in ("a", "a/data", "a/children", "a/acls"):
+            path = "/wildlife/cluster01/%s" % path
+            etag = self.etag(path)
+            resp = self.client.get(path, headers={"If-None-Match": etag})
+            self.assertEqual(resp.status_code, 304, path)
+            self.assertEqual(resp.get_data(), b"")
+            self.assertEqual(resp.headers["ETag"], etag)
+
+    def test_modified(self):
+        etag = self.etag("/wildlife/cluster01/a")
+        self.zk.set("/a", b"2")
+        resp = self.client.get("/wildlife/cluster01/a",
+                               headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+
+    def test_children_modified(self):
+        path = "/wildlife/cluster01/a/children"
+        etag = self.etag(path)
+        self.zk.create("/a/c")
+        resp = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+
+
+class RestConditionalWriteTest(WildTestCase):
+
+    def setUp(self):
+        super(RestConditionalWriteTest, self).setUp()
+        self.zk.create("/a", b"1")
+        self.zk.create("/a/b", b"2")
+
+    def etag(self, path):
+        resp = self.client.get(path)
+        self.assertEqual(resp.status_code, 200)
+        return resp.headers["ETag"]
+
+    def put(self, body, query="", **headers):
+        return self.client.put("/wildlife/cluster01/a%s" % query,
+                               data=body, content_type="text/plain",
+                               headers=headers)
+
+    def test_put_if_match(self):
+        etag = self.etag("/wildlife/cluster01/a")
+        self.assertEqual(self.put("x", **{"If-Match": etag}).status_code,
+                         201)
+        self.assertEqual(self.zk.get("/a")[0], b"x")
+        resp = self.put("y", **{"If-Match": etag})
+        self.assertEqual(resp.status_code, 412)
+        self.assertEqual(self.zk.get("/a")[0], b"x")
+
+    def test_put_version(self):
+        self.assertEqual(self.put("x", "?version=1").status_code, 409)
+        self.assertEqual(self.put("x", "?version=0").status_code, 201)
+        self.assertEqual(self.zk.get("/a")[0], b"x")
+
+    def test_delete_if_match(self):
+        etag = self.etag("/wildlife/cluster01/a/b")
+        self.zk.set("/a/b", b"3")
+        resp = self.client.delete("/wildlife/cluster01/a/b",
+                                  headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, 412)
+        etag = self.etag("/wildlife/cluster01/a/b")
+        resp = self.client.delete("/wildlife/cluster01/a/b",
+                                  headers={"If-Match": etag})
+        self.assertEqual(resp.status_code, 202)
+        self.assertIsNone(self.zk.exists("/a/b"))
+
+    def test_if_match_takes_one_etag(self):
+        resp = self.put("x", **{"If-Match": '"1-0", "2-0"'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class RestDataTest(WildTestCase):
+
+    def setUp(self):
+        super(RestDataTest, self).setUp()
+        self.zk.create("/bin", b"\xde\xad\xbe\xef")
+
+    def test_raw_bytes(self):
+        resp = self.client.get("/wildlife/cluster01/bin/data")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "application/octet-stream")
+        self.assertEqual(resp.get_data(), b"\xde\xad\xbe\xef")
+        self.assertEqual(resp.headers["ETag"],
+                         '"%d-0"' % self.zk.exists("/bin").mzxid)
+
+    def test_accept_text(self):
+        self.zk.create("/a", b"1")
+        resp = self.client.get("/wildlife/cluster01/a/data",
+                               headers={"Accept": "text/plain"})
+        self.assertEqual(resp.mimetype, "text/plain")
+        self.assertEqual(resp.get_data(), b"1")
+
+    def test_put_raw_bytes(self):
+        resp = self.client.put("/wildlife/cluster01/bin",
+                               data=b"\x00\xff",
+                               content_type="application/octet-stream")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(json.loads(resp.get_data(as_text=True))["data"],
+                         "AP8=")
+        self.assertEqual(self.client.get(
+            "/wildlife/cluster01/bin/data").get_data(), b"\x00\xff")
+
+    def test_binary_json(self):
+        resp = self.client.get("/wildlife/cluster01/bin")
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.get_data(as_text=True))
+        self.assertEqual((data["data"], data["encoding"]),
+                         ("3q2+7w==", "base64"))
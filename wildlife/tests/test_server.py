@@ -0,0 +1,75 @@
+import sys
+import threading
+import unittest
+from wildlife import server
+from wildlife.tests.base import wait_until
+
+
+class BoundedAppTest(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = list()
+
+    def app(self, environ, start_response):
+        self.started.append(environ["PATH_INFO"])
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        if environ["PATH_INFO"].endswith("/watch"):
+            self.release.wait(5)
+        return [b"ok"]
+
+    def call(self, app, path):
+        statuses = list()
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        body = app({"PATH_INFO": path}, start_response)
+        return (statuses[0], body)
+
+    def test_slot_held_until_the_response_is_closed(self):
+        app = server.BoundedApp(self.app, 1, 1)
+        (_, body) = self.call(app, "/wildlife/c/a")
+        t = threading.Thread(target=self.call, args=(app, "/wildlife/c/b"))
+        t.daemon = True
+        t.start()
+        t.join(0.2)
+        self.assertEqual(self.started, ["/wildlife/c/a"])
+        body.close()
+        t.join(5)
+        self.assertEqual(self.started, ["/wildlife/c/a", "/wildlife/c/b"])
+
+    def test_long_polls_have_their_own_budget(self):
+        app = server.BoundedApp(self.app, 1, 1)
+        t = threading.Thread(target=self.call,
+                             args=(app, "/wildlife/c/a/watch"))
+        t.daemon = True
+        t.start()
+        wait_until(lambda: self.started)
+        (status, body) = self.call(app, "/metrics")
+        self.assertEqual(status, "200 OK")
+        body.close()
+        (status, _) = self.call(app, "/wildlife/c/b/watch")
+        self.assertEqual(status, "503 Service Unavailable")
+        self.release.set()
+        t.join(5)
+
+
+class ServeTest(unittest.TestCase):
+
+    def test_unknown_server(self):
+        self.assertRaises(ValueError, server.serve, None, server="tornado")
+
+    @unittest.skipIf(sys.version_info < (3, 5), "the aio server requires "
+                                                "Python 3.5+")
+    def test_aio_without_aiohttp(self):
+        import wildlife
+
+        modules = dict(sys.modules)
+        self.addCleanup(sys.modules.update, modules)
+        if hasattr(wildlife, "aio"):
+            self.addCleanup(setattr, wildlife, "aio", wildlife.aio)
+            del wildlife.aio
+        # an import of a module set to None raises ImportError
+        sys.modules["wildlife.aio"] = None
+        self.assertRaises(RuntimeError, server.serve, None, server="aio")
@@ -0,0 +1,62 @@
+import unittest
+from kazoo.security import make_digest_acl, OPEN_ACL_UNSAFE
+from wildlife import sync
+from wildlife.tests.fakes import FakeEnsemble
+
+
+class TreeDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.source = FakeEnsemble().client()
+        self.target = FakeEnsemble().client()
+        self.addCleanup(self.source.stop)
+        self.addCleanup(self.target.stop)
+        self.acl = [make_digest_acl("user1", "password1", all=True)]
+
+    def diff(self, root="/a"):
+        return sync.TreeDiff(self.source, self.target, root).run()
+
+    def test_summary(self):
+        self.source.create("/a/b", b"1", makepath=True)
+        self.source.create("/a/c", b"2")
+        self.target.create("/a/b", b"x", makepath=True)
+        self.target.create("/a/d", b"3")
+        data = self.diff().summary()
+        self.assertEqual(data["created"], ["/a/c"])
+        self.assertEqual(data["updated"], ["/a/b"])
+        self.assertEqual(data["deleted"], ["/a/d"])
+
+    def test_apply_copies_the_source_acls(self):
+        self.source.create("/a", b"1", acl=self.acl)
+        self.source.create("/a/b", b"2")
+        self.target.create("/a")
+        self.target.set_acls("/a", self.acl)
+        self.source.create("/a/c", b"3", acl=self.acl)
+        self.diff().apply()
+        self.assertEqual(self.target.get_acls("/a/c")[0], self.acl)
+        self.assertEqual(self.target.get_acls("/a/b")[0], OPEN_ACL_UNSAFE)
+        self.assertEqual(self.target.get("/a/c")[0], b"3")
+
+    def test_apply_with_an_acl(self):
+        self.source.create("/a/b", b"1", makepath=True)
+        self.target.create("/a")
+        self.diff().apply(acl=self.acl)
+        self.assertEqual(self.target.get_acls("/a/b")[0], self.acl)
+
+    def test_apply_creates_the_missing_parents(self):
+        self.source.create("/x/y", makepath=True)
+        self.source.set_acls("/x", self.acl)
+        self.source.create("/x/y/a/b", b"1", makepath=True)
+        results = self.diff("/x/y/a").apply()
+        self.assertFalse([result for (_, _, result) in results
+                          if isinstance(result, Exception)])
+        self.assertEqual(self.target.get("/x/y/a/b")[0], b"1")
+        self.assertEqual(self.target.get_acls("/x")[0], self.acl)
+
+    def test_ephemeral_znodes_are_skipped(self):
+        owner = self.source.ensemble.client()
+        self.addCleanup(owner.stop)
+        self.source.create("/a", b"1")
+        owner.create("/a/e", ephemeral=True)
+        self.target.create("/a", b"1")
+        self.assertEqual(self.diff().summary()["created"], [])
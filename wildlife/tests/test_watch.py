@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+import unittest
+from wildlife.tests.base import WildTestCase, wait_until
+from wildlife.tests.fakes import FakeEnsemble
+from wildlife.watch import EventHub, WatchHub, Subscriber
+
+
+class WatchHubTest(unittest.TestCase):
+
+    def setUp(self):
+        ensemble = FakeEnsemble()
+        self.zk = ensemble.client()
+        self.zk.create("/a", b"1")
+        self.client = ensemble.client()
+        self.hub = WatchHub(self.client)
+
+    def waiters(self, path):
+        watched = self.hub._paths.get(path)
+        return watched.waiters if watched is not None else 0
+
+    def start_waiters(self, count, path, since_mzxid, timeout=5):
+        results = list()
+
+        def waiter():
+            results.append(self.hub.wait(path, since_mzxid, timeout))
+
+        threads = [threading.Thread(target=waiter) for _ in range(count)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        wait_until(lambda: self.waiters("/a") == count)
+        return (threads, results)
+
+    def test_change_wakes_waiter_of_relative_path(self):
+        mzxid = self.zk.exists("/a").mzxid
+        started = time.time()
+        (threads, results) = self.start_waiters(1, "a", mzxid)
+        self.zk.set("/a", b"2")
+        threads[0].join(5)
+        self.assertEqual(results, [True])
+        self.assertLess(time.time() - started, 2)
+        self.assertEqual(self.hub._paths, {})
+
+    def test_one_read_per_event(self):
+        mzxid = self.zk.exists("/a").mzxid
+        (threads, results) = self.start_waiters(5, "/a", mzxid)
+        wait_until(lambda: self.hub._paths["/a"].checked == 0)
+        self.assertEqual(self.client.calls["exists"], 1)
+        self.zk.set("/a", b"2")
+        for t in threads:
+            t.join(5)
+        self.assertEqual(results, [True] * 5)
+        self.assertEqual(self.client.calls["exists"], 2)
+
+    def test_changed_before_wait(self):
+        mzxid = self.zk.exists("/a").mzxid
+        self.zk.set("/a", b"2")
+        self.assertTrue(self.hub.wait("a", mzxid, 5))
+
+    def test_deleted(self):
+        mzxid = self.zk.exists("/a").mzxid
+        (threads, results) = self.start_waiters(1, "a", mzxid)
+        self.zk.delete("/a")
+        threads[0].join(5)
+        self.assertEqual(results, [True])
+
+    def test_timeout(self):
+        mzxid = self.zk.exists("/a").mzxid
+        self.assertFalse(self.hub.wait("a", mzxid, 0.1))
+        self.assertEqual(self.hub._paths, {})
+
+    def test_reset_reads_again(self):
+        mzxid = self.zk.exists("/a").mzxid
+        (threads, results) = self.start_waiters(2, "a", mzxid)
+        wait_until(lambda: self.hub._paths["/a"].checked == 0)
+        self.hub.reset()
+        wait_until(lambda: self.client.calls["exists"] == 2)
+        self.zk.set("/a", b"2")
+        for t in threads:
+            t.join(5)
+        self.assertEqual(results, [True] * 2)
+
+
+class SubscriberTest(unittest.TestCase):
+
+    def test_buffer_below_one(self):
+        self.assertRaises(ValueError, Subscriber, "/", 0)
+
+    def test_drop_on_overflow(self):
+        subscriber = Subscriber("/", 1)
+        subscriber.put("a")
+        subscriber.put("b")
+        self.assertEqual(subscriber.dropped, 1)
+        self.assertFalse(subscriber.closed)
+
+    def test_disconnect_on_overflow(self):
+        subscriber = Subscriber("/", 1, overflow="disconnect")
+        subscriber.put("a")
+        subscriber.put("b")
+        self.assertTrue(subscriber.closed)
+        self.assertEqual(subscriber.reason, "overflow")
+
+
+class RestWatchTest(WildTestCase):
+
+    def test_change_answers_before_timeout(self):
+        self.zk.create("/a", b"1")
+        stat = self.zk.exists("/a")
+        responses = list()
+
+        def poll():
+            responses.append(self.client.get(
+                "/wildlife/cluster01/a/watch?since_mzxid=%d&timeout=10" %
+                stat.mzxid))
+
+        started = time.time()
+        t = threading.Thread(target=poll)
+        t.daemon = True
+        t.start()
+        watches = self.manager().watches
+        wait_until(lambda: "/a" in watches._paths)
+        self.zk.set("/a", b"2")
+        t.join(5)
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(responses[0].status_code, 200)
+        data = json.loads(responses[0].get_data(as_text=True))
+        self.assertEqual(data["data"], "2")
+
+    def test_timeout(self):
+        self.zk.create("/a", b"1")
+        stat = self.zk.exists("/a")
+        resp = self.client.get("/wildlife/cluster01/a/watch?since_mzxid=%d"
+                               "&timeout=0.1" % stat.mzxid)
+        self.assertEqual(resp.status_code, 304)
+
+
+class EventHubTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zk = FakeEnsemble().client()
+        self.addCleanup(self.zk.stop)
+        self.zk.create("/a", b"1")
+        self.hub = EventHub(self.zk)
+        self.addCleanup(self.hub.close)
+
+    def subscribe(self, root="/a"):
+        subscriber = self.hub.subscribe(root, 10)
+        wait_until(lambda: self.hub._roots[root]["initialized"])
+        return subscriber
+
+    def events(self, subscriber, count):
+        return [subscriber.queue.get(timeout=5) for _ in range(count)]
+
+    def test_subtree_events(self):
+        subscriber = self.subscribe()
+        self.assertTrue(subscriber.queue.empty())
+        self.zk.create("/a/b", b"x")
+        (name, data) = self.events(subscriber, 1)[0]
+        self.assertEqual((name, data["path"]), ("child-added", "/a/b"))
+        self.zk.set("/a/b", b"y")
+        (name, data) = self.events(subscriber, 1)[0]
+        self.assertEqual((name, data["path"]), ("data-changed", "/a/b"))
+        self.zk.delete("/a/b")
+        (name, data) = self.events(subscriber, 1)[0]
+        self.assertEqual((name, data["path"]), ("child-removed", "/a/b"))
+
+    def test_subscribers_share_a_tree(self):
+        first = self.subscribe()
+        second = self.subscribe()
+        self.assertEqual(len(self.hub._roots), 1)
+        self.zk.set("/a", b"2")
+        self.assertEqual(self.events(first, 1)[0][0], "data-changed")
+        self.assertEqual(self.events(second, 1)[0][0], "data-changed")
+        self.hub.unsubscribe(first)
+        self.assertEqual(len(self.hub._roots), 1)
+        self.hub.unsubscribe(second)
+        self.assertEqual(len(self.hub._roots), 0)
+
+    def test_close(self):
+        subscriber = self.subscribe()
+        self.hub.close()
+        self.assertTrue(subscriber.closed)
+        self.assertEqual(subscriber.reason, "shutdown")
+
+
+class RestEventsTest(WildTestCase):
+
+    def setUp(self):
+        super(RestEventsTest, self).setUp()
+        self.zk.create("/a", b"1")
+
+    def test_stream(self):
+        events = self.manager().events
+
+        def change():
+            wait_until(lambda: "/a" in events._roots and
+                       events._roots["/a"]["initialized"])
+            self.zk.create("/a/b", b"x")
+
+        t = threading.Thread(target=change)
+        t.daemon = True
+        t.start()
+        resp = self.client.get("/wildlife/cluster01/a/events",
+                               buffered=False)
+        self.addCleanup(resp.close)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "text/event-stream")
+        chunk = next(iter(resp.response))
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode("utf-8")
+        self.assertTrue(chunk.startswith("event: child-added\n"))
+        self.assertEqual(json.loads(chunk.split("data: ", 1)[1])["path"],
+                         "/a/b")
+
+    def test_bad_arguments(self):
+        for query in ("overflow=block", "buffer=0"):
+            resp = self.client.get("/wildlife/cluster01/a/events?" + query)
+            self.assertEqual(resp.status_code, 400, query)
+
+    def test_missing_znode(self):
+        resp = self.client.get("/wildlife/cluster01/missing/events")
+        self.assertEqual(resp.status_code, 404)
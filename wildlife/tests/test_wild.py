@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import yaml
+from wildlife import WildLife
+from wildlife import wild
+from wildlife.tests.base import FakeClusterManager, load_config, wait_until
+from wildlife.tests.fakes import FakeEnsemble
+
+
+def config_content(clusters, **options):
+    content = dict(options)
+    content["wildlife"] = sorted(clusters)
+    content["clusters"] = [dict(opts, name=name, hosts="127.0.0.1:2181")
+                           for (name, opts) in sorted(clusters.items())]
+    return yaml.safe_dump(content)
+
+
+class ConfigFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "wildlife.yml")
+        self.wild = WildLife(self.path)
+        self.reconfigured = list()
+        self.wild.reconfigureManagers = self.reconfigured.append
+
+    def write(self, content, mtime=None):
+        with open(self.path, "w") as fp:
+            fp.write(content)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_changed_content(self):
+        self.write(config_content({"cluster01": {}}), mtime=1000)
+        self.assertIsNotNone(self.wild._configChanged())
+        self.write(config_content({"cluster02": {}}), mtime=2000)
+        self.assertIn("cluster02", self.wild._configChanged())
+
+    def test_unchanged_stat_skips_reading(self):
+        self.write(config_content({"cluster01": {}}), mtime=1000)
+        self.wild._configChanged()
+        # the same mtime, size and inode: the file is not read again
+        self.write(config_content({"cluster02": {}}), mtime=1000)
+        self.assertIsNone(self.wild._configChanged())
+
+    def test_touched_file_with_same_content(self):
+        self.write(config_content({"cluster01": {}}), mtime=1000)
+        self.wild._configChanged()
+        os.utime(self.path, (2000, 2000))
+        self.assertIsNone(self.wild._configChanged())
+
+    def test_update_config(self):
+        self.write(config_content({"cluster01": {}}, watermark_sleep=3),
+                   mtime=1000)
+        self.wild.updateConfig()
+        self.assertEqual(len(self.reconfigured), 1)
+        self.assertEqual(self.wild.config.watermark_sleep, 3)
+        self.assertEqual(sorted(self.wild.config.clusters), ["cluster01"])
+        self.wild.updateConfig()
+        self.assertEqual(len(self.reconfigured), 1)
+        self.wild.updateConfig(force=True)
+        self.assertEqual(len(self.reconfigured), 2)
+
+    def test_reload_wakes_the_loop(self):
+        self.wild.reload()
+        self.assertTrue(self.wild._reload.is_set())
+        self.assertTrue(self.wild._force)
+
+
+class _Manager(object):
+
+    def __init__(self, cluster, stop_delay=0):
+        self.cluster = cluster
+        self.name = cluster.name
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.stop_delay = stop_delay
+
+    def stop(self):
+        time.sleep(self.stop_delay)
+        self.stopped.set()
+
+
+class ReconfigureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ensembles = dict()
+        self.addCleanup(setattr, wild, "ClusterManager", wild.ClusterManager)
+        wild.ClusterManager = self.manager
+        self.wild = WildLife(None)
+        self.addCleanup(self.wild.stop)
+
+    def manager(self, cluster):
+        manager = FakeClusterManager(
+            cluster, self.ensembles.setdefault(cluster.name, FakeEnsemble()))
+        manager.daemon = True
+        return manager
+
+    def configure(self, clusters):
+        config = load_config(clusters)
+        self.wild.reconfigureManagers(config)
+        self.wild.setConfig(config)
+        return config.managers
+
+    def test_only_the_changed_clusters_restart(self):
+        old = self.configure({"cluster01": {}, "cluster02": {},
+                              "cluster03": {}})
+        self.assertEqual(self.wild.waitReady(5), [])
+        new = self.configure({"cluster01": {},
+                              "cluster02": {"cache_max_bytes": 1024}})
+        self.assertIs(new["cluster01"], old["cluster01"])
+        self.assertIsNot(new["cluster02"], old["cluster02"])
+        self.assertNotIn("cluster03", new)
+        for name in ("cluster02", "cluster03"):
+            old[name].join(5)
+            self.assertFalse(old[name].is_alive())
+        self.assertTrue(new["cluster01"].is_alive())
+        self.assertEqual(self.wild.waitReady(5), [])
+
+    def test_slow_stop_does_not_block(self):
+        config = load_config({"cluster01": {}})
+        config.managers["cluster01"] = _Manager(
+            config.clusters["cluster01"], stop_delay=1)
+        self.wild.setConfig(config)
+        stopping = config.managers["cluster01"]
+        started = time.time()
+        self.configure({"cluster01": {"cache_max_bytes": 1024}})
+        self.assertLess(time.time() - started, 1)
+        wait_until(stopping.stopped.is_set)
+
+    def test_wait_ready_shares_the_timeout(self):
+        config = load_config({"cluster01": {}, "cluster02": {}})
+        config.managers = dict((name, _Manager(cluster))
+                               for (name, cluster) in config.clusters.items())
+        config.managers["cluster01"].ready.set()
+        self.wild.setConfig(config)
+        started = time.time()
+        self.assertEqual(self.wild.waitReady(0.2), ["cluster02"])
+        self.assertLess(time.time() - started, 0.4)
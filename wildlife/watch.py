@@ -0,0 +1,237 @@
+import threading
+import time
+import functools
+import logging
+from six.moves import queue
+from wildlife import wildutils
+
+
+class _WatchedPath(object):
+
+    def __init__(self, lock):
+        self.cond = threading.Condition(lock)
+        # bumped by every watch event of the znode
+        self.generation = 0
+        self.waiters = 0
+        # the znodeStat read as of checked == generation
+        self.stat = None
+        self.checked = -1
+        self.reading = False
+
+
+class WatchHub(object):
+    """Share one ZooKeeper watch per znode among all the requests waiting
+    for the znode to change
+
+    One waiter reads the znode with an exists watch, the others share its
+    znodeStat; the watch event then wakes up every waiter of the znode at
+    once, and again only one of them reads the znode after each event.
+
+    :param client: the KazooClient registering the watches
+    """
+
+    log = logging.getLogger("wildlife.WatchHub")
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._paths = dict()
+
+    def wait(self, path, since_mzxid, timeout):
+        """wait until the znode on path has been modified after the zxid
+        since_mzxid, created or deleted
+
+        :returns: True if the znode has changed, False on timeout
+        """
+
+        # the watch events spell the absolute path
+        path = wildutils.znode_path(path)
+        deadline = time.time() + timeout
+        with self._lock:
+            watched = self._paths.get(path)
+            if watched is None:
+                watched = self._paths[path] = _WatchedPath(self._lock)
+            watched.waiters += 1
+        try:
+            while True:
+                with self._lock:
+                    while True:
+                        generation = watched.generation
+                        if watched.checked == generation:
+                            stat = watched.stat
+                            if stat is None:
+                                # deleted since the client has read it
+                                if since_mzxid > 0:
+                                    return True
+                            elif stat.mzxid > since_mzxid:
+                                return True
+                        elif not watched.reading:
+                            watched.reading = True
+                            break
+                        # until the next event or the read of another
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            return False
+                        watched.cond.wait(remaining)
+                stat = None
+                try:
+                    # KazooClient keeps one watch per (path, callback)
+                    stat = self.client.exists(path, watch=self._watcher)
+                finally:
+                    with self._lock:
+                        watched.reading = False
+                        # an event fired meanwhile makes the stat stale
+                        if watched.generation == generation:
+                            watched.stat = stat
+                            watched.checked = generation
+                        watched.cond.notify_all()
+        finally:
+            with self._lock:
+                watched.waiters -= 1
+                if watched.waiters <= 0:
+                    self._paths.pop(path, None)
+
+    def _watcher(self, event):
+        self.log.debug("Wake up the waiters of %s on %s "
+                       "event" % (event.path, event.type))
+        with self._lock:
+            watched = self._paths.get(event.path)
+            if watched is None:
+                return
+            watched.generation += 1
+            watched.cond.notify_all()
+
+    def reset(self):
+        """Wake up all the waiters to check their znodes again, e.g. when
+        the watches have been lost with the session
+        """
+
+        with self._lock:
+            for watched in self._paths.values():
+                watched.generation += 1
+                watched.cond.notify_all()
+
+
+class Subscriber(object):
+    """A subscriber of the events of a subtree with a bounded buffer
+
+    :param overflow: "drop" to drop the events once the buffer is full and
+        report how many were dropped, or "disconnect" to close the stream
+    """
+
+    def __init__(self, root, buffer_size, overflow="drop"):
+        if buffer_size < 1:
+            # a Queue of size 0 is unbounded
+            raise ValueError("The buffer must hold at least 1 event")
+        self.root = root
+        self.queue = queue.Queue(buffer_size)
+        self.overflow = overflow
+        self.dropped = 0
+        self.closed = False
+        self.reason = None
+
+    def put(self, event):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            if self.overflow == "disconnect":
+                self.close("overflow")
+            else:
+                self.dropped += 1
+
+    def close(self, reason):
+        self.reason = reason
+        self.closed = True
+
+
+class EventHub(object):
+    """Share one TreeCache per subscribed root among all the subscribers
+    of its subtree events
+
+    Events are only published once the TreeCache has loaded the subtree,
+    so that subscribers do not receive an event per existing znode.
+
+    :param client: the KazooClient of the TreeCaches
+    """
+
+    log = logging.getLogger("wildlife.EventHub")
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._roots = dict()
+
+    def subscribe(self, root, buffer_size, overflow="drop"):
+        from kazoo.recipe.cache import TreeCache
+
+        subscriber = Subscriber(root, buffer_size, overflow)
+        with self._lock:
+            entry = self._roots.get(root)
+            if entry is None:
+                tree = TreeCache(self.client, root)
+                entry = self._roots[root] = {"tree": tree,
+                                             "initialized": False,
+                                             "subscribers": set()}
+                tree.listen(functools.partial(self._listener, root))
+                tree.start()
+            entry["subscribers"].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        tree = None
+        with self._lock:
+            entry = self._roots.get(subscriber.root)
+            if entry is None:
+                return
+            entry["subscribers"].discard(subscriber)
+            if not entry["subscribers"]:
+                self._roots.pop(subscriber.root)
+                tree = entry["tree"]
+        if tree is not None:
+            tree.close()
+
+    def close(self):
+        with self._lock:
+            entries = list(self._roots.values())
+            self._roots.clear()
+        for entry in entries:
+            for subscriber in entry["subscribers"]:
+                subscriber.close("shutdown")
+            entry["tree"].close()
+
+    def _listener(self, root, event):
+        from kazoo.recipe.cache import TreeEvent
+
+        with self._lock:
+            entry = self._roots.get(root)
+            if entry is None:
+                return
+            if event.event_type == TreeEvent.INITIALIZED:
+                entry["initialized"] = True
+                return
+            if not entry["initialized"]:
+                return
+            subscribers = list(entry["subscribers"])
+        node = event.event_data
+        path = getattr(node, "path", None)
+        if event.event_type == TreeEvent.NODE_ADDED:
+            name = "created" if path == root else "child-added"
+        elif event.event_type == TreeEvent.NODE_UPDATED:
+            name = "data-changed"
+        elif event.event_type == TreeEvent.NODE_REMOVED:
+            name = "deleted" if path == root else "child-removed"
+        elif event.event_type == TreeEvent.CONNECTION_SUSPENDED:
+            name = "connection-suspended"
+        elif event.event_type == TreeEvent.CONNECTION_RECONNECTED:
+            name = "connection-reconnected"
+        elif event.event_type == TreeEvent.CONNECTION_LOST:
+            name = "connection-lost"
+        else:
+            return
+        data = {"path": path}
+        if getattr(node, "stat", None) is not None:
+            data["znodeStat"] = wildutils.convert_zstat(node.stat)
+        for subscriber in subscribers:
+            subscriber.put((name, data))
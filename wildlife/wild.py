@@ -1,7 +1,8 @@
 import logging
-import exceptions
 import yaml
 import threading
+import hashlib
+import os
 import time
 from wildlife.wildutils import Config, Cluster
 from wildlife.manager import ClusterManager
@@ -16,38 +17,128 @@ class WildLife(threading.Thread):
 
     log = logging.getLogger("wildlife.WildLife")
 
+    # Seconds between two checks of the file until a config is loaded
+    watermark_sleep = 10
+
     def __init__(self, conf_path):
         threading.Thread.__init__(self, name='WildLife')
         self.path = conf_path
         self._stopped = False
         self.config = None
+        self._reload = threading.Event()
+        self._force = False
+        self._stat = None
+        self._digest = None
+        self._notifier = None
 
     def stop(self):
         self._stopped = True
+        self._reload.set()
+        if self._notifier is not None:
+            self._notifier.stop()
+        if self.config is None:
+            return
         for manager in self.config.managers.values():
             manager.stop()
 
+    def reload(self):
+        """Reload the configuration file even if it seems unchanged,
+        e.g. on SIGHUP
+        """
+
+        self.log.info("Reload the config on request")
+        self._force = True
+        self._reload.set()
+
     def run(self):
+        self._watchConfig()
         while not self._stopped:
+            # woken up by inotify or reload(), otherwise poll the mtime
+            self._reload.wait(self.config.watermark_sleep
+                              if self.config is not None
+                              else self.watermark_sleep)
+            self._reload.clear()
+            if self._stopped:
+                break
             try:
-                self.updateConfig()
-                time.sleep(self.config.watermark_sleep)
+                force = self._force
+                self._force = False
+                self.updateConfig(force=force)
             except Exception:
                 self.log.exception("Exception in WildLife Loop")
 
-    def loadConfig(self):
+    def _watchConfig(self):
+        try:
+            import pyinotify
+        except ImportError:
+            self.log.debug("pyinotify is not available, polling the mtime "
+                           "of %s instead" % self.path)
+            return
+
+        conf_name = os.path.basename(self.path)
+        reload_event = self._reload
+
+        class ConfigHandler(pyinotify.ProcessEvent):
+            def process_default(self, event):
+                if event.name == conf_name:
+                    reload_event.set()
+
+        wm = pyinotify.WatchManager()
+        # editors and config management usually replace the file
+        wm.add_watch(os.path.dirname(os.path.abspath(self.path)),
+                     pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO |
+                     pyinotify.IN_CREATE | pyinotify.IN_DELETE)
+        self._notifier = pyinotify.ThreadedNotifier(wm, ConfigHandler())
+        self._notifier.daemon = True
+        self._notifier.start()
+
+    def _configChanged(self):
+        """Check the mtime and size of the configuration file first and
+        only compare the content digest if they have changed
+
+        :returns: the content of the file if it has changed, else None
+        """
+
+        st = os.stat(self.path)
+        stat = (st.st_mtime, st.st_size, st.st_ino)
+        if stat == self._stat:
+            return None
+        with open(self.path) as fp:
+            content = fp.read()
+        digest = hashlib.sha1(content.encode("utf-8")
+                              if not isinstance(content, bytes)
+                              else content).hexdigest()
+        self._stat = stat
+        if digest == self._digest:
+            return None
+        self._digest = digest
+        return content
+
+    def loadConfig(self, content=None):
         self.log.debug("Loading configuration from %s", self.path)
         newconfig = Config()
 
-        with open(self.path) as fp:
-            config = yaml.load(fp)
+        if content is None:
+            with open(self.path) as fp:
+                content = fp.read()
+        config = yaml.safe_load(content)
 
         if "wildlife" not in config:
-            raise exceptions.KeyError("No key named 'wildlife' "
-                                      "in %s" % self.path)
+            raise KeyError("No key named 'wildlife' "
+                           "in %s" % self.path)
 
         # Interval between checking if new clusters added
-        newconfig.watermark_sleep = config.get("watermark_sleep", 10)
+        newconfig.watermark_sleep = config.get("watermark_sleep",
+                                               self.watermark_sleep)
+
+        # Seconds to wait for the clusters to connect before serving
+        newconfig.startup_timeout = float(config.get("startup_timeout", 0))
+
+        # Options of the WSGI server, see wildlife.server.serve
+        newconfig.server = config.get("server") or dict()
+
+        # Options of the response compression, see wildlife.compress
+        newconfig.compression = config.get("compression") or dict()
 
         _wildlife = config["wildlife"]
         if isinstance(_wildlife, six.string_types):
@@ -58,8 +149,8 @@ class WildLife(threading.Thread):
         newconfig.managers = dict()
 
         if "clusters" not in config:
-            raise exceptions.KeyError("No key named 'clusters' "
-                                      "in %s" % self.path)
+            raise KeyError("No key named 'clusters' "
+                           "in %s" % self.path)
         _clusters = config["clusters"]
 
         if isinstance(_clusters, dict):
@@ -82,7 +173,7 @@ class WildLife(threading.Thread):
         if missing_cluters:
             err_msg = "Missing Cluster Information for %s" % missing_cluters
             self.log.error(err_msg)
-            raise exceptions.AttributeError(err_msg)
+            raise AttributeError(err_msg)
 
         return newconfig
 
@@ -93,15 +184,34 @@ class WildLife(threading.Thread):
         c.name = cluster["name"]
         c.hosts = cluster.get("hosts")
         if c.hosts is None:
-            raise exceptions.AttributeError("Invalid hosts for %s" % c.name)
+            raise AttributeError("Invalid hosts for %s" % c.name)
         c.timeout = float(cluster.get("timeout", 10.0))
         c.auth_data = eval(cluster.get("auth_data", "set([])"))
         c.randomize_hosts = cluster.get("randomize_hosts", True)
+        # Pool of authenticated sessions for requests carrying ACLs
+        c.session_pool_size = int(cluster.get("session_pool_size", 32))
+        c.session_idle_timeout = float(cluster.get("session_idle_timeout",
+                                                   300.0))
+        # Bytes of znode data cached in memory, 0 to disable the cache
+        c.cache_max_bytes = int(cluster.get("cache_max_bytes", 0))
+        c.children_cache_max_bytes = int(cluster.get(
+            "children_cache_max_bytes", 0))
+        # Names of the sorted snapshots paged through, 0 to disable them
+        c.snapshot_max_children = int(cluster.get("snapshot_max_children",
+                                                  1048576))
+        # Token buckets and in-flight cap, see wildlife.limits
+        c.rate_limits = cluster.get("rate_limits") or dict()
         return c
 
-    def updateConfig(self):
+    def updateConfig(self, force=False):
+        content = self._configChanged()
+        if content is None:
+            if not force and self.config is not None:
+                return
+            with open(self.path) as fp:
+                content = fp.read()
         self.log.info("Update the config")
-        config = self.loadConfig()
+        config = self.loadConfig(content)
         self.reconfigureManagers(config)
         self.setConfig(config)
 
@@ -130,8 +240,37 @@ class WildLife(threading.Thread):
                 config.managers[manager.name] = ClusterManager(manager)
                 config.managers[manager.name].start()
 
-        for oldmanager in stop_managers:
-            oldmanager.stop()
+        if self.config:
+            for (name, oldmanager) in self.config.managers.items():
+                if name not in config.clusters:
+                    self.log.debug("%s has been removed. Will stop its "
+                                   "ClusterManager." % name)
+                    stop_managers.append(oldmanager)
+
+        self._stopManagers(stop_managers)
+
+    def _stopManagers(self, managers):
+        # stopping a KazooClient blocks until its connection is closed,
+        # do not stall the reconfiguration of the other clusters
+        for manager in managers:
+            t = threading.Thread(target=manager.stop,
+                                 name="Stop-%s" % manager.name)
+            t.daemon = True
+            t.start()
+
+    def waitReady(self, timeout):
+        """Wait until all the clusters are connected, at most timeout
+        seconds in total since they are connecting concurrently
+
+        :returns: the names of the clusters still connecting
+        """
+
+        deadline = time.time() + timeout
+        for manager in self.config.managers.values():
+            manager.ready.wait(max(0, deadline - time.time()))
+        return sorted(name for (name, manager)
+                      in self.config.managers.items()
+                      if not manager.ready.is_set())
 
     def _managersEquiv(self, new_manager, old_manager):
         # Check if cluster details have changed
@@ -140,7 +279,19 @@ class WildLife(threading.Thread):
                 or new_manager.name != old_manager.cluster.name
                 or new_manager.hosts != old_manager.cluster.hosts
                 or new_manager.timeout != old_manager.cluster.timeout
-                or new_manager.auth_data != old_manager.cluster.auth_data):
+                or new_manager.auth_data != old_manager.cluster.auth_data
+                or (new_manager.session_pool_size !=
+                    old_manager.cluster.session_pool_size)
+                or (new_manager.session_idle_timeout !=
+                    old_manager.cluster.session_idle_timeout)
+                or (new_manager.cache_max_bytes !=
+                    old_manager.cluster.cache_max_bytes)
+                or (new_manager.children_cache_max_bytes !=
+                    old_manager.cluster.children_cache_max_bytes)
+                or (new_manager.snapshot_max_children !=
+                    old_manager.cluster.snapshot_max_children)
+                or (new_manager.rate_limits !=
+                    old_manager.cluster.rate_limits)):
             return False
         return True
 
@@ -1,5 +1,12 @@
+import base64
+import bisect
 import six
-from kazoo.security import make_acl
+from kazoo import exceptions as kz_exceptions
+from kazoo.security import make_acl, make_digest_acl_credential
+
+
+# Arguments asking for a paged json listing of the children of a znode
+CHILDREN_ARGS = ("limit", "cursor", "prefix", "sort", "include_stat")
 
 
 class ConfigValue(object):
@@ -61,6 +68,29 @@ class ACLConfig(ConfigValue):
             return None
 
 
+def caller_identity(headers, address, sessions=None):
+    """the identity of the acl headers of a request, or else the address
+    of the client
+
+    The headers are only trusted once a session of the SessionPool
+    sessions has been authenticated with their credential. A digest
+    credential is identified as ZooKeeper does, by the user along with
+    the hash of its password, so that naming another user does not spend
+    the budget of that user.
+    """
+
+    acl_config = ACLConfig(headers)
+    if not (acl_config.check_acl() and sessions is not None and
+            sessions.authenticated(acl_config.scheme,
+                                   acl_config.credential)):
+        return address
+    if acl_config.scheme == "digest":
+        (user, _, password) = acl_config.credential.replace(
+            ",", ":").partition(":")
+        return "digest:%s" % make_digest_acl_credential(user, password)
+    return "%s:%s" % (acl_config.scheme, acl_config.credential)
+
+
 def get_bool(v):
     if isinstance(v, bool):
         return v
@@ -68,6 +98,171 @@ def get_bool(v):
         return v.lower() in ("yes", "true", "t", "1")
 
 
+def znode_error(excp, cluster_name=None, znode=None):
+    """map an exception raised on interacting with a cluster to the
+    (message, status) of the HTTP response
+    """
+
+    if isinstance(excp, (kz_exceptions.ConnectionClosedError,
+                         kz_exceptions.ConnectionDropped,
+                         kz_exceptions.ConnectionLoss,
+                         kz_exceptions.ConnectionLossException)):
+        return ("Connection Exception When Interacts "
+                "with Cluster [%s].\n" % cluster_name,
+                408)
+    elif isinstance(excp, kz_exceptions.NoNodeException):
+        return ("Cannot Find Znode [%s] in Cluster "
+                "[%s].\n" % (znode, cluster_name),
+                404)
+    elif isinstance(excp, kz_exceptions.InvalidACLException):
+        return ("Invalid ACLs on Accessing Znode [%s] in "
+                "Cluster [%s].\n" % (znode, cluster_name),
+                401)
+    elif isinstance(excp, kz_exceptions.NoAuthException):
+        return ("Please Provide ACLs to Access Znode [%s] in "
+                "Cluster [%s].\n" % (znode, cluster_name),
+                401)
+    elif isinstance(excp, kz_exceptions.BadVersionError):
+        return ("Znode [%s] in Cluster [%s] Has Been Modified, its "
+                "Version Does Not Match.\n" % (znode, cluster_name),
+                409)
+    elif isinstance(excp, kz_exceptions.ZookeeperError):
+        return ("ZooKeeper Server Error on Interacting with "
+                "Cluster [%s].\n" % cluster_name,
+                406)
+    elif isinstance(excp, ValueError):
+        return ("Bad Request: %s.\n" % excp,
+                400)
+    return ("Unable to Handle this Request with "
+            "exception: %s.\n" % excp,
+            500)
+
+
+def expected_version(version=None, if_match=None):
+    """the znode version a write is conditioned on, from a ``version``
+    argument or the ETag of an ``If-Match`` header, or -1 for any version
+    """
+
+    if version is not None:
+        return int(version)
+    if not if_match:
+        return -1
+    tags = [tag.strip() for tag in if_match.split(",")]
+    if tags == ["*"]:
+        return -1
+    if len(tags) != 1 or tags[0].startswith("W/"):
+        raise ValueError("If-Match takes exactly one strong ETag")
+    # the ETag of the znode data is "[mzxid]-[version]"
+    return int(tags[0].strip('"').rsplit("-", 1)[-1])
+
+
+def prefix_range(names, prefix):
+    """the (start, end) indexes of the sorted names starting with prefix
+    """
+
+    start = bisect.bisect_left(names, prefix)
+    (low, high) = (start, len(names))
+    while low < high:
+        middle = (low + high) // 2
+        if names[middle].startswith(prefix):
+            low = middle + 1
+        else:
+            high = middle
+    return (start, low)
+
+
+def page_children(names, znodestat, args):
+    """the page of the sorted children names of a znode selected by the
+    ``limit``, ``cursor``, ``prefix`` and ``sort`` request arguments
+
+    The cursor is the last name of the previous page, so that the pages
+    stay consistent while children are created or deleted.
+    """
+
+    sort = args.get("sort", "asc")
+    if sort not in ("asc", "desc"):
+        raise ValueError("sort is either asc or desc")
+    (start, end) = prefix_range(names, args.get("prefix", ""))
+    total = end - start
+    cursor = args.get("cursor")
+    if cursor is not None and sort == "asc":
+        start = max(start, bisect.bisect_right(names, cursor))
+    elif cursor is not None:
+        end = min(end, bisect.bisect_left(names, cursor))
+    limit = int(args.get("limit", end - start))
+    if limit < 0:
+        raise ValueError("limit must not be negative")
+    if sort == "asc":
+        page = names[start:start + limit]
+        more = start + limit < end
+    else:
+        page = names[max(start, end - limit):end][::-1]
+        more = end - limit > start
+    return {"children": page,
+            "total": total,
+            "pzxid": znodestat.pzxid,
+            "cursor": page[-1] if more and page else None}
+
+
+def get_bytes(v):
+    if v is None:
+        return b""
+    elif isinstance(v, six.text_type):
+        return v.encode("utf-8")
+    return bytes(v)
+
+
+def get_text(v):
+    """the znode data as a json serializable string
+    """
+
+    if isinstance(v, bytes):
+        return v.decode("utf-8")
+    return v
+
+
+def znode_data(data):
+    """the json fields of the znode data: {"data": text}, or the base64 of
+    the bytes along with "encoding": "base64" if they are not UTF-8
+    """
+
+    try:
+        return {"data": get_text(data)}
+    except UnicodeDecodeError:
+        return {"data": base64.b64encode(data).decode("ascii"),
+                "encoding": "base64"}
+
+
+def record_data(record):
+    """the bytes of the data of a json record, see znode_data
+
+    :raises: ValueError or TypeError if the base64 is malformed
+    """
+
+    if record.get("encoding") == "base64":
+        return base64.b64decode(get_bytes(record.get("data")))
+    return get_bytes(record.get("data"))
+
+
+def znode_path(znode):
+    """the absolute path of a znode, as KazooClient and the watch events
+    spell it, e.g. "/a/b" for the "a/b" of a route
+    """
+
+    return "/" + znode.strip("/")
+
+
+def znode_etag(znodestat, kind="data"):
+    """the entity tag of the data, the children or the acls of a znode
+    """
+
+    if kind == "children":
+        return "c%d-%d" % (znodestat.pzxid, znodestat.cversion)
+    elif kind == "acls":
+        return "a%d-%d" % (znodestat.czxid, znodestat.aversion)
+    return "%d-%d" % (znodestat.mzxid, znodestat.version)
+
+
 def convert_zstat(znodestat):
     return {"czxid": znodestat.czxid,
             "mzxid": znodestat.mzxid,